@@ -1,534 +1,195 @@
-import re
-from dataclasses import dataclass
-from datetime import datetime, date, timedelta
-from typing import List, Optional, Tuple
+import hashlib
+import io
+import os
+from datetime import date
+from typing import Dict, List, Tuple
 
 import streamlit as st # type: ignore
 
-
-# =========================
-# 0) 모델
-# =========================
-@dataclass
-class KMessage:
-    sender: str
-    sent_at: datetime
-    header_lines: List[str]   # 원문 헤더 라인(보관용)
-    body_lines: List[str]     # 원문 본문 라인(보관용)
-
-    def body_text(self) -> str:
-        return "\n".join(self.body_lines).strip()
-
-    def to_block_text(self, include_header: bool = True) -> str:
-        """
-        Word / 한글(HWP) 붙여넣기 최적화 포맷
-        - 메시지 1개 = 하나의 블록
-        - 블록 사이 빈 줄 1개
-        """
-        body = self.body_text()
-
-        if include_header:
-            date_iso = self.sent_at.strftime("%Y-%m-%d %H:%M")
-            header = self.sender
-            block = f"[{header} | {date_iso}]\n{body}"
-        else:
-            block = body
-
-        return block.strip()
-    
-  # =========================
-# 🆕 셀 리포트 모델
-# =========================
-@dataclass
-class CellReport:
-    cell_no: int
-    leader: str
-
-    sunday_total: int = 0
-    sunday_attend: int = 0
-
-    week_total: int = 0
-    week_attend: int = 0
-
-    bible: int = 0
-    prayer: int = 0
-    offering: int = 0
-
-    absentees_sunday: str = ""
-    absentees_week: str = ""
-    devotion: dict = None  
-
-# =========================
-# 1) 날짜 파서 (카톡 "입력 날짜" 기준)
-# =========================
-# 예) "1월 23일 오후 9:05", "01월 03일 오전 10:11"
-RE_KO_MD_TIME = re.compile(
-    r"(?P<m>\d{1,2})\s*월\s*(?P<d>\d{1,2})\s*일\s*(?:(?P<ampm>오전|오후)\s*)?(?P<h>\d{1,2})\s*:\s*(?P<min>\d{2})"
+from katalk_core import (
+    DEFAULT_REPORT_MATCHER,
+    ENCODING_SAMPLE_BYTES,
+    PARALLEL_MIN_BYTES,
+    SNIFF_LINES,
+    MessageTable,
+    ReportMatcher,
+    auto_date_range,
+    filter_messages,
+    iter_buffer_messages,
+    iter_messages,
+    normalize_lines,
+    render_blocks,
+    render_context,
+    scan_buffer_hints,
+    scan_parse_hints,
+    sniff_encoding,
+    sniff_format,
+    split_messages_parallel,
 )
-
-# 예) "2026년 1월 23일 오후 9:05"
-RE_KO_YMD_TIME = re.compile(
-    r"(?P<y>\d{4})\s*년\s*(?P<m>\d{1,2})\s*월\s*(?P<d>\d{1,2})\s*일\s*(?:(?P<ampm>오전|오후)\s*)?(?P<h>\d{1,2})\s*:\s*(?P<min>\d{2})"
+from katalk_presets import PRESETS_FILE, KeywordPreset, load_presets, preset_ids, save_presets, upsert_preset
+from katalk_reports import (
+    ABSENT_STREAK_WEEKS,
+    ATTENDANCE_KINDS,
+    RECONCILE_LATEST,
+    RECONCILE_MERGE,
+    TREND_METRICS,
+    TREND_WEEKS,
+    ReportReconciler,
+    ReportStore,
+    list_report_schemas,
+    load_report_schema,
 )
+from katalk_search import KeywordMatcher, highlight_html, parse_keyword_lines, query_terms
 
-# 날짜 구분선 예: --------------- 2026년 1월 4일 일요일 ---------------
-# - 복사본에 따라 요일/괄호 표기가 붙거나, 뒤쪽 구분선이 생략되기도 해서 폭넓게 허용
-RE_DATE_DIVIDER = re.compile(
-    r"-+\s*(\d{4})년\s*(\d{1,2})월\s*(\d{1,2})일(?:\s*(?:\([^)]+\)|[가-힣]+))?\s*-*"
-)
-
-# 날짜 단독 줄 예: 2026년 1월 8일 목요일 / 2026년 1월 8일 (목)
-RE_DATE_LINE = re.compile(
-    r"^\s*(\d{4})년\s*(\d{1,2})월\s*(\d{1,2})일(?:\s*(?:\([^)]+\)|[가-힣]+))?\s*$"
-)
-
-# 시간만 있는 줄 예: 오전 9:18 / 오후 12:03
-RE_TIME_ONLY = re.compile(r"(오전|오후)\s*(\d{1,2}):(\d{2})")
 
-# 한 줄 메시지 예: [이름] [오전 8:47] 본문
-RE_INLINE_MSG = re.compile(
-    r"^\[(?P<sender>[^\]]+)\]\s*\[(?P<ampm>오전|오후)\s*(?P<h>\d{1,2}):(?P<min>\d{2})\]\s*(?P<body>.*)$"
-)
+# =========================
+# 4) Streamlit UI
+# =========================
+# 원문별 파싱 결과 캐시 크기 (위젯을 바꿀 때마다 전체를 다시 파싱하지 않도록)
+PARSE_CACHE_ENTRIES = 4
 
-# 안드로이드 한 줄 메시지 예:
-# 2023년 10월 11일 오전 8:07, 이름 : 본문
-RE_ANDROID_INLINE = re.compile(
-    r"^(?P<y>\d{4})년\s*(?P<m>\d{1,2})월\s*(?P<d>\d{1,2})일\s*"
-    r"(?P<ampm>오전|오후)\s*(?P<h>\d{1,2}):(?P<min>\d{2}),\s*"
-    r"(?P<sender>[^:]+)\s*:\s*(?P<body>.*)$"
-)
 
-def _ampm_to_24h(h: int, ampm: Optional[str]) -> int:
-    if not ampm:
-        return h
-    if ampm == "오전":
-        return 0 if h == 12 else h
-    if ampm == "오후":
-        return 12 if h == 12 else h + 12
-    return h
+def content_digest(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
 
 
-def _infer_year(month: int, day: int, today: date) -> int:
+@st.cache_resource(max_entries=PARSE_CACHE_ENTRIES, show_spinner="대화 내용을 분석하는 중…")
+def load_messages(digest: str, today: date, _data: bytes, _raw_text: str) -> Tuple[MessageTable, Dict[str, int]]:
     """
-    카톡에는 보통 '연도'가 없어서, 오늘 기준으로 가장 그럴듯한 연도 추정.
-    - 기본: 오늘 연도
-    - 만약 (month,day)가 '오늘보다 미래'면 전년도일 가능성이 높으니 -1
+    디코딩 + 메시지 분리 + 저장소 구성을 한 번에 수행하고 (원문 해시, 기준일) 로 캐시.
+    - _data / _raw_text 는 밑줄 인자라 캐시 키 해시에서 빠짐 (큰 원문을 매번 해시하지 않음)
+    - 반환값은 여러 재실행이 공유하므로 호출 쪽에서 수정하지 말 것
+      (검색 때 붙는 지연 색인은 MessageTable 이 잠금을 잡고 만들므로 세션 스레드끼리 같이 조회해도 됨)
     """
-    candidate = date(today.year, month, day)
-    if candidate > today:
-        return today.year - 1
-    return today.year
+    line_stats: Dict[str, int] = {}
+    if _data:
+        encoding, errors = sniff_encoding(_data)
+    if len(_data) >= PARALLEL_MIN_BYTES:
+        # 큰 업로드는 날짜 구분선 경계로 나눠 병렬 처리
+        parsed = split_messages_parallel(_data, today=today, encoding=encoding, errors=errors, stats=line_stats)
+    elif _data:
+        # 업로드는 바이트 원본에서 바로 파싱
+        parsed = iter_buffer_messages(_data, today=today, encoding=encoding, errors=errors, stats=line_stats)
+    else:
+        parsed = iter_messages(io.StringIO(_raw_text, newline=None), today=today, stats=line_stats)
+    # 파싱 결과는 KMessage 목록 대신 열 단위 저장소에 바로 쌓음
+    return MessageTable.from_messages(parsed), line_stats
+
+
+# 처리 단계(DAG). 각 단계는 자기 입력만으로 캐시되므로 바뀐 입력의 하류 단계만 다시 계산됨
+#   원문 ─ load_messages ─┬─ stage_date_range
+#                         └─ stage_filter(기간, 발신자, 키워드) ─┬─ stage_cell_reports(보고서 양식, 정리 방법)
+#                            또는 stage_preset_filter(기간, 프리셋) ─┤
+#                                                              └─ stage_output(헤더 포함 여부, 앞뒤 문맥) ─ stage_highlight
+#   원문 ─ stage_report_store(보고서 양식, 정리 방법) ─ 셀별 주간 추이 / 셀원별 출결
+# - 큰 객체는 밑줄 인자로 넘기고, 캐시 키는 상류 단계의 키(parse_key / filter_key)로 대신함
+STAGE_CACHE_ENTRIES = 32
+MAX_PREVIEW_CHARS = 8000
+# 프리셋을 쓰지 않을 때의 선택지
+MANUAL_PRESET = "(직접 입력)"
+# 보고서 양식 파일(.json/.toml/.yaml) 폴더. 파일을 고치면 다음 실행에서 다시 읽음
+REPORT_SCHEMA_DIR = os.environ.get("KATALK_REPORT_SCHEMAS", "report_schemas")
+DEFAULT_SCHEMA = "기본 양식"
+RECONCILE_LABELS = {
+    RECONCILE_LATEST: "가장 늦게 보낸 보고서만 사용",
+    RECONCILE_MERGE: "보낸 순서대로 필드별로 합치기 (빈 칸은 이전 값 유지)",
+}
+
+
+@st.cache_resource(max_entries=STAGE_CACHE_ENTRIES, show_spinner=False)
+def stage_date_range(parse_key: str, _msgs: MessageTable) -> Tuple[date, date]:
+    """자동 기간: 가장 최신 메시지 날짜 기준 최근 7일"""
+    return auto_date_range(_msgs)
+
+
+@st.cache_resource(max_entries=STAGE_CACHE_ENTRIES, show_spinner=False)
+def stage_filter(
+    parse_key: str,
+    start_d: date,
+    end_d: date,
+    senders: Tuple[str, ...],
+    keywords: Tuple[str, ...],
+    _msgs: MessageTable,
+) -> Tuple[str, List[int]]:
+    """반환: (filter_key, 필터를 통과한 행 번호 목록)"""
+    filtered = filter_messages(
+        messages=_msgs,
+        start_d=start_d,
+        end_d=end_d,
+        senders=list(senders),
+        keywords=list(keywords),
+    )
+    filter_key = content_digest(repr((parse_key, start_d, end_d, senders, keywords)).encode("utf-8"))
+    return filter_key, [m.index for m in filtered]
 
 
-def parse_kakao_datetime(text: str, today: date) -> Optional[Tuple[datetime, str]]:
+@st.cache_resource(max_entries=STAGE_CACHE_ENTRIES, show_spinner=False)
+def stage_preset_filter(
+    parse_key: str,
+    start_d: date,
+    end_d: date,
+    preset: KeywordPreset,
+    _msgs: MessageTable,
+) -> Tuple[str, List[int]]:
     """
-    문자열에서 카톡 헤더에 있는 '보낸 날짜/시간'을 찾아 datetime으로 변환.
-    반환: (datetime, 매칭된 원문 날짜 문자열)
+    stage_filter 의 프리셋판: 기간 비트맵 AND 프리셋 적중 비트맵 (비트맵은 테이블에 캐시됨)
+    - filter_key 는 같은 조건을 직접 입력했을 때와 같음
     """
-    m = RE_KO_YMD_TIME.search(text)
-    if m:
-        y = int(m.group("y"))
-        mo = int(m.group("m"))
-        d = int(m.group("d"))
-        h = int(m.group("h"))
-        mi = int(m.group("min"))
-        h24 = _ampm_to_24h(h, m.group("ampm"))
-        dt = datetime(y, mo, d, h24, mi)
-        return dt, m.group(0)
-
-    m = RE_KO_MD_TIME.search(text)
-    if m:
-        mo = int(m.group("m"))
-        d = int(m.group("d"))
-        h = int(m.group("h"))
-        mi = int(m.group("min"))
-        y = _infer_year(mo, d, today)
-        h24 = _ampm_to_24h(h, m.group("ampm"))
-        dt = datetime(y, mo, d, h24, mi)
-        return dt, m.group(0)
-
-    return None
-
-
-# =========================
-# 2) 메시지 분리 (PC/모바일 혼합 대응)
-# =========================
-def is_datetime_line(line: str, today: date) -> bool:
-    return parse_kakao_datetime(line, today) is not None
-
-
-def split_messages(raw_text: str, today: date) -> List[KMessage]:
-    lines = raw_text.replace("\r\n", "\n").replace("\r", "\n").split("\n")
-
-    messages: List[KMessage] = []
-
-    current_date: Optional[date] = None
-    current_sender: Optional[str] = None
-    current_dt: Optional[datetime] = None
-    current_header_lines: List[str] = []
-    current_body_lines: List[str] = []
-
-    def flush():
-        nonlocal current_sender, current_dt, current_header_lines, current_body_lines
-        if current_dt and current_body_lines:
-            messages.append(
-                KMessage(
-                    sender=current_sender or "UNKNOWN",
-                    sent_at=current_dt,
-                    header_lines=current_header_lines[:],
-                    body_lines=current_body_lines[:],
-                )
-            )
-    
-        current_sender = None
-        current_dt = None
-        current_header_lines = []
-        current_body_lines = []
-
-    def looks_like_name(s: str) -> bool:
-        s = s.strip()
-        return (
-            1 <= len(s) <= 20
-            and " " not in s
-            and not s.startswith("[")
-        )
-
-    i = 0
-    while i < len(lines):
-        line = lines[i].strip()
-
-        # 날짜 구분선/날짜 단독 줄은 "하루 경계"로 메시지 중간에도 등장할 수 있음.
-        # 이 경우 이전 메시지를 먼저 확정(flush)한 뒤 current_date를 갱신해야,
-        # 다음 메시지가 올바른 날짜를 사용한다.
-        m_div_any = RE_DATE_DIVIDER.search(line)
-        if m_div_any:
-            flush()
-            y, m, d = map(int, m_div_any.groups())
-            current_date = date(y, m, d)
-            i += 1
-            continue
-
-        m_date_any = RE_DATE_LINE.fullmatch(line)
-        if m_date_any:
-            flush()
-            y, m, d = map(int, m_date_any.groups())
-            current_date = date(y, m, d)
-            i += 1
-            continue
-       
-        # 1️⃣ 날짜 인식 (메시지 시작 전에서만 허용)
-        if current_dt is None:
-            # (날짜 처리는 위에서 current_dt 여부와 무관하게 먼저 처리함)
-            pass
-
-        # 1.1️⃣ 안드로이드 한 줄 메시지 인식
-        m_android = RE_ANDROID_INLINE.match(line)
-        if m_android:
-            flush()
-
-            y = int(m_android.group("y"))
-            m = int(m_android.group("m"))
-            d = int(m_android.group("d"))
-
-            ampm = m_android.group("ampm")
-            h = int(m_android.group("h"))
-            minute = int(m_android.group("min"))
-
-            hour = 0 if (ampm == "오전" and h == 12) else (
-                h + 12 if (ampm == "오후" and h != 12) else h
-            )
-
-            current_sender = m_android.group("sender").strip()
-            current_dt = datetime(y, m, d, hour, minute)
-
-            current_header_lines = [
-                f"{y}년 {m}월 {d}일 {ampm} {h}:{minute:02d}, {current_sender}"
-            ]
-
-            current_body_lines = []
-            body = m_android.group("body").strip()
-            if body:
-                current_body_lines.append(body)
-
-            i += 1
-            continue
-
-
-        # 1.2️⃣ 한 줄 메시지 인식 (PC/iOS 공통)
-        m_inline = RE_INLINE_MSG.match(line)
-        if current_date and m_inline:
-            flush()
-
-            sender = m_inline.group("sender")
-            ampm = m_inline.group("ampm")
-            h = int(m_inline.group("h"))
-            minute = int(m_inline.group("min"))
-
-            if ampm == "오전":
-                hour = 0 if h == 12 else h
-            else:
-                hour = 12 if h == 12 else h + 12
-
-            current_sender = sender
-            current_dt = datetime(
-                current_date.year,
-                current_date.month,
-                current_date.day,
-                hour,
-                minute,
-            )
-
-            current_header_lines = [
-                f"[{sender}] [{ampm} {h}:{minute:02d}]"
-            ]
-            current_body_lines = []
-            body = m_inline.group("body").strip()
-            if body:
-                current_body_lines.append(body)
-
-            i += 1
-            continue
-
-        # 3️⃣ 이름 + 시간 구조 (날짜가 잡힌 상태에서만)
-        if (
-            current_date
-            and current_dt is None
-            and looks_like_name(line)
-            and i + 1 < len(lines)
-            and RE_TIME_ONLY.fullmatch(lines[i + 1].strip())
-        ):
-            flush()
-            current_sender = line
-
-            m_time = RE_TIME_ONLY.search(lines[i + 1])
-            ampm, hh, mm = m_time.groups()
-            h = int(hh)
-            minute = int(mm)
-
-            if ampm == "오전":
-                hour = 0 if h == 12 else h
-            else:
-                hour = 12 if h == 12 else h + 12
-
-            current_dt = datetime(
-                current_date.year,
-                current_date.month,
-                current_date.day,
-                hour,
-                minute,
-            )
-
-            current_header_lines = [line, lines[i + 1].strip()]
-            current_body_lines = []
-            i += 2
-            continue
-
-        #  본문 누적
-        if current_dt:
-            current_body_lines.append(lines[i])
-
-        i += 1
+    filter_key = content_digest(repr((parse_key, start_d, end_d, preset.senders, preset.keywords)).encode("utf-8"))
+    return filter_key, preset_ids(_msgs, preset, start_d, end_d)
 
-    flush()
-    return messages
 
-# =========================
-# 🆕 셀 보고서 추출
-# =========================
-
-RE_CELL_ID = re.compile(r"3[- ]?(\d)셀")
-RE_NUMBER = re.compile(r"(\d+)")
-RE_MONEY = re.compile(r"([\d,]+)원")
-
-
-def extract_number(text: str) -> int:
-    m = RE_NUMBER.search(text)
-    return int(m.group(1)) if m else 0
-
-
-def extract_money(text: str) -> int:
-    m = RE_MONEY.search(text)
-    if not m:
-        return 0
-    return int(m.group(1).replace(",", ""))
-
-
-def parse_cell_report(msg: KMessage) -> Optional[CellReport]:
-    body = msg.body_text()
-
-    m_cell = RE_CELL_ID.search(body)
-    if not m_cell:
-        return None
-
-    cell_no = int(m_cell.group(1))
-
-    report = CellReport(
-        cell_no=cell_no,
-        leader=msg.sender,
-        devotion={}
-    )
-
-    lines = body.splitlines()
-    mode = None  # sunday / week
-
-    for line in lines:
-        t = line.strip()
-
-        if "주일 예배 현황" in t:
-            mode = "sunday"
-            continue
-        if "주간 셀예배 출결 현황" in t:
-            mode = "week"
-            continue
-
-        if "- 재적" in t:
-            num = extract_number(t)
-            if mode == "sunday":
-                report.sunday_total = num
-            elif mode == "week":
-                report.week_total = num
-
-        if "- 출석" in t:
-            num = extract_number(t)
-            if mode == "sunday":
-                report.sunday_attend = num
-            elif mode == "week":
-                report.week_attend = num
-
-        if "성경읽기" in t:
-            report.bible = extract_number(t)
-
-        if "- 기도" in t:
-            report.prayer = extract_number(t)
-
-        if "- 헌금" in t:
-            report.offering = extract_money(t)
-
-        if "이번주 결석자" in t:
-            if mode == "sunday":
-                report.absentees_sunday = t
-            elif mode == "week":
-                report.absentees_week = t
-
-        if "- 주일예배" in t:
-            report.devotion["sunday"] = "O" in t
-        if "- 오후예배" in t:
-            report.devotion["afternoon"] = "O" in t
-        if "- CLT" in t:
-            report.devotion["clt"] = "O" in t
-        if "- 성경대학" in t:
-            report.devotion["bible_college"] = "O" in t
-        if "- 금요성령집회" in t:
-            report.devotion["friday"] = "O" in t
-        if "- 새벽예배" in t:
-            report.devotion["dawn"] = extract_number(t)
-
-    return report
-# =========================
-# 3) 필터
-# =========================
-def normalize_lines(text: str) -> List[str]:
-    return [t.strip() for t in text.splitlines() if t.strip()]
-
-
-def scan_parse_hints(raw_text: str, today: date, max_lines: int = 200) -> Tuple[dict, List[dict]]:
+@st.cache_resource(max_entries=PARSE_CACHE_ENTRIES, show_spinner=False)
+def stage_report_store(
+    parse_key: str, schema_key: str, mode: str, _msgs: MessageTable, _matcher: ReportMatcher
+) -> ReportStore:
     """
-    Streamlit 디버깅용: 원문 첫 N줄을 훑어 어떤 패턴이 매칭되는지 요약.
-    - 반환: (counts, rows)
+    원문(+ 보고서 양식, 정리 방법)별 셀 x 주차 저장소. 여기서 다 채워서 돌려줌
+    - 여러 세션이 같은 저장소를 공유하므로 호출 쪽에서는 읽기만 할 것 (update 등으로 고치지 말 것)
     """
-    lines = raw_text.replace("\r\n", "\n").replace("\r", "\n").split("\n")
-    counts = {
-        "lines_total": len(lines),
-        "nonempty": 0,
-        "date_divider": 0,
-        "date_line": 0,
-        "kakao_datetime_any": 0,
-        "time_only": 0,
-        "inline_msg": 0,
-        "android_inline": 0,
-    }
-    rows: List[dict] = []
-
-    for idx, raw_line in enumerate(lines[:max_lines], start=1):
-        line = raw_line.strip()
-        if not line:
-            continue
-
-        tags: List[str] = []
-        counts["nonempty"] += 1
-
-        if RE_DATE_DIVIDER.search(line):
-            counts["date_divider"] += 1
-            tags.append("DATE_DIVIDER")
-        if RE_DATE_LINE.fullmatch(line):
-            counts["date_line"] += 1
-            tags.append("DATE_LINE")
-        if parse_kakao_datetime(line, today) is not None:
-            counts["kakao_datetime_any"] += 1
-            tags.append("DATETIME")
-        if RE_TIME_ONLY.fullmatch(line):
-            counts["time_only"] += 1
-            tags.append("TIME_ONLY")
-        if RE_INLINE_MSG.match(line):
-            counts["inline_msg"] += 1
-            tags.append("INLINE_MSG")
-        if RE_ANDROID_INLINE.match(line):
-            counts["android_inline"] += 1
-            tags.append("ANDROID_INLINE")
-
-        if tags:
-            rows.append(
-                {
-                    "line_no": idx,
-                    "tags": ", ".join(tags),
-                    "text": (line[:240] + "…") if len(line) > 240 else line,
-                }
-            )
-
-    return counts, rows
+    store = ReportStore(_matcher, mode)
+    store.update(_msgs)
+    return store
 
 
-def filter_messages(
-    messages: List[KMessage],
-    start_d: date,
-    end_d: date,
-    senders: List[str],
-    keywords: List[str],
-) -> List[KMessage]:
+@st.cache_resource(max_entries=STAGE_CACHE_ENTRIES, show_spinner=False)
+def stage_cell_reports(
+    filter_key: str, schema_key: str, mode: str, _msgs: MessageTable, _ids: List[int], _matcher: ReportMatcher
+) -> Tuple[List[dict], List[dict]]:
     """
-    - 기간: start_d ~ end_d (포함)
-    - 발신자: header/추정 sender에 포함 문자열 매칭(부분 포함) -> 실무 친화적
-    - 키워드:
-        - 비어있으면: 메시지 전부 통과
-        - 있으면: 본문에 키워드 하나라도 포함되면 통과 (OR)
+    필터 결과의 셀 보고서를 (셀, 주차) 별로 정리한 표 행 (schema_key = 보고서 양식 버전)
+    반환: (정리된 보고서 행, 감사용 이전 판본 행)
     """
-    results: List[KMessage] = []
+    reconciler = ReportReconciler(mode)
+    reconciler.extend(r for _, r in _msgs.cell_reports(_ids, _matcher))
+    return reconciler.rows(), reconciler.superseded_rows()
 
-    for m in messages:
-        md = m.sent_at.date()
-        if not (start_d <= md <= end_d):
-            continue
 
-        # 발신자 필터 (필수로 쓰는 걸 권장하지만, 함수 자체는 빈 리스트면 전체 허용)
-        if senders:
-            # sender 자체 + 헤더 텍스트에도 포함 여부 체크
-            header_join = " ".join(m.header_lines)
-            if not any(s in m.sender or s in header_join for s in senders):
-                continue
+@st.cache_resource(max_entries=STAGE_CACHE_ENTRIES, show_spinner=False)
+def stage_output(
+    filter_key: str, include_header: bool, context: int, _msgs: MessageTable, _ids: List[int]
+) -> Tuple[str, bytes]:
+    """
+    반환: (미리보기 텍스트, 다운로드용 전체 결과 바이트)
+    - context > 0 이면 결과마다 시간순 앞뒤 context 개 메시지를 함께 (겹치는 구간은 합침)
+    """
+    if context > 0:
+        output_text = render_context(_msgs, _ids, context, context, include_header=include_header)
+    else:
+        output_text = render_blocks((_msgs[i] for i in _ids), include_header=include_header)
 
-        if keywords:
-            body = m.body_text()
-            if not any(k in body for k in keywords):
-                continue
+    preview_text = output_text[:MAX_PREVIEW_CHARS]
+    if len(output_text) > MAX_PREVIEW_CHARS:
+        preview_text += "\n\n... (이하 생략, 다운로드 파일에 전체 포함)"
+    return preview_text, output_text.encode("utf-8")
 
-        results.append(m)
 
-    return results
+@st.cache_resource(max_entries=STAGE_CACHE_ENTRIES, show_spinner=False)
+def stage_highlight(filter_key: str, include_header: bool, context: int, _preview_text: str, _keywords: List[str]) -> str:
+    """미리보기에서 검색어 출현 구간을 강조한 HTML (키워드는 filter_key 에 이미 반영됨)"""
+    return highlight_html(_preview_text, KeywordMatcher(query_terms(parse_keyword_lines(_keywords))))
 
 
-# =========================
-# 4) Streamlit UI
-# =========================
 st.set_page_config(page_title="카톡 발췌 도구", layout="wide")
 st.title("📄 카카오톡 메시지 발췌 도구 (로컬)")
 st.caption("입력(파일 업로드/붙여넣기) → 발신자/키워드 → 자동 기간(최근 7일) → 결과 텍스트")
@@ -541,14 +202,17 @@ with colL:
     st.subheader("① 입력")
     uploaded_file = st.file_uploader("텍스트 파일 업로드 (.txt)", type=["txt"])
     raw_text = ""
+    data = b""
 
     if uploaded_file is not None:
-        # 업로드 파일 우선
-        data = uploaded_file.read()
-        try:
-            raw_text = data.decode("utf-8")
-        except UnicodeDecodeError:
-            raw_text = data.decode("cp949", errors="replace")
+        # 업로드 파일 우선 (전체 디코딩 없이 바이트 그대로 두고 줄 단위로만 디코딩)
+        data = uploaded_file.getvalue()
+        encoding, errors = sniff_encoding(data)
+        # 같은 업로드는 해시도 한 번만 계산
+        digests = st.session_state.setdefault("content_digests", {})
+        if uploaded_file.file_id not in digests:
+            digests[uploaded_file.file_id] = "upload:" + content_digest(data)
+        digest = digests[uploaded_file.file_id]
         st.info("파일이 업로드되었습니다. 아래 붙여넣기 입력은 무시됩니다.")
     else:
         raw_text = st.text_area(
@@ -556,26 +220,56 @@ with colL:
             height=260,
             placeholder="PC/모바일 카톡에서 복사한 내용을 그대로 붙여넣으세요."
         )
+        digest = "paste:" + content_digest(raw_text.encode("utf-8"))
 
     st.subheader("② 조건")
+    try:
+        presets = load_presets(PRESETS_FILE)
+    except (OSError, ValueError) as e:
+        st.warning(f"프리셋 파일을 읽지 못했습니다: {e}")
+        presets = []
+    preset_names = [p.name for p in presets]
+    preset_choice = st.selectbox("저장된 조건(프리셋)", [MANUAL_PRESET] + preset_names)
+    preset = presets[preset_names.index(preset_choice)] if preset_choice != MANUAL_PRESET else None
+    if preset is not None:
+        st.caption(
+            f"프리셋 '{preset.name}' — 발신자: {', '.join(preset.senders) or '(전체)'} / "
+            f"키워드: {', '.join(preset.keywords) or '(전체)'}"
+        )
+
     sender_input = st.text_area(
         "발신자 이름 (한 줄에 한 명) — 권장: 반드시 입력",
+        disabled=preset is not None,
         height=90,
         placeholder="예)\n김길동\n홍길동"
     )
     keyword_input = st.text_area(
         "포함 단어 (선택, 한 줄에 하나) — 비우면 ‘해당 발신자 메시지 전체’",
         height=110,
-        placeholder="예)\n출석\n결석\n헌금\n성경읽기"
+        placeholder="예)\n출석\n결석\n헌금\n성경읽기",
+        disabled=preset is not None,
+        help=(
+            "줄끼리는 OR. 한 줄 안에서는 검색식도 쓸 수 있어요: "
+            "AND / OR / NOT (대문자), \"띄어 쓴 구절\", 괄호, sender:이름, "
+            "date:2025-01-05 · date:2025-01 · date:2025-01-01..2025-01-31\n"
+            "초성만 쓰면 초성 검색(띄어쓰기 무시): ㅊㅅ → 출석, ㅅㄱㅇㄱ → 성경 읽기 / cho:출석결석\n"
+            "예) 출석 AND NOT 결석 / (헌금 OR 기도) sender:홍길동"
+        ),
     )
 
 with colR:
     st.subheader("③ 처리 결과")
 
-    if raw_text.strip():
+    if data or raw_text.strip():
         debug = st.checkbox("디버깅 정보 표시", value=False)
         if debug:
-            counts, rows = scan_parse_hints(raw_text, today=today)
+            if data:
+                counts, rows = scan_buffer_hints(data, today=today, encoding=encoding, errors=errors, max_lines=SNIFF_LINES)
+                st.write(f"인코딩 판정: **{encoding}** (앞 {ENCODING_SAMPLE_BYTES // 1024}KB 기준)")
+            else:
+                counts, rows = scan_parse_hints(raw_text, today=today, max_lines=SNIFF_LINES)
+            fmt, confidence = sniff_format(counts)
+            st.write(f"포맷 판정: **{fmt}** (신뢰도 {confidence:.0%}, 앞 {SNIFF_LINES}줄 기준)")
             st.write(
                 "원문 분석(앞부분 기준): "
                 f"총 {counts['lines_total']}줄 / 비어있지 않은 줄 {counts['nonempty']}개, "
@@ -586,7 +280,13 @@ with colR:
             if rows:
                 st.dataframe(rows, use_container_width=True, hide_index=True)
 
-        msgs = split_messages(raw_text, today=today)
+        msgs, line_stats = load_messages(digest, today, data, raw_text)
+        parse_key = f"{digest}@{today.isoformat()}"
+        if debug:
+            st.write(
+                "줄 분류 경로: "
+                + ", ".join(f"{k} {v}" for k, v in sorted(line_stats.items(), key=lambda kv: -kv[1]))
+            )
 
         if not msgs:
             st.error("메시지 헤더(날짜/시간)를 인식하지 못했습니다. 카톡 복사 형식을 확인해 주세요.")
@@ -604,8 +304,7 @@ with colR:
                 st.dataframe(sample, use_container_width=True, hide_index=True)
 
             # 기준일(가장 최신 메시지 날짜)
-            end_date_auto = max(m.sent_at.date() for m in msgs)
-            start_date_auto = end_date_auto - timedelta(days=6)
+            start_date_auto, end_date_auto = stage_date_range(parse_key, msgs)
 
             # 옵션: 기간 직접 조정
             manual = st.checkbox("기간 직접 조정", value=False)
@@ -619,78 +318,138 @@ with colR:
                 start_d, end_d = start_date_auto, end_date_auto
                 st.info(f"📅 자동 기간: {start_d.isoformat()} ~ {end_d.isoformat()} (기준일: {end_d.isoformat()})")
 
-            senders = normalize_lines(sender_input)
-            keywords = normalize_lines(keyword_input)
-
-            if not senders:
-                st.warning("발신자 이름이 비어 있습니다. (원하면 가능하지만) 실무에서는 발신자 입력을 권장해요.")
-
-            filtered = filter_messages(
-                messages=msgs,
-                start_d=start_d,
-                end_d=end_d,
-                senders=senders,
-                keywords=keywords,
-            )
-            st.write(f"총 메시지: **{len(msgs)}** / 필터 통과: **{len(filtered)}**")
+            if preset is not None:
+                senders, keywords = list(preset.senders), list(preset.keywords)
+            else:
+                senders = normalize_lines(sender_input)
+                keywords = normalize_lines(keyword_input)
+                try:
+                    parse_keyword_lines(keywords)
+                except ValueError as e:
+                    st.error(str(e))
+                    st.stop()
+
+                if not senders:
+                    st.warning("발신자 이름이 비어 있습니다. (원하면 가능하지만) 실무에서는 발신자 입력을 권장해요.")
+
+                with st.expander("현재 조건을 프리셋으로 저장"):
+                    new_name = st.text_input("프리셋 이름")
+                    if st.button("저장", disabled=not new_name.strip()):
+                        new_preset = KeywordPreset(new_name.strip(), tuple(senders), tuple(keywords))
+                        save_presets(upsert_preset(presets, new_preset), PRESETS_FILE)
+                        st.success(f"프리셋 '{new_preset.name}' 저장됨 (다음 실행부터 목록에 표시)")
+
+            if preset is not None:
+                filter_key, filtered_ids = stage_preset_filter(parse_key, start_d, end_d, preset, msgs)
+            else:
+                filter_key, filtered_ids = stage_filter(parse_key, start_d, end_d, tuple(senders), tuple(keywords), msgs)
+            st.write(f"총 메시지: **{len(msgs)}** / 필터 통과: **{len(filtered_ids)}**")
 
             # =========================
             # 🆕 셀 리포트 자동 생성
             # =========================
             st.subheader("📊 셀 보고서 자동 추출")
 
-            cell_reports = []
-            for m in filtered:
-                r = parse_cell_report(m)
-                if r:
-                    cell_reports.append(r)
+            matcher = DEFAULT_REPORT_MATCHER
+            schema_paths = list_report_schemas(REPORT_SCHEMA_DIR)
+            if schema_paths:
+                schema_names = [os.path.basename(p) for p in schema_paths]
+                schema_choice = st.selectbox("보고서 양식", [DEFAULT_SCHEMA] + schema_names)
+                if schema_choice != DEFAULT_SCHEMA:
+                    try:
+                        matcher = load_report_schema(schema_paths[schema_names.index(schema_choice)])
+                    except (OSError, ValueError) as e:
+                        st.error(f"보고서 양식을 읽지 못해 기본 양식을 씁니다: {e}")
+
+            reconcile_mode = st.selectbox(
+                "같은 셀이 한 주에 보고서를 여러 번 올렸을 때",
+                list(RECONCILE_LABELS),
+                format_func=RECONCILE_LABELS.get,
+            )
+            rows, superseded_rows = stage_cell_reports(
+                filter_key, matcher.key, reconcile_mode, msgs, filtered_ids, matcher
+            )
 
-            if not cell_reports:
+            if not rows:
                 st.info("셀 보고서를 인식하지 못했습니다.")
             else:
                 import pandas as pd
 
-                rows = []
-                for r in sorted(cell_reports, key=lambda x: x.cell_no):
-                    rows.append({
-                        "셀": f"{r.cell_no}셀",
-                        "주일 재적": r.sunday_total,
-                        "주일 출석": r.sunday_attend,
-                        "주간 재적": r.week_total,
-                        "주간 출석": r.week_attend,
-                        "성경읽기": r.bible,
-                        "기도": r.prayer,
-                        "헌금": r.offering,
-                    })
-
                 df = pd.DataFrame(rows)
                 st.dataframe(df, use_container_width=True)
+                if superseded_rows:
+                    with st.expander(f"정리되면서 대체된 이전 판본 {len(superseded_rows)}건 (감사용)"):
+                        st.dataframe(pd.DataFrame(superseded_rows), use_container_width=True)
 
-            include_header = st.checkbox("결과에 헤더(이름/날짜) 포함", value=True)
+            if st.checkbox(f"셀별 주간 추이 보기 (최근 {TREND_WEEKS}주, 기간과 무관하게 대화 전체)", value=False):
+                import pandas as pd
 
-            output_blocks = []
-            for m in filtered:
-                if not m.body_text():
-                    continue
-                output_blocks.append(m.to_block_text(include_header=include_header))
+                store = stage_report_store(parse_key, matcher.key, reconcile_mode, msgs, matcher)
+                metric = st.selectbox("추이 항목", list(TREND_METRICS), format_func=TREND_METRICS.get)
+                trend = store.trend_rows(metric)
+                if not trend:
+                    st.info("셀 보고서를 인식하지 못했습니다.")
+                else:
+                    trend_df = pd.DataFrame(trend).set_index("주")
+                    st.line_chart(trend_df)
+                    st.dataframe(trend_df, use_container_width=True)
+
+            if st.checkbox("셀원별 출결 보기 (결석자 명단 기준, 기간과 무관하게 대화 전체)", value=False):
+                import pandas as pd
 
-            output_text = "\n\n".join(output_blocks).strip()
+                store = stage_report_store(parse_key, matcher.key, reconcile_mode, msgs, matcher)
+                kind = st.radio(
+                    "출결 종류", list(ATTENDANCE_KINDS), format_func=lambda k: ATTENDANCE_KINDS[k][1], horizontal=True
+                )
+                ledger = store.attendance[kind]
+                if not len(ledger):
+                    st.info("결석자 명단에서 이름을 찾지 못했습니다.")
+                else:
+                    min_weeks = st.number_input(
+                        "연속 결석 기준 (주)",
+                        min_value=1,
+                        max_value=52,
+                        value=ABSENT_STREAK_WEEKS,
+                        help="셀 보고가 없던 주는 건너뛰고 셉니다.",
+                    )
+                    ongoing = st.checkbox("지금도 이어지는 연속 결석만", value=True)
+                    streaks = ledger.streak_rows(int(min_weeks), ongoing)
+                    if streaks:
+                        st.dataframe(pd.DataFrame(streaks), use_container_width=True)
+                    else:
+                        st.info(f"{int(min_weeks)}주 이상 연속 결석한 셀원이 없습니다.")
+                    with st.expander("셀원별 출석률"):
+                        st.dataframe(pd.DataFrame(ledger.member_rows()), use_container_width=True)
 
-            MAX_PREVIEW_CHARS = 8000
+            include_header = st.checkbox("결과에 헤더(이름/날짜) 포함", value=True)
+            context = st.number_input(
+                "앞뒤 문맥 메시지 수",
+                min_value=0,
+                max_value=50,
+                value=0,
+                help="검색된 메시지마다 시간순으로 앞뒤 N개 메시지를 함께 보여줍니다 (질문/정정 확인용).",
+            )
 
-            preview_text = output_text[:MAX_PREVIEW_CHARS]
-            if len(output_text) > MAX_PREVIEW_CHARS:
-                preview_text += "\n\n... (이하 생략, 다운로드 파일에 전체 포함)"
+            preview_text, output_bytes = stage_output(filter_key, include_header, int(context), msgs, filtered_ids)
 
-            st.text_area(
-                "④ 결과 미리보기 (일부만 표시)",
-                value=preview_text,
-                height=420
-            )
+            highlight = st.checkbox("미리보기에서 키워드 강조", value=False, disabled=not keywords)
+
+            if highlight and keywords:
+                st.markdown("**④ 결과 미리보기 (일부만 표시)**")
+                st.markdown(
+                    stage_highlight(filter_key, include_header, int(context), preview_text, keywords),
+                    unsafe_allow_html=True,
+                )
+            else:
+                st.text_area(
+                    "④ 결과 미리보기 (일부만 표시)",
+                    value=preview_text,
+                    height=420
+                )
 
             st.download_button(
                 "⬇️ 결과를 txt로 다운로드",
-                data=output_text.encode("utf-8"),
+                data=output_bytes,
                 file_name=f"extract_{start_d.isoformat()}_{end_d.isoformat()}.txt",
                 mime="text/plain"
             )
@@ -0,0 +1,302 @@
+"""
+파싱한 메시지를 쌓아 두는 로컬 SQLite 아카이브 (표준 라이브러리 sqlite3 만 사용)
+- 매주 같은 방을 다시 올려도 이미 있는 메시지는 건너뜀 (중복 제거 키)
+- 발신자/기간은 B-tree 색인, 본문은 FTS5 trigram 색인으로 SQL 질의
+- filter_messages / cell_report_rows 와 같은 결과를 SQL 로 돌려줌
+"""
+import hashlib
+import json
+import sqlite3
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from katalk_core import (
+    CellReport,
+    KMessage,
+    ReportMatcher,
+    date_term_minutes,
+    from_epoch_minutes,
+    parse_cell_report,
+    report_row,
+    sender_matches,
+    to_epoch_minutes,
+)
+from katalk_search import (
+    AndNode,
+    ChoseongTerm,
+    DateTerm,
+    NotNode,
+    OrNode,
+    QueryNode,
+    SenderTerm,
+    Term,
+    choseong,
+    parse_keyword_lines,
+)
+
+# FTS5 trigram 은 3글자 이상 검색어만 색인으로 찾을 수 있음 (그보다 짧으면 instr 로 확인)
+FTS_MIN_TERM = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id      INTEGER PRIMARY KEY,
+    room    TEXT    NOT NULL,
+    sender  TEXT    NOT NULL,
+    sent_at INTEGER NOT NULL,          -- epoch 분 (to_epoch_minutes)
+    header  TEXT    NOT NULL,          -- header_lines 를 줄바꿈으로 이은 것
+    body    TEXT    NOT NULL,          -- body_text()
+    digest  BLOB    NOT NULL,          -- blake2b(발신자 + 본문)
+    seq     INTEGER NOT NULL           -- 같은 분/발신자/본문 메시지 중 몇 번째인지
+);
+CREATE UNIQUE INDEX IF NOT EXISTS messages_dedup ON messages(room, sent_at, digest, seq);
+CREATE INDEX IF NOT EXISTS messages_sender_time ON messages(room, sender, sent_at);
+CREATE INDEX IF NOT EXISTS messages_time ON messages(room, sent_at);
+
+CREATE TABLE IF NOT EXISTS cell_reports (
+    message_id       INTEGER PRIMARY KEY REFERENCES messages(id) ON DELETE CASCADE,
+    cell_no          INTEGER NOT NULL,
+    leader           TEXT    NOT NULL,
+    sunday_total     INTEGER NOT NULL,
+    sunday_attend    INTEGER NOT NULL,
+    week_total       INTEGER NOT NULL,
+    week_attend      INTEGER NOT NULL,
+    bible            INTEGER NOT NULL,
+    prayer           INTEGER NOT NULL,
+    offering         INTEGER NOT NULL,
+    absentees_sunday TEXT    NOT NULL,
+    absentees_week   TEXT    NOT NULL,
+    devotion         TEXT    NOT NULL   -- JSON
+);
+CREATE INDEX IF NOT EXISTS cell_reports_cell ON cell_reports(cell_no);
+"""
+
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+    body, content='messages', content_rowid='id', tokenize='trigram case_sensitive 1'
+);
+CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts(rowid, body) VALUES (new.id, new.body);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+    INSERT INTO messages_fts(messages_fts, rowid, body) VALUES ('delete', old.id, old.body);
+END;
+"""
+
+_REPORT_FIELDS = (
+    "cell_no", "leader",
+    "sunday_total", "sunday_attend", "week_total", "week_attend",
+    "bible", "prayer", "offering",
+    "absentees_sunday", "absentees_week",
+)
+
+
+def _digest(sender: str, body: str) -> bytes:
+    return hashlib.blake2b(f"{sender}\0{body}".encode("utf-8"), digest_size=8).digest()
+
+
+class MessageArchive:
+    """
+    방(room) 별 메시지 저장소.
+    - FTS5(trigram) 를 쓸 수 없는 SQLite 빌드면 본문 조건은 instr 로만 확인 (has_fts = False)
+    """
+
+    def __init__(self, path: str) -> None:
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        # 초성 검색은 SQL 안에서 본문을 투영해 확인 (색인 없이 훑기)
+        self.conn.create_function("choseong", 1, choseong, deterministic=True)
+        self.conn.executescript(SCHEMA)
+        try:
+            self.conn.executescript(FTS_SCHEMA)
+            self.has_fts = True
+        except sqlite3.OperationalError:
+            self.has_fts = False
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self) -> "MessageArchive":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    # -------------------------
+    # 적재
+    # -------------------------
+    def add_messages(self, room: str, messages: Iterable[KMessage], matcher: Optional[ReportMatcher] = None) -> int:
+        """
+        메시지를 방에 추가. 반환: 새로 들어간 메시지 수
+        - 중복 제거 키: (방, 보낸 시각, 발신자+본문 해시, 같은 키 안에서의 순번)
+          → 같은 대화를 다시 올려도 겹치는 부분은 무시되고,
+            같은 분에 같은 말을 두 번 보낸 것은 순번으로 구분되어 둘 다 남음
+        - 새로 들어간 메시지 중 셀 보고서는 cell_reports 에도 저장 (matcher: 보고서 양식, 생략 시 기본)
+        """
+        seen: Dict[Tuple[int, bytes], int] = {}
+        added = 0
+        with self.conn:
+            for m in messages:
+                body = m.body_text()
+                sent_at = to_epoch_minutes(m.sent_at)
+                digest = _digest(m.sender, body)
+                seq = seen.get((sent_at, digest), 0)
+                seen[(sent_at, digest)] = seq + 1
+
+                cur = self.conn.execute(
+                    "INSERT OR IGNORE INTO messages (room, sender, sent_at, header, body, digest, seq)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (room, m.sender, sent_at, "\n".join(m.header_lines), body, digest, seq),
+                )
+                if not cur.rowcount:
+                    continue
+                added += 1
+
+                report = parse_cell_report(m, matcher)
+                if report:
+                    self.conn.execute(
+                        f"INSERT INTO cell_reports (message_id, {', '.join(_REPORT_FIELDS)}, devotion)"
+                        f" VALUES (?, {', '.join('?' for _ in _REPORT_FIELDS)}, ?)",
+                        (
+                            cur.lastrowid,
+                            *(getattr(report, f) for f in _REPORT_FIELDS),
+                            json.dumps(report.devotion or {}, ensure_ascii=False),
+                        ),
+                    )
+        return added
+
+    # -------------------------
+    # 조회
+    # -------------------------
+    def rooms(self) -> List[str]:
+        return [r[0] for r in self.conn.execute("SELECT DISTINCT room FROM messages ORDER BY room")]
+
+    def count(self, room: str) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM messages WHERE room = ?", (room,)).fetchone()[0]
+
+    def latest_date(self, room: str) -> Optional[date]:
+        """가장 최신 메시지 날짜 (messages_time 색인의 끝 한 번 조회)"""
+        row = self.conn.execute("SELECT MAX(sent_at) FROM messages WHERE room = ?", (room,)).fetchone()
+        return from_epoch_minutes(row[0]).date() if row[0] is not None else None
+
+    def _where(self, room: str, start_d: Optional[date], end_d: Optional[date], senders: List[str], keywords: List[str]) -> Tuple[str, list]:
+        items: List[QueryNode] = [DateTerm(start_d, end_d)]
+        if senders:
+            items.append(OrNode(tuple(SenderTerm(q) for q in senders)))
+        query = parse_keyword_lines(keywords)
+        if query is not None:
+            items.append(query)
+        sql, params = self._node_sql(room, AndNode(tuple(items)))
+        return f"m.room = ? AND {sql}", [room, *params]
+
+    def _node_sql(self, room: str, node: QueryNode) -> Tuple[str, list]:
+        """
+        질의 트리 → WHERE 조각 + 인자
+        - 발신자: 방의 고유 이름을 먼저 골라 sender IN (...) 으로 (sender 색인 사용)
+        - 본문: 3글자 이상이면 FTS5 구절 검색, 아니면 instr (초성은 choseong() 투영 후 instr)
+        """
+        if isinstance(node, DateTerm):
+            lo, hi = date_term_minutes(node)
+            parts, params = [], []
+            if node.start:
+                parts.append("m.sent_at >= ?")
+                params.append(lo)
+            if node.end:
+                parts.append("m.sent_at < ?")
+                params.append(hi)
+            return "(" + (" AND ".join(parts) or "1") + ")", params
+        if isinstance(node, SenderTerm):
+            names = [
+                r[0]
+                for r in self.conn.execute("SELECT DISTINCT sender FROM messages WHERE room = ?", (room,))
+                if sender_matches(node.text, r[0])
+            ]
+            if not names:
+                return "0", []
+            return f"m.sender IN ({', '.join('?' for _ in names)})", names
+        if isinstance(node, Term):
+            if self.has_fts and len(node.text) >= FTS_MIN_TERM:
+                phrase = '"' + node.text.replace('"', '""') + '"'
+                return "m.id IN (SELECT rowid FROM messages_fts WHERE messages_fts MATCH ?)", [phrase]
+            return "instr(m.body, ?) > 0", [node.text]
+        if isinstance(node, ChoseongTerm):
+            return "instr(choseong(m.body), ?) > 0", [node.text]
+        if isinstance(node, NotNode):
+            sql, params = self._node_sql(room, node.item)
+            return f"NOT {sql}", params
+        joiner = " AND " if isinstance(node, AndNode) else " OR "
+        parts, params = [], []
+        for item in node.items:
+            sql, item_params = self._node_sql(room, item)
+            parts.append(sql)
+            params.extend(item_params)
+        return "(" + joiner.join(parts) + ")", params
+
+    def filter_messages(
+        self,
+        room: str,
+        start_d: date,
+        end_d: date,
+        senders: List[str],
+        keywords: List[str],
+    ) -> List[KMessage]:
+        """katalk_core.filter_messages 와 같은 조건을 SQL 로 (적재 순서 = 파일 순서)"""
+        where, params = self._where(room, start_d, end_d, senders, keywords)
+        rows = self.conn.execute(
+            f"SELECT m.sender, m.sent_at, m.header, m.body FROM messages m WHERE {where} ORDER BY m.id",
+            params,
+        )
+        return [
+            KMessage(
+                sender=sender,
+                sent_at=from_epoch_minutes(sent_at),
+                header_lines=header.split("\n") if header else [],
+                body_lines=body.split("\n"),
+            )
+            for sender, sent_at, header, body in rows
+        ]
+
+    def cell_report_rows(
+        self,
+        room: str,
+        start_d: date,
+        end_d: date,
+        senders: List[str],
+        keywords: List[str],
+    ) -> List[dict]:
+        """
+        cell_report_rows(filter_messages(...)) 와 같은 표 행 (셀 번호순)
+        - 보고서는 적재할 때 이미 파싱해 두었으므로 본문을 다시 읽지 않음
+        """
+        where, params = self._where(room, start_d, end_d, senders, keywords)
+        return [report_row(r) for r in self._select_reports(where, params, "r.cell_no, m.id")]
+
+    def cell_reports(
+        self,
+        room: str,
+        start_d: Optional[date] = None,
+        end_d: Optional[date] = None,
+        senders: Optional[List[str]] = None,
+        keywords: Optional[List[str]] = None,
+    ) -> List[CellReport]:
+        """
+        방의 셀 보고서 (적재 순서, sent_at 포함). 조건을 생략하면 전체
+        - 적재 때 파싱해 둔 값이라 본문을 다시 읽지 않음
+        """
+        where, params = self._where(room, start_d, end_d, senders or [], keywords or [])
+        return self._select_reports(where, params, "m.id")
+
+    def _select_reports(self, where: str, params: list, order_by: str) -> List[CellReport]:
+        rows = self.conn.execute(
+            f"SELECT {', '.join('r.' + f for f in _REPORT_FIELDS)}, r.devotion, m.sent_at"
+            f" FROM cell_reports r JOIN messages m ON m.id = r.message_id"
+            f" WHERE {where} ORDER BY {order_by}",
+            params,
+        )
+        return [
+            CellReport(
+                **dict(zip(_REPORT_FIELDS, row[:-2])),
+                devotion=json.loads(row[-2]),
+                sent_at=from_epoch_minutes(row[-1]),
+            )
+            for row in rows
+        ]
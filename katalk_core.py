@@ -0,0 +1,1915 @@
+"""
+카카오톡 대화 내보내기 파서 / 필터 / 셀 보고서 추출 (UI 없음)
+- Streamlit 앱(app.py)과 CLI(katalk_extract.py)가 함께 사용
+- 표준 라이브러리만 import 하므로 배치 처리/벤치마크에서 가볍게 불러올 수 있음
+"""
+import bisect
+import codecs
+import io
+import itertools
+import mmap
+import os
+import re
+import sys
+import threading
+from array import array
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field
+from datetime import datetime, date, timedelta
+from typing import IO, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+from katalk_search import (
+    AndNode,
+    ChoseongTerm,
+    DateTerm,
+    KeywordMatcher,
+    NgramIndex,
+    NotNode,
+    OrNode,
+    QueryNode,
+    SenderTerm,
+    Term,
+    choseong,
+    parse_keyword_lines,
+)
+
+
+def _numpy(load: bool = False):
+    """
+    NumPy 모듈 또는 None (선택 의존성: 모듈 import 시점이 아니라 쓸 때 찾음)
+    - load=False: 이미 다른 곳(스트림릿/pandas)에서 불러온 경우에만 씀
+      → CLI 처럼 한 번 검색하고 끝나는 실행에 NumPy import(~90ms)를 더하지 않음
+    - load=True: 아직 안 불러왔으면 import 해 봄 (없으면 None)
+    """
+    module = sys.modules.get("numpy")
+    if module is None and load:
+        try:
+            import numpy as module
+        except ImportError:
+            return None
+    return module
+
+
+# =========================
+# 0) 모델
+# =========================
+@dataclass(slots=True)
+class KMessage:
+    sender: str
+    sent_at: datetime
+    header_lines: List[str]   # 원문 헤더 라인(보관용)
+    body_lines: List[str]     # 원문 본문 라인(보관용)
+    _body: Optional[str] = field(default=None, init=False, repr=False, compare=False)
+
+    def body_text(self) -> str:
+        # 필터/보고서/출력에서 여러 번 불리므로 처음 한 번만 합쳐 두고 재사용
+        # (body_lines 를 나중에 고치면 캐시가 맞지 않으니 새 KMessage 를 만들 것)
+        if self._body is None:
+            self._body = "\n".join(self.body_lines).strip()
+        return self._body
+
+    def to_block_text(self, include_header: bool = True) -> str:
+        """
+        Word / 한글(HWP) 붙여넣기 최적화 포맷
+        - 메시지 1개 = 하나의 블록
+        - 블록 사이 빈 줄 1개
+        """
+        body = self.body_text()
+
+        if include_header:
+            date_iso = self.sent_at.strftime("%Y-%m-%d %H:%M")
+            header = self.sender
+            block = f"[{header} | {date_iso}]\n{body}"
+        else:
+            block = body
+
+        return block.strip()
+    
+  # =========================
+# 🆕 셀 리포트 모델
+# =========================
+@dataclass
+class CellReport:
+    cell_no: int
+    leader: str
+
+    sunday_total: int = 0
+    sunday_attend: int = 0
+
+    week_total: int = 0
+    week_attend: int = 0
+
+    bible: int = 0
+    prayer: int = 0
+    offering: int = 0
+
+    absentees_sunday: str = ""
+    absentees_week: str = ""
+    devotion: dict = None  
+    sent_at: Optional[datetime] = None   # 보고 메시지를 보낸 시각 (주차 집계용)
+
+# =========================
+# 0-1) 열(column) 단위 메시지 저장소
+# =========================
+_EPOCH = datetime(1970, 1, 1)
+_EPOCH_ORDINAL = _EPOCH.toordinal()
+
+
+def to_epoch_minutes(dt: datetime) -> int:
+    """datetime -> 1970-01-01 00:00 기준 분 (카톡 시각은 분 단위까지만 있음)"""
+    return (dt.toordinal() - _EPOCH_ORDINAL) * 1440 + dt.hour * 60 + dt.minute
+
+
+def from_epoch_minutes(minutes: int) -> datetime:
+    return _EPOCH + timedelta(minutes=minutes)
+
+
+# 본문 역색인을 쓰는 최소 후보 비율 (기간/발신자로 남은 행 / 전체 행, MessageTable._use_index)
+BODY_INDEX_MIN_SHARE = 0.25
+
+
+def _index_candidates(index: NgramIndex, term: str, ids: Sequence[int]) -> List[int]:
+    """역색인으로 ids(오름차순) 중 term(2글자 이상) 후보만 남김"""
+    candidates = index.candidates(term)
+    # range 는 `in` 이 O(1) 이라 그대로 씀
+    allowed = ids if isinstance(ids, range) else set(ids)
+    return [i for i in candidates if i in allowed]
+
+
+class MessageTable:
+    """
+    KMessage 목록 대신 쓰는 열 단위 저장소 (메시지당 파이썬 객체를 만들지 않음)
+    - 발신자: 고유 이름 목록(senders) + 메시지별 발신자 id 열
+    - 보낸 시각: epoch 분 단위 int64 열
+    - 헤더/본문: 공유 문자열 버퍼 하나에 이어 붙이고 메시지별 오프셋만 보관
+      (본문은 body_text() 결과 = strip 된 상태로 저장)
+    - table[i] 는 KMessage 와 같은 모양의 지연 행 뷰(MessageRow)
+    - 본문 2-gram 역색인은 넓은 검색이 되풀이되면 만들어 테이블에 붙여 둠 (파싱 결과 캐시와 수명이 같음)
+      본문의 초성 투영(choseong)에 대한 2-gram 역색인도 같은 방식으로 옆에 둠
+    - 시간 색인(정렬 순서 + 날짜별 시작 위치)으로 최신 날짜 O(1), 기간 조회 O(log n)
+    - 발신자 색인(발신자 id → 행 번호)으로 발신자 조건은 고유 이름 수만큼만 비교
+    - 지연 색인/캐시는 _lock 을 잡고 만듦: 화면에서는 캐시된 테이블 하나를 여러 세션 스레드가
+      같이 조회함 (이미 만들어진 걸 읽을 땐 잠그지 않음). 행 추가(append/extend)는 조회와
+      동시에 하지 말 것
+    """
+
+    def __init__(self) -> None:
+        self.senders: List[str] = []
+        self._sender_index: Dict[str, int] = {}
+        self.sender_ids = array("i")
+        self.sent_at = array("q")
+        # 메시지 i: 헤더 = buf[_starts[i]:_splits[i]], 본문 = buf[_splits[i]:_starts[i + 1]]
+        self._starts = array("q", [0])
+        self._splits = array("q")
+        self._parts: List[str] = []
+        self._buffer = ""
+        self._body_index: Optional[NgramIndex] = None
+        self._choseong_index: Optional[NgramIndex] = None
+        self._choseong_texts: List[str] = []
+        # 기간/발신자로 남은 행이 많았던(넓은) 검색 횟수. 두 번째부터 본문 역색인을 만듦
+        self._wide_searches = 0
+        self._wide_pending = False
+        # 검색어 노드 → (색인 당시 행 수, 행별 포함 여부를 np.packbits 로 묶은 배열). NumPy 경로 전용
+        self._term_masks: Dict[QueryNode, tuple] = {}
+        self._term_mask_bytes = 0
+        # 질의 노드 → (계산 당시 행 수, 적중 비트맵). 프리셋처럼 반복해서 쓰는 질의용
+        self._hit_bitmaps: Dict[QueryNode, Tuple[int, int]] = {}
+        self._time: Tuple[Optional[array], array, array] = (None, array("i"), array("q", [0]))
+        self._time_size = 0
+        # order 의 역순열: 행 번호 → 시간순 위치 (시간순 파일이면 None)
+        self._time_ranks: Optional[array] = None
+        self._sender_rows: List[array] = []
+        self._sender_rows_size = 0
+        # 위 지연 색인/캐시를 만들거나 고치는 쪽만 잡음 (색인끼리 서로 부르므로 RLock)
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_messages(cls, messages: Iterable[KMessage]) -> "MessageTable":
+        table = cls()
+        table.extend(messages)
+        return table
+
+    def append(self, msg: KMessage) -> None:
+        sender_id = self._sender_index.get(msg.sender)
+        if sender_id is None:
+            sender_id = self._sender_index[msg.sender] = len(self.senders)
+            self.senders.append(msg.sender)
+        header = "\n".join(msg.header_lines)
+        body = msg.body_text()
+
+        self.sender_ids.append(sender_id)
+        self.sent_at.append(to_epoch_minutes(msg.sent_at))
+        start = self._starts[-1]
+        self._splits.append(start + len(header))
+        self._starts.append(start + len(header) + len(body))
+        self._parts.append(header)
+        self._parts.append(body)
+
+    def extend(self, messages: Iterable[KMessage]) -> None:
+        for msg in messages:
+            self.append(msg)
+
+    def _text(self) -> str:
+        # 추가된 조각이 있을 때만 공유 버퍼를 다시 만듦
+        if self._parts:
+            with self._lock:
+                if self._parts:
+                    self._buffer = "".join([self._buffer, *self._parts])
+                    self._parts = []
+        return self._buffer
+
+    def __len__(self) -> int:
+        return len(self.sent_at)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [MessageRow(self, i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("MessageTable index out of range")
+        return MessageRow(self, index)
+
+    def __iter__(self) -> Iterator["MessageRow"]:
+        for i in range(len(self)):
+            yield MessageRow(self, i)
+
+    def sender_of(self, index: int) -> str:
+        return self.senders[self.sender_ids[index]]
+
+    def sent_at_of(self, index: int) -> datetime:
+        return from_epoch_minutes(self.sent_at[index])
+
+    def header_text(self, index: int) -> str:
+        return self._text()[self._starts[index]:self._splits[index]]
+
+    def body_text(self, index: int) -> str:
+        return self._text()[self._splits[index]:self._starts[index + 1]]
+
+    def body_index(self) -> NgramIndex:
+        """본문 2-gram 역색인. 처음 부를 때 만들고, 이후엔 그사이 늘어난 행만 이어서 색인"""
+        index = self._body_index
+        if index is not None and index.size >= len(self):
+            return index
+        with self._lock:
+            if self._body_index is None:
+                self._body_index = NgramIndex()
+            index = self._body_index
+            if index.size < len(self):
+                buf = self._text()
+                starts, splits = self._starts, self._splits
+                for i in range(index.size, len(self)):
+                    index.add(i, buf[splits[i]:starts[i + 1]])
+        return index
+
+    def choseong_index(self) -> NgramIndex:
+        """
+        본문 초성 투영(공백 제거)의 2-gram 역색인. body_index 와 같은 방식으로 증분 색인
+        - 투영 문자열도 행별로 보관 (후보 확인 때 본문을 다시 투영하지 않도록)
+        """
+        index = self._choseong_index
+        if index is not None and index.size >= len(self):
+            return index
+        with self._lock:
+            if self._choseong_index is None:
+                self._choseong_index = NgramIndex()
+            index = self._choseong_index
+            texts = self._choseong_texts
+            for i in range(index.size, len(self)):
+                projected = choseong(self.body_text(i))
+                texts.append(projected)
+                index.add(i, projected)
+        return index
+
+    def choseong_texts(self) -> Optional[List[str]]:
+        """행별 본문 초성 투영 (초성 색인을 만든 뒤에만, 아니면 None)"""
+        if self._choseong_index is None:
+            return None
+        self.choseong_index()
+        return self._choseong_texts
+
+    def prepare_body_index(self) -> None:
+        """검색(query_ids) 한 번의 시작을 알림: 넓은 검색 횟수는 검색마다 한 번만 셈"""
+        self._wide_pending = True
+
+    def _use_index(self, index: Optional[NgramIndex], ids: Sequence[int]) -> bool:
+        """
+        ids 를 본문 검색어로 거를 때 역색인을 쓸지 (쓴다면 호출 쪽에서 만들거나 이어서 색인)
+        - 남은 행이 전체의 BODY_INDEX_MIN_SHARE 미만이면 쓰지 않음: 좁은 기간은 남은 행만
+          훑는 게 후보 목록을 교집합하는 것보다 싸고, 색인을 만드는 건 훨씬 비쌈
+          (10만 행 색인에 1초 남짓, 7일치 훑기는 수 ms)
+        - 색인이 아직 없으면 넓은 검색이 두 번째일 때 만듦 (한 번만 검색하는 CLI 는 만들지 않음)
+        """
+        if len(ids) < BODY_INDEX_MIN_SHARE * len(self):
+            return False
+        if self._wide_pending:
+            self._wide_pending = False
+            self._wide_searches += 1
+        return index is not None or self._wide_searches >= 2
+
+    def body_candidates(self, term: str, ids: Sequence[int]) -> Sequence[int]:
+        """
+        ids(오름차순) 중 본문에 term 이 들어 있을 수 있는 행 (확인 전 후보, 오름차순)
+        - 역색인을 쓰지 않거나(_use_index) 1글자 검색어면 거를 수 없으므로 ids 그대로
+        """
+        if len(term) < 2 or not self._use_index(self._body_index, ids):
+            return ids
+        return _index_candidates(self.body_index(), term, ids)
+
+    def choseong_candidates(self, text: str, ids: Sequence[int]) -> Sequence[int]:
+        """ids 중 본문 초성 투영에 text 가 들어 있을 수 있는 행 (body_candidates 의 초성판)"""
+        if len(text) < 2 or not self._use_index(self._choseong_index, ids):
+            return ids
+        return _index_candidates(self.choseong_index(), text, ids)
+
+    def term_hits(self, node: QueryNode, ids: Sequence[int]) -> List[int]:
+        """ids(오름차순) 중 본문이 검색어(Term / ChoseongTerm)에 맞는 행 (색인으로 후보를 좁힌 뒤 확인)"""
+        text = node.text
+        if isinstance(node, ChoseongTerm):
+            candidates = self.choseong_candidates(text, ids)
+            projections = self.choseong_texts()
+            if projections is None:
+                return [i for i in candidates if text in choseong(self.body_text(i))]
+            return [i for i in candidates if text in projections[i]]
+        return [i for i in self.body_candidates(text, ids) if text in self.body_text(i)]
+
+    def cached_term_mask(self, node: QueryNode):
+        """term_mask 로 계산해 둔 전체 행 마스크 (없거나 그 뒤로 행이 늘었으면 None)"""
+        cached = self._term_masks.get(node)
+        if cached is None or cached[0] != len(self):
+            return None
+        np = _numpy(load=True)
+        return np.unpackbits(cached[1], count=cached[0], bitorder="little").astype(bool)
+
+    def term_mask(self, node: QueryNode):
+        """
+        본문 검색어(Term / ChoseongTerm)에 맞는 행을 True 로 표시한 전체 행 bool 배열 (NumPy 경로 전용)
+        - 검색어별로 비트 단위로 묶어 기억 (키워드만 바꿔 다시 검색할 때 재사용)
+        - 묶은 크기 합이 TERM_MASK_CACHE_BYTES 를 넘으면 오래된 검색어부터 버림
+        - 행이 늘어나면 그 검색어는 다시 계산
+        - 기간/발신자로 좁힌 행만 확인할 땐 term_hits (_query_mask 는 전체를 볼 때만 이걸 부름)
+        """
+        mask = self.cached_term_mask(node)
+        if mask is not None:
+            return mask
+        np = _numpy(load=True)
+        mask = np.zeros(len(self), dtype=bool)
+        mask[self.term_hits(node, range(len(self)))] = True
+        packed = np.packbits(mask, bitorder="little")
+        with self._lock:
+            old = self._term_masks.pop(node, None)
+            if old is not None:
+                self._term_mask_bytes -= old[1].nbytes
+            while self._term_masks and self._term_mask_bytes + packed.nbytes > TERM_MASK_CACHE_BYTES:
+                evicted = self._term_masks.pop(next(iter(self._term_masks)))
+                self._term_mask_bytes -= evicted[1].nbytes
+            if packed.nbytes <= TERM_MASK_CACHE_BYTES:
+                self._term_masks[node] = (len(self), packed)
+                self._term_mask_bytes += packed.nbytes
+        return mask
+
+    # -------------------------
+    # 셀 보고서: 셀 번호 표지가 있는 행만 파싱
+    # -------------------------
+    def cell_reports(
+        self, ids: Optional[Iterable[int]] = None, matcher: Optional["ReportMatcher"] = None
+    ) -> List[Tuple[int, "CellReport"]]:
+        """
+        셀 보고서인 행 → (행 번호, CellReport) 목록 (행 번호순)
+        - 셀 번호 표지는 버퍼 전체를 정규식 한 번으로 훑어 찾고 (행마다 search 를 부르지 않음),
+          표지가 걸린 행만 파싱. 헤더에 걸리거나 행 경계에 걸친 표지는 parse 가 본문으로 다시 확인
+        - ids 가 전체의 일부(REPORT_SCAN_RATIO 분의 1 미만)면 그 행들만 하나씩 파싱
+        """
+        matcher = matcher or DEFAULT_REPORT_MATCHER
+        n = len(self)
+        if ids is not None:
+            ids = ids if isinstance(ids, (list, range)) else list(ids)
+            if len(ids) * REPORT_SCAN_RATIO < n:
+                candidates: Iterable[int] = ids
+            else:
+                allowed = set(ids)
+                candidates = [i for i in self._cell_candidates(matcher) if i in allowed]
+        else:
+            candidates = self._cell_candidates(matcher)
+
+        reports = []
+        for i in candidates:
+            report = matcher.parse(self.senders[self.sender_ids[i]], self.body_text(i))
+            if report:
+                report.sent_at = self.sent_at_of(i)
+                reports.append((i, report))
+        return reports
+
+    def _cell_candidates(self, matcher: "ReportMatcher") -> List[int]:
+        starts = self._starts
+        n = len(self)
+        found: Set[int] = set()
+        for m in matcher.cell_pattern.finditer(self._text()):
+            found.add(bisect.bisect_right(starts, m.start()) - 1)
+            found.add(bisect.bisect_right(starts, m.end() - 1) - 1)
+        return sorted(i for i in found if 0 <= i < n)
+
+    # -------------------------
+    # 적중 비트맵: 비트 i = 행 i (파이썬 int 비트셋)
+    # -------------------------
+    def hit_bitmap(self, node: QueryNode) -> int:
+        """
+        node 를 만족하는 행의 비트맵. 질의별로 한 번만 계산해 테이블에 보관
+        - 행이 늘어나면 늘어난 행만 확인해 윗자리 비트로 이어 붙임 (기존 비트는 그대로)
+        - 저장해 둔 프리셋처럼 같은 질의를 기간만 바꿔 되풀이할 때: date_bitmap 과 AND 하면 끝
+        """
+        size, bits = self._hit_bitmaps.get(node, (0, 0))
+        if size >= len(self):
+            return bits
+        with self._lock:
+            size, bits = self._hit_bitmaps.get(node, (0, 0))
+            if size < len(self):
+                if size:
+                    hits = query_ids(self, node, range(size, len(self)), vectorized=False)
+                else:
+                    hits = query_ids(self, node)
+                bits |= ids_to_bitmap(hits)
+                self._hit_bitmaps[node] = (len(self), bits)
+        return bits
+
+    def date_bitmap(self, start_d: date, end_d: date) -> int:
+        """start_d ~ end_d(포함) 에 보낸 행의 비트맵 (시간순 파일이면 비트 연산만)"""
+        return ids_to_bitmap(self.ids_between(start_d, end_d))
+
+    # -------------------------
+    # 발신자 색인: 발신자 id → 행 번호
+    # -------------------------
+    def sender_rows(self) -> List[array]:
+        """발신자 id → 그 발신자의 행 번호(오름차순). 그사이 늘어난 행만 이어서 색인"""
+        rows = self._sender_rows
+        if self._sender_rows_size == len(self):
+            return rows
+        with self._lock:
+            sender_ids = self.sender_ids
+            while len(rows) < len(self.senders):
+                rows.append(array("i"))
+            for i in range(self._sender_rows_size, len(self)):
+                rows[sender_ids[i]].append(i)
+            self._sender_rows_size = len(self)
+        return rows
+
+    def match_senders(self, queries: List[str]) -> List[int]:
+        """
+        queries 중 하나라도 발신자 표기에 포함되는 발신자 id
+        - 표기: 이름 그대로 + 헤더에 찍히는 [이름] (메시지가 아니라 고유 이름만 훑음)
+        """
+        return [
+            sender_id
+            for sender_id, name in enumerate(self.senders)
+            if any(sender_matches(q, name) for q in queries)
+        ]
+
+    def ids_from_senders(self, queries: List[str], ids: Optional[Iterable[int]] = None) -> List[int]:
+        """
+        발신자 조건을 통과하는 행 번호 (오름차순)
+        - ids 가 있으면 그 행들(오름차순) 안에서만: range 면 발신자별 행 목록을 이진 탐색으로 자름
+        """
+        rows = self.sender_rows()
+        matched = [rows[sender_id] for sender_id in self.match_senders(queries)]
+        if ids is None:
+            ids = range(len(self))
+        if isinstance(ids, range):
+            picked = [
+                r[bisect.bisect_left(r, ids.start):bisect.bisect_left(r, ids.stop)]
+                for r in matched
+            ]
+        else:
+            allowed = set(ids)
+            picked = [[i for i in r if i in allowed] for r in matched]
+        if len(picked) == 1:
+            return list(picked[0])
+        return sorted(itertools.chain.from_iterable(picked))
+
+    # -------------------------
+    # 시간 색인: sent_at 정렬 순서 + 날짜별 시작 위치
+    # -------------------------
+    def _time_index(self) -> Tuple[Optional[array], array, array]:
+        """
+        반환: (order, days, day_starts)
+        - order: sent_at 오름차순 행 번호 (이미 시간순이면 None → 행 번호 그대로)
+        - days: 메시지가 있는 날짜(epoch 일) 오름차순
+        - day_starts: days[k] 의 첫 메시지가 정렬 순서에서 몇 번째인지 (+ 끝 표시 len)
+        - 행이 늘어나면 다음 조회 때 다시 만듦
+        """
+        if self._time_size == len(self):
+            return self._time
+        with self._lock:
+            if self._time_size != len(self):
+                minutes = self.sent_at
+                n = len(minutes)
+                if all(a <= b for a, b in zip(minutes, itertools.islice(minutes, 1, None))):
+                    order = None
+                    ordered = minutes
+                else:
+                    # 연도 추정이 어긋나거나 내보내기를 이어 붙인 경우 (sorted 는 안정 정렬)
+                    order = array("i", sorted(range(n), key=minutes.__getitem__))
+                    ordered = array("q", (minutes[i] for i in order))
+
+                days = array("i")
+                day_starts = array("q")
+                pos = 0
+                while pos < n:
+                    day = ordered[pos] // 1440
+                    days.append(day)
+                    day_starts.append(pos)
+                    pos = bisect.bisect_left(ordered, (day + 1) * 1440, pos)
+                day_starts.append(n)
+
+                ranks = None
+                if order is not None:
+                    ranks = array("i", bytes(4 * n))
+                    for pos, i in enumerate(order):
+                        ranks[i] = pos
+
+                self._time = (order, days, day_starts)
+                self._time_ranks = ranks
+                self._time_size = n
+        return self._time
+
+    def latest_date(self) -> date:
+        """가장 최신 메시지 날짜 (O(1), 빈 테이블이면 ValueError)"""
+        days = self._time_index()[1]
+        if not days:
+            raise ValueError("MessageTable is empty")
+        return date.fromordinal(_EPOCH_ORDINAL + days[-1])
+
+    def ids_between(self, start_d: date, end_d: date) -> Iterable[int]:
+        """
+        start_d ~ end_d(포함) 에 보낸 행 번호 (파일 순서 = 오름차순)
+        - 날짜 표에서 이진 탐색 두 번 → 시간순 파일이면 range 그대로
+        """
+        order, days, day_starts = self._time_index()
+        lo = day_starts[bisect.bisect_left(days, start_d.toordinal() - _EPOCH_ORDINAL)]
+        hi = day_starts[bisect.bisect_right(days, end_d.toordinal() - _EPOCH_ORDINAL)]
+        if order is None:
+            return range(lo, hi)
+        return sorted(order[lo:hi])
+
+    def context_ranges(self, ids: Iterable[int], before: int, after: int) -> List[range]:
+        """
+        각 행과 시간순으로 앞 before 개 / 뒤 after 개 이웃을 묶은 구간들
+        - 반환: 시간순 위치 구간 (겹치거나 맞닿은 구간은 하나로 합침, 오름차순)
+        - 목록을 다시 훑지 않고 위치 산술로만 계산 (시간순이 아니면 ranks 로 위치 변환)
+        """
+        self._time_index()
+        ranks = self._time_ranks
+        n = len(self)
+        positions = sorted(ids) if ranks is None else sorted(ranks[i] for i in ids)
+
+        ranges: List[range] = []
+        for pos in positions:
+            lo = max(0, pos - before)
+            hi = min(n, pos + after + 1)
+            if ranges and lo <= ranges[-1].stop:
+                if hi > ranges[-1].stop:
+                    ranges[-1] = range(ranges[-1].start, hi)
+            else:
+                ranges.append(range(lo, hi))
+        return ranges
+
+    def ids_at(self, positions: range) -> Iterable[int]:
+        """시간순 위치 구간 → 행 번호 (시간순)"""
+        order = self._time_index()[0]
+        if order is None:
+            return positions
+        return order[positions.start:positions.stop]
+
+
+class MessageRow:
+    """MessageTable 의 행 하나를 KMessage 처럼 보여주는 뷰 (값은 접근할 때 꺼냄)"""
+
+    __slots__ = ("table", "index", "_body")
+
+    def __init__(self, table: MessageTable, index: int) -> None:
+        self.table = table
+        self.index = index
+        self._body: Optional[str] = None
+
+    @property
+    def sender(self) -> str:
+        return self.table.sender_of(self.index)
+
+    @property
+    def sent_at(self) -> datetime:
+        return self.table.sent_at_of(self.index)
+
+    @property
+    def header_lines(self) -> List[str]:
+        header = self.table.header_text(self.index)
+        return header.split("\n") if header else []
+
+    @property
+    def body_lines(self) -> List[str]:
+        return self.body_text().split("\n")
+
+    def body_text(self) -> str:
+        if self._body is None:
+            self._body = self.table.body_text(self.index)
+        return self._body
+
+    # 블록 포맷은 KMessage 와 동일 (sender / sent_at / body_text() 만 사용)
+    to_block_text = KMessage.to_block_text
+
+    def __repr__(self) -> str:
+        return f"MessageRow(index={self.index}, sender={self.sender!r}, sent_at={self.sent_at!r})"
+
+
+# =========================
+# 1) 날짜 파서 (카톡 "입력 날짜" 기준)
+# =========================
+# 예) "1월 23일 오후 9:05", "01월 03일 오전 10:11"
+RE_KO_MD_TIME = re.compile(
+    r"(?P<m>\d{1,2})\s*월\s*(?P<d>\d{1,2})\s*일\s*(?:(?P<ampm>오전|오후)\s*)?(?P<h>\d{1,2})\s*:\s*(?P<min>\d{2})"
+)
+
+# 예) "2026년 1월 23일 오후 9:05"
+RE_KO_YMD_TIME = re.compile(
+    r"(?P<y>\d{4})\s*년\s*(?P<m>\d{1,2})\s*월\s*(?P<d>\d{1,2})\s*일\s*(?:(?P<ampm>오전|오후)\s*)?(?P<h>\d{1,2})\s*:\s*(?P<min>\d{2})"
+)
+
+# 날짜 구분선 예: --------------- 2026년 1월 4일 일요일 ---------------
+# - 복사본에 따라 요일/괄호 표기가 붙거나, 뒤쪽 구분선이 생략되기도 해서 폭넓게 허용
+RE_DATE_DIVIDER = re.compile(
+    r"-+\s*(\d{4})년\s*(\d{1,2})월\s*(\d{1,2})일(?:\s*(?:\([^)]+\)|[가-힣]+))?\s*-*"
+)
+
+# 날짜 단독 줄 예: 2026년 1월 8일 목요일 / 2026년 1월 8일 (목)
+RE_DATE_LINE = re.compile(
+    r"^\s*(\d{4})년\s*(\d{1,2})월\s*(\d{1,2})일(?:\s*(?:\([^)]+\)|[가-힣]+))?\s*$"
+)
+
+# 시간만 있는 줄 예: 오전 9:18 / 오후 12:03
+RE_TIME_ONLY = re.compile(r"(오전|오후)\s*(\d{1,2}):(\d{2})")
+
+# 한 줄 메시지 예: [이름] [오전 8:47] 본문
+RE_INLINE_MSG = re.compile(
+    r"^\[(?P<sender>[^\]]+)\]\s*\[(?P<ampm>오전|오후)\s*(?P<h>\d{1,2}):(?P<min>\d{2})\]\s*(?P<body>.*)$"
+)
+
+# 안드로이드 한 줄 메시지 예:
+# 2023년 10월 11일 오전 8:07, 이름 : 본문
+RE_ANDROID_INLINE = re.compile(
+    r"^(?P<y>\d{4})년\s*(?P<m>\d{1,2})월\s*(?P<d>\d{1,2})일\s*"
+    r"(?P<ampm>오전|오후)\s*(?P<h>\d{1,2}):(?P<min>\d{2}),\s*"
+    r"(?P<sender>[^:]+)\s*:\s*(?P<body>.*)$"
+)
+
+def _ampm_to_24h(h: int, ampm: Optional[str]) -> int:
+    if not ampm:
+        return h
+    if ampm == "오전":
+        return 0 if h == 12 else h
+    if ampm == "오후":
+        return 12 if h == 12 else h + 12
+    return h
+
+
+def _infer_year(month: int, day: int, today: date) -> int:
+    """
+    카톡에는 보통 '연도'가 없어서, 오늘 기준으로 가장 그럴듯한 연도 추정.
+    - 기본: 오늘 연도
+    - 만약 (month,day)가 '오늘보다 미래'면 전년도일 가능성이 높으니 -1
+    """
+    candidate = date(today.year, month, day)
+    if candidate > today:
+        return today.year - 1
+    return today.year
+
+
+def parse_kakao_datetime(text: str, today: date) -> Optional[Tuple[datetime, str]]:
+    """
+    문자열에서 카톡 헤더에 있는 '보낸 날짜/시간'을 찾아 datetime으로 변환.
+    반환: (datetime, 매칭된 원문 날짜 문자열)
+    """
+    m = RE_KO_YMD_TIME.search(text)
+    if m:
+        y = int(m.group("y"))
+        mo = int(m.group("m"))
+        d = int(m.group("d"))
+        h = int(m.group("h"))
+        mi = int(m.group("min"))
+        h24 = _ampm_to_24h(h, m.group("ampm"))
+        dt = datetime(y, mo, d, h24, mi)
+        return dt, m.group(0)
+
+    m = RE_KO_MD_TIME.search(text)
+    if m:
+        mo = int(m.group("m"))
+        d = int(m.group("d"))
+        h = int(m.group("h"))
+        mi = int(m.group("min"))
+        y = _infer_year(mo, d, today)
+        h24 = _ampm_to_24h(h, m.group("ampm"))
+        dt = datetime(y, mo, d, h24, mi)
+        return dt, m.group(0)
+
+    return None
+
+
+# =========================
+# 2) 메시지 분리 (PC/모바일 혼합 대응)
+# =========================
+def is_datetime_line(line: str, today: date) -> bool:
+    return parse_kakao_datetime(line, today) is not None
+
+
+# 줄 분류 경로 (iter_messages 의 stats 키)
+LINE_DIVIDER = "date_divider"
+LINE_DATE = "date_line"
+LINE_ANDROID = "android_inline"
+LINE_INLINE = "inline_msg"
+LINE_NAME_TIME = "name_time"
+LINE_BODY = "body"
+
+# 앞글자 -> 검사할 후보 패턴. 표에 없는 글자로 시작하면 정규식 없이 바로 본문.
+# - 날짜 구분선은 줄 맨 앞의 '-' 로 시작하는 경우만 인정
+_DIGIT_PROBES = (
+    (LINE_DATE, RE_DATE_LINE.fullmatch),
+    (LINE_ANDROID, RE_ANDROID_INLINE.match),
+)
+LINE_DISPATCH: Dict[str, Tuple[Tuple[str, Callable[[str], Optional[re.Match]]], ...]] = {
+    "-": ((LINE_DIVIDER, RE_DATE_DIVIDER.search),),
+    "[": ((LINE_INLINE, RE_INLINE_MSG.match),),
+    **{digit: _DIGIT_PROBES for digit in "0123456789"},
+}
+
+
+def _iter_lines(stream: IO, encoding: str = "utf-8", errors: str = "strict") -> Iterator[str]:
+    """
+    텍스트/바이너리 스트림에서 줄을 하나씩 꺼낸다(줄바꿈 문자 제외).
+    - \r\n, \r, \n 모두 줄 경계로 취급
+    - 마지막이 줄바꿈으로 끝나면 빈 줄을 하나 더 내보냄 (str.split("\n") 결과와 동일)
+    """
+    wrapper = None
+    if isinstance(stream.read(0), bytes):
+        wrapper = io.TextIOWrapper(stream, encoding=encoding, errors=errors, newline=None)
+        stream = wrapper
+
+    try:
+        ends_with_newline = True  # 빈 입력도 빈 줄 1개
+        for chunk in stream:
+            if "\r" in chunk:
+                # 줄바꿈 변환을 하지 않는 스트림(newline="")에서만 들어옴
+                parts = chunk.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+                ends_with_newline = parts[-1] == ""
+                if ends_with_newline:
+                    parts.pop()
+                yield from parts
+            else:
+                ends_with_newline = chunk[-1:] == "\n"
+                yield chunk[:-1] if ends_with_newline else chunk
+        if ends_with_newline:
+            yield ""
+    finally:
+        # TextIOWrapper 가 GC 될 때 원본 스트림을 닫지 않도록 분리
+        if wrapper is not None:
+            wrapper.detach()
+
+
+# 인코딩 판정용 앞부분 크기 (UTF-8 실패 시 전체를 다시 디코딩하지 않도록 표본만 시험)
+ENCODING_SAMPLE_BYTES = 64 * 1024
+UTF8_BOM = b"\xef\xbb\xbf"
+
+
+def sniff_encoding(buf) -> Tuple[str, str]:
+    """
+    원본 앞부분 표본으로 인코딩 판정. 반환: (encoding, errors)
+    - BOM 이 있으면 utf-8-sig, 표본이 UTF-8 로 읽히면 utf-8, 아니면 cp949
+    - 표본 이후의 깨진 바이트는 전체를 다시 읽는 대신 replace 로 처리
+    """
+    sample = bytes(buf[:ENCODING_SAMPLE_BYTES])
+    if sample.startswith(UTF8_BOM):
+        return "utf-8-sig", "replace"
+    try:
+        # 표본 끝에서 잘린 멀티바이트 문자는 오류로 보지 않음 (final=False)
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=False)
+        return "utf-8", "replace"
+    except UnicodeDecodeError:
+        return "cp949", "replace"
+
+
+@contextmanager
+def open_export(path: str) -> Iterator:
+    """
+    내보내기 파일을 읽기 전용으로 메모리 매핑 (bytes 처럼 슬라이스/find/정규식 사용 가능).
+    - 빈 파일은 매핑할 수 없으므로 b"" 를 돌려줌
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield b""
+            return
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            yield mm
+        finally:
+            mm.close()
+
+
+def iter_buffer_lines(
+    buf,
+    encoding: str = "utf-8",
+    errors: str = "strict",
+    start: int = 0,
+    end: Optional[int] = None,
+) -> Iterator[str]:
+    """
+    bytes / mmap 원본에서 줄 경계를 바이트 단위로 찾아 한 줄씩만 디코딩.
+    - 줄 분리 규칙은 _iter_lines 와 동일 (\r\n, \r, \n / 끝 줄바꿈 뒤 빈 줄)
+    - [start, end) 구간만 읽음. end 가 원본 끝이 아니면(병렬 조각) 끝의 빈 줄은 내보내지 않음
+    """
+    size = len(buf)
+    end = size if end is None else end
+    pos = start
+    if encoding == "utf-8-sig":
+        # BOM 은 파일 맨 앞에서만 제거 (줄마다 utf-8-sig 로 디코딩하면 중간 BOM 까지 사라짐)
+        encoding = "utf-8"
+        if pos == 0 and buf[:3] == UTF8_BOM:
+            pos = 3
+
+    find = buf.find
+    while True:
+        nl = find(b"\n", pos, end)
+        if nl == -1:
+            if pos < end or end == size:
+                yield from buf[pos:end].decode(encoding, errors).split("\r")
+            return
+        raw = buf[pos:nl]
+        if raw[-1:] == b"\r":
+            raw = raw[:-1]
+        line = raw.decode(encoding, errors)
+        if "\r" in line:
+            yield from line.split("\r")
+        else:
+            yield line
+        pos = nl + 1
+
+
+def iter_messages(
+    stream: IO,
+    today: date,
+    encoding: str = "utf-8",
+    errors: str = "strict",
+    stats: Optional[Dict[str, int]] = None,
+) -> Iterator[KMessage]:
+    """
+    스트림을 한 줄씩 읽으며 완성된 KMessage 를 차례로 내보내는 제너레이터.
+    - 텍스트/바이너리 스트림 모두 허용 (바이너리는 encoding/errors 로 디코딩)
+    - 현재 메시지 상태와 '이름 + 시간' 규칙용 다음 줄 1개만 들고 있으므로
+      파일 크기와 무관하게 메모리 사용량이 일정함
+    - stats 에 dict 를 넘기면 줄 분류 경로별(LINE_*) 줄 수를 누적
+    """
+    lines = _iter_lines(stream, encoding=encoding, errors=errors)
+    yield from _iter_line_messages(lines, today, stats=stats)
+
+
+def iter_buffer_messages(
+    buf,
+    today: date,
+    encoding: Optional[str] = None,
+    errors: Optional[str] = None,
+    stats: Optional[Dict[str, int]] = None,
+) -> Iterator[KMessage]:
+    """
+    bytes / mmap 원본용 iter_messages. 전체를 한 번에 디코딩하지 않고 줄 단위로만 디코딩.
+    - encoding 을 생략하면 sniff_encoding 으로 앞부분 표본만 보고 판정
+    """
+    if encoding is None:
+        encoding, errors = sniff_encoding(buf)
+    lines = iter_buffer_lines(buf, encoding=encoding, errors=errors or "strict")
+    yield from _iter_line_messages(lines, today, stats=stats)
+
+
+def _iter_line_messages(
+    lines: Iterator[str],
+    today: date,
+    stats: Optional[Dict[str, int]] = None,
+) -> Iterator[KMessage]:
+    """iter_messages / iter_buffer_messages 공용 파서 본체 (줄 이터레이터 입력)"""
+    current_date: Optional[date] = None
+    current_sender: Optional[str] = None
+    current_dt: Optional[datetime] = None
+    current_header_lines: List[str] = []
+    current_body_lines: List[str] = []
+
+    def flush() -> List[KMessage]:
+        """진행 중인 메시지를 확정하고 상태를 비움. 반환: 확정된 메시지(0~1개)"""
+        nonlocal current_sender, current_dt, current_header_lines, current_body_lines
+        done: List[KMessage] = []
+        if current_dt and current_body_lines:
+            done.append(
+                KMessage(
+                    sender=current_sender or "UNKNOWN",
+                    sent_at=current_dt,
+                    header_lines=current_header_lines,
+                    body_lines=current_body_lines,
+                )
+            )
+
+        current_sender = None
+        current_dt = None
+        current_header_lines = []
+        current_body_lines = []
+        return done
+
+    def looks_like_name(s: str) -> bool:
+        s = s.strip()
+        return (
+            1 <= len(s) <= 20
+            and " " not in s
+            and not s.startswith("[")
+        )
+
+    dispatch_get = LINE_DISPATCH.get
+    next_raw = next(lines, None)
+    next_line = next_raw.strip() if next_raw is not None else None
+    while next_raw is not None:
+        raw_line, line = next_raw, next_line
+        next_raw = next(lines, None)
+        next_line = next_raw.strip() if next_raw is not None else None
+
+        # 앞글자로 후보 패턴만 검사 ('이름 + 시간' 구조는 다음 줄이 필요해서 아래에서 따로 판단)
+        kind, match = LINE_BODY, None
+        probes = dispatch_get(line[:1])
+        if probes:
+            for probe_kind, probe in probes:
+                match = probe(line)
+                if match:
+                    kind = probe_kind
+                    break
+
+        if kind == LINE_INLINE and not current_date:
+            kind = LINE_BODY
+        if kind == LINE_BODY:
+            # 3️⃣ 이름 + 시간 구조 (날짜가 잡힌 상태에서만, 다음 줄 1개를 미리 봄)
+            # - 다음 줄이 '오'(오전/오후)로 시작할 때만 정규식까지 감
+            if (
+                current_date
+                and current_dt is None
+                and next_line
+                and next_line[0] == "오"
+                and looks_like_name(line)
+            ):
+                match = RE_TIME_ONLY.fullmatch(next_line)
+                if match:
+                    kind = LINE_NAME_TIME
+
+        if stats is not None:
+            stats[kind] = stats.get(kind, 0) + 1
+
+        #  본문 누적 (대부분의 줄은 여기서 끝남)
+        if kind == LINE_BODY:
+            if current_dt:
+                current_body_lines.append(raw_line)
+            continue
+
+        # 날짜 구분선/날짜 단독 줄은 "하루 경계"로 메시지 중간에도 등장할 수 있음.
+        # 이 경우 이전 메시지를 먼저 확정(flush)한 뒤 current_date를 갱신해야,
+        # 다음 메시지가 올바른 날짜를 사용한다.
+        if kind == LINE_DIVIDER or kind == LINE_DATE:
+            yield from flush()
+            y, m, d = map(int, match.groups())
+            current_date = date(y, m, d)
+            continue
+
+        # 1.1️⃣ 안드로이드 한 줄 메시지 인식
+        if kind == LINE_ANDROID:
+            m_android = match
+            yield from flush()
+
+            y = int(m_android.group("y"))
+            m = int(m_android.group("m"))
+            d = int(m_android.group("d"))
+
+            ampm = m_android.group("ampm")
+            h = int(m_android.group("h"))
+            minute = int(m_android.group("min"))
+
+            hour = 0 if (ampm == "오전" and h == 12) else (
+                h + 12 if (ampm == "오후" and h != 12) else h
+            )
+
+            current_sender = m_android.group("sender").strip()
+            current_dt = datetime(y, m, d, hour, minute)
+
+            current_header_lines = [
+                f"{y}년 {m}월 {d}일 {ampm} {h}:{minute:02d}, {current_sender}"
+            ]
+
+            current_body_lines = []
+            body = m_android.group("body").strip()
+            if body:
+                current_body_lines.append(body)
+            continue
+
+        # 1.2️⃣ 한 줄 메시지 인식 (PC/iOS 공통)
+        if kind == LINE_INLINE:
+            m_inline = match
+            yield from flush()
+
+            sender = m_inline.group("sender")
+            ampm = m_inline.group("ampm")
+            h = int(m_inline.group("h"))
+            minute = int(m_inline.group("min"))
+
+            if ampm == "오전":
+                hour = 0 if h == 12 else h
+            else:
+                hour = 12 if h == 12 else h + 12
+
+            current_sender = sender
+            current_dt = datetime(
+                current_date.year,
+                current_date.month,
+                current_date.day,
+                hour,
+                minute,
+            )
+
+            current_header_lines = [
+                f"[{sender}] [{ampm} {h}:{minute:02d}]"
+            ]
+            current_body_lines = []
+            body = m_inline.group("body").strip()
+            if body:
+                current_body_lines.append(body)
+            continue
+
+        # 3️⃣ 이름 + 시간 구조
+        yield from flush()
+        current_sender = line
+
+        ampm, hh, mm = match.groups()
+        h = int(hh)
+        minute = int(mm)
+
+        if ampm == "오전":
+            hour = 0 if h == 12 else h
+        else:
+            hour = 12 if h == 12 else h + 12
+
+        current_dt = datetime(
+            current_date.year,
+            current_date.month,
+            current_date.day,
+            hour,
+            minute,
+        )
+
+        current_header_lines = [line, next_line]
+        current_body_lines = []
+        # 시간 줄은 헤더로 소비
+        next_raw = next(lines, None)
+        next_line = next_raw.strip() if next_raw is not None else None
+
+    yield from flush()
+
+
+def split_messages(
+    raw_text: str,
+    today: date,
+    stats: Optional[Dict[str, int]] = None,
+) -> List[KMessage]:
+    """전체 문자열 입력용 래퍼. 실제 파싱은 iter_messages 가 담당."""
+    return list(iter_messages(io.StringIO(raw_text, newline=None), today, stats=stats))
+
+
+# =========================
+# 2-1) 병렬 파싱 (날짜 구분선 경계로 분할)
+# =========================
+# 날짜 구분선은 파서 상태를 완전히 초기화하므로(flush + current_date 갱신)
+# 그 줄의 시작 위치에서 잘라 각 조각을 따로 파싱해도 결과가 직렬 파싱과 같다.
+# 줄 맨 앞 '-' + 연도 숫자만 바이트 단위로 빠르게 찾고, 실제로 고른 경계만 디코딩해 확인.
+RE_DIVIDER_BYTES = re.compile(rb"^[ \t]*-+[ \t]*\d{4}", re.MULTILINE)
+
+PARALLEL_MIN_BYTES = 8 * 1024 * 1024   # 이보다 작으면 프로세스 기동 비용이 더 큼
+PARALLEL_CHUNKS_PER_WORKER = 4         # 조각 크기 편차를 흡수하기 위한 여유분
+
+
+def _is_divider_at(data, offset: int, encoding: str, errors: str) -> bool:
+    """offset 에서 시작하는 줄이 파서 기준으로 날짜 구분선인지 확인"""
+    line = data[offset:offset + 4096].split(b"\n", 1)[0].split(b"\r", 1)[0]
+    line = line.decode(encoding, errors=errors).strip()
+    return line[:1] == "-" and RE_DATE_DIVIDER.search(line) is not None
+
+
+def find_chunk_offsets(data, n_chunks: int, encoding: str = "utf-8", errors: str = "strict") -> List[int]:
+    """
+    data(bytes / mmap) 를 최대 n_chunks 개로 나눌 시작 오프셋 목록 (항상 0 으로 시작).
+    - 경계는 모두 날짜 구분선 줄의 시작 위치
+    - 균등 분할 지점 이후의 첫 구분선을 고르므로 조각 크기는 대략 비슷함
+    """
+    candidates = [m.start() for m in RE_DIVIDER_BYTES.finditer(data)]
+    offsets = [0]
+    step = len(data) / max(n_chunks, 1)
+    for k in range(1, n_chunks):
+        i = bisect.bisect_left(candidates, max(int(k * step), offsets[-1] + 1))
+        while i < len(candidates) and not _is_divider_at(data, candidates[i], encoding, errors):
+            i += 1
+        if i == len(candidates):
+            break
+        offsets.append(candidates[i])
+    return offsets
+
+
+def _parse_chunk(job: tuple) -> Tuple[List[KMessage], Dict[str, int]]:
+    """
+    ProcessPoolExecutor 작업 단위: 조각 하나를 직렬 파싱.
+    - job 원본이 파일 경로면 작업 프로세스가 직접 메모리 매핑 (조각 바이트를 넘기지 않음)
+    """
+    source, start, end, today, encoding, errors = job
+    stats: Dict[str, int] = {}
+    with (nullcontext(source) if isinstance(source, bytes) else open_export(source)) as buf:
+        lines = iter_buffer_lines(buf, encoding, errors, start=start, end=end)
+        msgs = list(_iter_line_messages(lines, today, stats=stats))
+    return msgs, stats
+
+
+def split_messages_parallel(
+    source,
+    today: date,
+    encoding: Optional[str] = None,
+    errors: Optional[str] = None,
+    stats: Optional[Dict[str, int]] = None,
+    workers: Optional[int] = None,
+) -> List[KMessage]:
+    """
+    원본(bytes / mmap / 파일 경로)을 날짜 구분선 경계로 나눠 여러 프로세스에서 파싱한 뒤 순서대로 합침.
+    - 결과는 iter_buffer_messages 직렬 파싱과 동일
+    - 인코딩 판정은 앞부분 표본으로 한 번만 하고 모든 조각에 적용
+    - 입력이 PARALLEL_MIN_BYTES 미만이거나 나눌 경계가 없으면 그냥 직렬 파싱
+    - 작업 프로세스는 fork 가 아닌 forkserver / spawn 으로 띄우므로
+      스크립트에서 부를 땐 if __name__ == "__main__": 안에서 부를 것
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open_export(source) as buf:
+            return _split_buffer_parallel(buf, os.fspath(source), today, encoding, errors, stats, workers)
+    return _split_buffer_parallel(source, None, today, encoding, errors, stats, workers)
+
+
+def _split_buffer_parallel(buf, path, today, encoding, errors, stats, workers) -> List[KMessage]:
+    workers = workers or os.cpu_count() or 1
+    if encoding is None:
+        encoding, errors = sniff_encoding(buf)
+    errors = errors or "strict"
+
+    offsets = [0]
+    if workers > 1 and len(buf) >= PARALLEL_MIN_BYTES:
+        offsets = find_chunk_offsets(buf, workers * PARALLEL_CHUNKS_PER_WORKER, encoding, errors)
+    if len(offsets) == 1:
+        return list(iter_buffer_messages(buf, today, encoding=encoding, errors=errors, stats=stats))
+
+    jobs = []
+    for start, end in zip(offsets, offsets[1:] + [len(buf)]):
+        if path is not None:
+            jobs.append((path, start, end, today, encoding, errors))
+            continue
+        # 메모리 원본은 조각 바이트를 넘김.
+        # 다음 조각의 구분선 직전 줄바꿈은 떼어냄 (직렬 파싱에는 없는 빈 줄이 생기지 않도록)
+        chunk = bytes(buf[start:end])
+        if end != len(buf):
+            chunk = chunk[:-2] if chunk.endswith(b"\r\n") else chunk[:-1]
+        jobs.append((chunk, 0, None, today, encoding, errors))
+
+    # 병렬 모드에서만 필요하므로 여기서 import (CLI 기동 시간 절약)
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    # fork 는 쓰지 않음: 스트림릿 서버처럼 스레드가 도는 프로세스를 복제하면 잠금이 걸린 채로
+    # 복제될 수 있음. 작업 함수(_parse_chunk)는 이 모듈에 있으므로 새 프로세스에서 import 만 하면 됨
+    # - forkserver: 단일 스레드 서버 프로세스를 한 번 띄워 두고 거기서 복제.
+    #   __main__ / 이 모듈을 서버에서 미리 import 해 두어 작업 프로세스마다 다시 읽지 않음
+    # - forkserver 가 없는 플랫폼(Windows)은 spawn
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        mp_context = multiprocessing.get_context("forkserver")
+        mp_context.set_forkserver_preload(["__main__", __name__])
+    else:
+        mp_context = multiprocessing.get_context("spawn")
+
+    messages: List[KMessage] = []
+    with ProcessPoolExecutor(max_workers=workers, mp_context=mp_context) as pool:
+        for msgs, chunk_stats in pool.map(_parse_chunk, jobs):
+            messages.extend(msgs)
+            if stats is not None:
+                for kind, n in chunk_stats.items():
+                    stats[kind] = stats.get(kind, 0) + n
+    return messages
+
+
+# =========================
+# 🆕 셀 보고서 추출
+# =========================
+
+RE_CELL_ID = re.compile(r"3[- ]?(\d)셀")
+RE_NUMBER = re.compile(r"(\d+)")
+RE_MONEY = re.compile(r"([\d,]+)원")
+
+
+def extract_number(text: str) -> int:
+    m = RE_NUMBER.search(text)
+    return int(m.group(1)) if m else 0
+
+
+def extract_money(text: str) -> int:
+    m = RE_MONEY.search(text)
+    if not m:
+        return 0
+    return int(m.group(1).replace(",", ""))
+
+
+# 표지 종류 (줄에 표지가 있으면 그 줄에서 값을 뽑는 방법)
+REPORT_MODE = "mode"      # 구역 머리글: 모드 전환 (그 줄의 다른 표지는 무시)
+REPORT_COUNT = "count"    # 줄의 첫 숫자
+REPORT_MONEY = "money"    # 줄의 "12,000원" 금액
+REPORT_FLAG = "flag"      # 줄에 O 가 있는지
+REPORT_NAMES = "names"    # 줄 전체 (결석자 명단 등, 앞뒤 공백 제거)
+
+
+@dataclass(frozen=True)
+class ReportField:
+    """
+    셀 보고서 표지 하나
+    - target: 값을 넣을 CellReport 필드 ("devotion.키" 면 devotion 딕셔너리)
+              REPORT_MODE 면 전환할 모드 이름
+    - modes: (모드, 필드) 쌍. 있으면 target 대신 현재 모드의 필드에 넣음 (해당 모드가 없으면 무시)
+    """
+    marker: str
+    kind: str
+    target: str = ""
+    modes: Tuple[Tuple[str, str], ...] = ()
+
+
+# 기본 보고서 양식 (3청년부). 한 줄에 표지가 여러 개면 이 순서대로 적용
+CELL_REPORT_FIELDS = (
+    ReportField("주일 예배 현황", REPORT_MODE, "sunday"),
+    ReportField("주간 셀예배 출결 현황", REPORT_MODE, "week"),
+    ReportField("- 재적", REPORT_COUNT, modes=(("sunday", "sunday_total"), ("week", "week_total"))),
+    ReportField("- 출석", REPORT_COUNT, modes=(("sunday", "sunday_attend"), ("week", "week_attend"))),
+    ReportField("성경읽기", REPORT_COUNT, "bible"),
+    ReportField("- 기도", REPORT_COUNT, "prayer"),
+    ReportField("- 헌금", REPORT_MONEY, "offering"),
+    ReportField("이번주 결석자", REPORT_NAMES, modes=(("sunday", "absentees_sunday"), ("week", "absentees_week"))),
+    ReportField("- 주일예배", REPORT_FLAG, "devotion.sunday"),
+    ReportField("- 오후예배", REPORT_FLAG, "devotion.afternoon"),
+    ReportField("- CLT", REPORT_FLAG, "devotion.clt"),
+    ReportField("- 성경대학", REPORT_FLAG, "devotion.bible_college"),
+    ReportField("- 금요성령집회", REPORT_FLAG, "devotion.friday"),
+    ReportField("- 새벽예배", REPORT_COUNT, "devotion.dawn"),
+)
+
+class ReportMatcher:
+    """
+    표지 표를 한 번에 컴파일한 셀 보고서 파서
+    - 줄 하나를 표지 전부 + 숫자를 묶은 대안(|) 정규식 하나로 훑어 표지 번호와 첫 숫자를 함께 얻음
+      (줄마다 표지별 in 검사 + 숫자 정규식을 따로 돌리는 대신)
+    - 줄 해석 결과(모드 전환 / 필드별 값)는 줄 문자열별로 기억: 보고서 줄은 매주 거의 같으므로
+      대부분의 줄은 사전 조회 한 번으로 끝남
+    - 모드 전환(주일/주간)도 표의 한 항목 (상태 전이, 그 줄의 다른 표지는 무시)
+    """
+
+    # 줄 해석 캐시 크기 (넘치면 비우고 다시 채움)
+    LINE_CACHE = 8192
+
+    def __init__(self, fields: Iterable[ReportField], cell_pattern: "re.Pattern[str]", key: str = "default") -> None:
+        # key: 캐시 키로 쓰는 양식 식별자 (양식 파일이면 경로 + 수정 시각/크기)
+        self.key = key
+        self.fields = tuple(fields)
+        self.cell_pattern = cell_pattern
+        markers = sorted({f.marker for f in self.fields}, key=len, reverse=True)
+        # 표지에 숫자가 들어 있으면 숫자 토큰과 겹칠 수 있으므로 숫자는 줄에서 따로 추출
+        self._fuse_numbers = not any(ch.isdigit() for m in markers for ch in m)
+        alternatives = [re.escape(m) for m in markers]
+        if self._fuse_numbers:
+            alternatives.append(r"\d+")
+        self.pattern = re.compile("|".join(alternatives))
+        # 찾은 표지 문자열 → 그 안에 든 표지들의 번호 비트 (긴 표지가 짧은 표지를 품는 경우 포함)
+        self._bits = {
+            m: sum(1 << k for k, f in enumerate(self.fields) if f.marker in m)
+            for m in markers
+        }
+        # 대상 필드 "devotion.키" → ("devotion", 키), 그 밖엔 (필드, None)
+        self._targets = [
+            (_report_target(f.target), {mode: _report_target(t) for mode, t in f.modes} if f.modes else None)
+            for f in self.fields
+        ]
+        self._lines: Dict[str, tuple] = {}
+
+    def _parse_line(self, line: str) -> tuple:
+        """줄 → (전환할 모드 또는 None, ((모드별 대상 또는 None, 대상, 값), ...))"""
+        hits = 0
+        number = None
+        for token in self.pattern.findall(line):
+            bit = self._bits.get(token)
+            if bit is not None:
+                hits |= bit
+            elif number is None:
+                number = int(token)
+        if not self._fuse_numbers:
+            number = extract_number(line)
+
+        actions = []
+        for k, f in enumerate(self.fields):
+            if not hits >> k & 1:
+                continue
+            if f.kind == REPORT_MODE:
+                return f.target, ()
+            if f.kind == REPORT_COUNT:
+                value = number or 0
+            elif f.kind == REPORT_MONEY:
+                value = extract_money(line)
+            elif f.kind == REPORT_FLAG:
+                value = "O" in line
+            else:
+                value = line.strip()
+            target, by_mode = self._targets[k]
+            actions.append((by_mode, target, value))
+        return None, tuple(actions)
+
+    def parse(self, sender: str, body: str) -> Optional[CellReport]:
+        m_cell = self.cell_pattern.search(body)
+        if not m_cell:
+            return None
+        cell = m_cell.group(1)
+        if not cell or not cell.isdecimal():
+            return None  # 양식의 cell_id 가 숫자 아닌 것을 잡은 경우: 셀 번호를 모르므로 보고서로 보지 않음
+        report = CellReport(cell_no=int(cell), leader=sender, devotion={})
+
+        cache = self._lines
+        mode = None  # sunday / week
+        for line in body.splitlines():
+            parsed = cache.get(line)
+            if parsed is None:
+                if len(cache) >= self.LINE_CACHE:
+                    cache.clear()
+                parsed = cache[line] = self._parse_line(line)
+            new_mode, actions = parsed
+            if new_mode is not None:
+                mode = new_mode
+                continue
+            for by_mode, (name, key), value in actions:
+                if by_mode is not None:
+                    if mode not in by_mode:
+                        continue
+                    name, key = by_mode[mode]
+                if key is None:
+                    setattr(report, name, value)
+                else:
+                    report.devotion[key] = value
+        return report
+
+
+def _report_target(target: str) -> Tuple[str, Optional[str]]:
+    if target.startswith("devotion."):
+        return "devotion", target[len("devotion."):]
+    return target, None
+
+
+# MessageTable.cell_reports: ids 가 전체의 이 비율분의 1 미만이면 버퍼를 훑지 않고 행별로 파싱
+REPORT_SCAN_RATIO = 8
+
+DEFAULT_REPORT_MATCHER = ReportMatcher(CELL_REPORT_FIELDS, RE_CELL_ID)
+
+
+def parse_cell_report(msg: KMessage, matcher: Optional[ReportMatcher] = None) -> Optional[CellReport]:
+    """메시지 본문이 셀 보고서면 CellReport (기본 양식은 DEFAULT_REPORT_MATCHER)"""
+    report = (matcher or DEFAULT_REPORT_MATCHER).parse(msg.sender, msg.body_text())
+    if report:
+        report.sent_at = msg.sent_at
+    return report
+
+
+# =========================
+# 3) 필터
+# =========================
+def normalize_lines(text: str) -> List[str]:
+    return [t.strip() for t in text.splitlines() if t.strip()]
+
+
+def scan_parse_hints(raw_text: str, today: date, max_lines: int = 200) -> Tuple[dict, List[dict]]:
+    """
+    Streamlit 디버깅용: 원문 첫 N줄을 훑어 어떤 패턴이 매칭되는지 요약.
+    - 반환: (counts, rows)
+    """
+    lines = raw_text.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    counts, rows = _scan_hint_lines(lines[:max_lines], today)
+    counts["lines_total"] = len(lines)
+    return counts, rows
+
+
+def scan_buffer_hints(
+    data: bytes,
+    today: date,
+    encoding: str = "utf-8",
+    errors: str = "strict",
+    max_lines: int = 200,
+) -> Tuple[dict, List[dict]]:
+    """scan_parse_hints 의 바이트 원본판: 앞 N줄만 디코딩해서 집계"""
+    sample = list(itertools.islice(iter_buffer_lines(data, encoding, errors), max_lines))
+    counts, rows = _scan_hint_lines(sample, today)
+    counts["lines_total"] = data.count(b"\n") + 1
+    return counts, rows
+
+
+def _scan_hint_lines(lines: List[str], today: date) -> Tuple[dict, List[dict]]:
+    """scan_parse_hints / 포맷 판정 공용: 주어진 줄들의 패턴 매칭 집계"""
+    counts = {
+        "lines_total": len(lines),
+        "nonempty": 0,
+        "date_divider": 0,
+        "date_line": 0,
+        "kakao_datetime_any": 0,
+        "time_only": 0,
+        "inline_msg": 0,
+        "android_inline": 0,
+    }
+    rows: List[dict] = []
+
+    for idx, raw_line in enumerate(lines, start=1):
+        line = raw_line.strip()
+        if not line:
+            continue
+
+        tags: List[str] = []
+        counts["nonempty"] += 1
+
+        if RE_DATE_DIVIDER.search(line):
+            counts["date_divider"] += 1
+            tags.append("DATE_DIVIDER")
+        if RE_DATE_LINE.fullmatch(line):
+            counts["date_line"] += 1
+            tags.append("DATE_LINE")
+        if parse_kakao_datetime(line, today) is not None:
+            counts["kakao_datetime_any"] += 1
+            tags.append("DATETIME")
+        if RE_TIME_ONLY.fullmatch(line):
+            counts["time_only"] += 1
+            tags.append("TIME_ONLY")
+        if RE_INLINE_MSG.match(line):
+            counts["inline_msg"] += 1
+            tags.append("INLINE_MSG")
+        if RE_ANDROID_INLINE.match(line):
+            counts["android_inline"] += 1
+            tags.append("ANDROID_INLINE")
+
+        if tags:
+            rows.append(
+                {
+                    "line_no": idx,
+                    "tags": ", ".join(tags),
+                    "text": (line[:240] + "…") if len(line) > 240 else line,
+                }
+            )
+
+    return counts, rows
+
+
+# 내보내기 포맷 (sniff_format 판정 결과, 화면의 파싱 진단 표시 전용)
+# - 파서는 포맷을 보지 않음: 포맷과 무관하게 LINE_DISPATCH 로 모든 헤더 문법을 검사함.
+#   기기가 다른 내보내기를 이어 붙인 파일은 앞부분 표본과 다른 문법이 뒤에 나올 수 있고,
+#   앞글자로 후보가 이미 갈리므로 포맷별 분류표를 따로 두어도 줄일 검사가 거의 없음
+FORMAT_ANDROID = "android"   # 2023년 10월 11일 오전 8:07, 이름 : 본문
+FORMAT_INLINE = "inline"     # [이름] [오전 8:47] 본문 (PC/iOS)
+FORMAT_MOBILE = "mobile"     # 이름 줄 + 시간 줄
+FORMAT_MIXED = "mixed"       # 판정 불가 (여러 문법이 섞임 / 헤더가 너무 적음)
+
+# 포맷 판정용 표본: 앞부분 줄 수 / 최소 헤더 수 / 최소 신뢰도
+SNIFF_LINES = 300
+SNIFF_MIN_HEADERS = 3
+SNIFF_MIN_CONFIDENCE = 0.95
+
+
+def sniff_format(counts: dict) -> Tuple[str, float]:
+    """
+    scan_parse_hints 집계로 내보내기 포맷 판정 (진단 표시용, 파싱 결과에는 영향 없음)
+    - 반환: (FORMAT_*, 신뢰도 0~1)
+    - 헤더 문법별 매칭 수 중 최다 포맷의 비율이 SNIFF_MIN_CONFIDENCE 미만이거나
+      헤더가 너무 적으면 FORMAT_MIXED
+    """
+    votes = {
+        FORMAT_ANDROID: counts.get("android_inline", 0),
+        FORMAT_INLINE: counts.get("inline_msg", 0),
+        FORMAT_MOBILE: counts.get("time_only", 0),
+    }
+    total = sum(votes.values())
+    if total < SNIFF_MIN_HEADERS:
+        return FORMAT_MIXED, 0.0
+
+    fmt = max(votes, key=votes.get)
+    confidence = votes[fmt] / total
+    if confidence < SNIFF_MIN_CONFIDENCE:
+        return FORMAT_MIXED, confidence
+    return fmt, confidence
+
+
+def filter_messages(
+    messages: List[KMessage],
+    start_d: date,
+    end_d: date,
+    senders: List[str],
+    keywords: List[str],
+) -> List[KMessage]:
+    """
+    - 기간: start_d ~ end_d (포함)
+    - 발신자: 이름 또는 헤더의 [이름] 표기에 포함 문자열 매칭(부분 포함, sender_matches) -> 실무 친화적
+      (헤더의 날짜/시각 부분에만 맞는 검색어는 통과하지 않음. 목록/테이블/아카이브 모두 같은 규칙)
+    - 키워드:
+        - 비어있으면: 메시지 전부 통과
+        - 있으면: 줄마다 검색식(parse_query) 하나, 하나라도 맞으면 통과 (OR)
+          검색식 문법이 없는 줄은 기존처럼 줄 전체가 본문 부분 문자열
+    - MessageTable 이면 기간/발신자/키워드를 각 색인으로 좁힘
+    """
+    if isinstance(messages, MessageTable):
+        return _filter_table(messages, start_d, end_d, senders, keywords)
+
+    results: List[KMessage] = []
+    query = parse_keyword_lines(keywords)
+    predicate = compile_query(query) if query is not None else None
+
+    for m in messages:
+        md = m.sent_at.date()
+        if not (start_d <= md <= end_d):
+            continue
+
+        # 발신자 필터 (필수로 쓰는 걸 권장하지만, 함수 자체는 빈 리스트면 전체 허용)
+        if senders and not any(sender_matches(s, m.sender) for s in senders):
+            continue
+
+        if predicate is not None and not predicate(m.body_text(), m.sender, to_epoch_minutes(m.sent_at), None):
+            continue
+
+        results.append(m)
+
+    return results
+
+
+def _filter_table(
+    table: MessageTable,
+    start_d: date,
+    end_d: date,
+    senders: List[str],
+    keywords: List[str],
+) -> List[MessageRow]:
+    # 기간/발신자/키워드를 한 질의로 묶어 query_ids 에 맡김 (싼 색인부터 적용됨)
+    items: List[QueryNode] = [DateTerm(start_d, end_d)]
+    if senders:
+        items.append(OrNode(tuple(SenderTerm(q) for q in senders)))
+    query = parse_keyword_lines(keywords)
+    if query is not None:
+        items.append(query)
+    return [table[i] for i in query_ids(table, AndNode(tuple(items)))]
+
+
+def sender_matches(query: str, name: str) -> bool:
+    """발신자 조건: 이름 그대로 또는 헤더에 찍히는 [이름] 표기에 포함"""
+    return query in name or query in f"[{name}]"
+
+
+def compile_query(node: QueryNode) -> Callable[[str, str, int, Optional[str]], bool]:
+    """
+    질의 트리 → 판정 함수 predicate(본문, 발신자 이름, 보낸 시각 epoch 분, 본문 초성 투영)
+    - 초성 투영은 미리 계산해 둔 게 있으면 넘기고, None 이면 초성 검색어가 직접 투영
+    - 트리는 한 번만 훑어 클로저로 만들어 둠 (행마다 isinstance 분기를 다시 하지 않음)
+    - Term 만으로 된 OR 은 KeywordMatcher 하나로 합침
+    - 발신자 판정은 고유 이름별로 결과를 기억 (행마다 문자열 비교를 되풀이하지 않음)
+    """
+    if isinstance(node, Term):
+        text = node.text
+        return lambda body, sender, minutes, cho: text in body
+    if isinstance(node, ChoseongTerm):
+        text = node.text
+        return lambda body, sender, minutes, cho: text in (choseong(body) if cho is None else cho)
+    if isinstance(node, SenderTerm):
+        query = node.text
+        seen: Dict[str, bool] = {}
+
+        def match_sender(body: str, sender: str, minutes: int, cho: Optional[str]) -> bool:
+            hit = seen.get(sender)
+            if hit is None:
+                hit = seen[sender] = sender_matches(query, sender)
+            return hit
+
+        return match_sender
+    if isinstance(node, DateTerm):
+        lo, hi = date_term_minutes(node)
+        return lambda body, sender, minutes, cho: lo <= minutes < hi
+    if isinstance(node, NotNode):
+        inner = compile_query(node.item)
+        return lambda body, sender, minutes, cho: not inner(body, sender, minutes, cho)
+    if isinstance(node, OrNode) and all(isinstance(item, Term) for item in node.items):
+        search = KeywordMatcher(item.text for item in node.items).search
+        return lambda body, sender, minutes, cho: search(body)
+
+    preds = [compile_query(item) for item in node.items]
+    if isinstance(node, AndNode):
+        return lambda body, sender, minutes, cho: all(p(body, sender, minutes, cho) for p in preds)
+    return lambda body, sender, minutes, cho: any(p(body, sender, minutes, cho) for p in preds)
+
+
+def date_term_minutes(node: DateTerm) -> Tuple[float, float]:
+    """DateTerm → [lo, hi) epoch 분 구간 (열린 끝은 ±inf)"""
+    lo = to_epoch_minutes(datetime.combine(node.start, datetime.min.time())) if node.start else float("-inf")
+    hi = to_epoch_minutes(datetime.combine(node.end + timedelta(days=1), datetime.min.time())) if node.end else float("inf")
+    return lo, hi
+
+
+# 질의 계획: AND 의 하위 조건은 이 순서(싼 색인 먼저)로 후보를 좁힘
+_QUERY_COST = {DateTerm: 0, SenderTerm: 1, Term: 2, ChoseongTerm: 2}
+
+
+def _intersect(ids: Iterable[int], others: Iterable[int]) -> Iterable[int]:
+    """오름차순 행 번호 두 묶음의 교집합 (둘 다 range 면 range)"""
+    if isinstance(ids, range) and isinstance(others, range):
+        start = max(ids.start, others.start)
+        return range(start, max(start, min(ids.stop, others.stop)))
+    if isinstance(others, range):
+        ids, others = others, ids
+    allowed = ids if isinstance(ids, range) else set(ids)
+    return [i for i in others if i in allowed]
+
+
+def _query_candidates(table: MessageTable, node: QueryNode, ids: Iterable[int]) -> Iterable[int]:
+    """
+    1단계: 색인만으로 후보 행(오름차순)을 좁힘. 결과는 정답의 상위집합
+    - 기간: 시간 색인 이진 탐색 / 발신자: 발신자별 행 목록 / 본문: 2-gram 역색인
+    - NOT 은 색인으로 좁힐 수 없으므로 ids 그대로 (2단계 확인에서 걸러짐)
+    """
+    if isinstance(node, DateTerm):
+        start = node.start or date.min
+        end = node.end or date.max
+        return _intersect(ids, table.ids_between(start, end))
+    if isinstance(node, SenderTerm):
+        return table.ids_from_senders([node.text], ids)
+    if isinstance(node, Term):
+        return table.body_candidates(node.text, ids)
+    if isinstance(node, ChoseongTerm):
+        return table.choseong_candidates(node.text, ids)
+    if isinstance(node, AndNode):
+        for item in sorted(node.items, key=lambda item: _QUERY_COST.get(type(item), 3)):
+            ids = _query_candidates(table, item, ids)
+        return ids
+    if isinstance(node, OrNode):
+        found: Set[int] = set()
+        for item in node.items:
+            part = _query_candidates(table, item, ids)
+            if part is ids:
+                return ids
+            found.update(part)
+        return sorted(found)
+    return ids
+
+
+def query_ids(
+    table: MessageTable,
+    node: QueryNode,
+    ids: Optional[Iterable[int]] = None,
+    vectorized: Optional[bool] = None,
+) -> List[int]:
+    """
+    질의 트리를 만족하는 행 번호 (파일 순서 = 오름차순)
+    - vectorized: NumPy bool 마스크 연산(_query_mask) 사용 여부
+      기본값은 NumPy 를 이미 불러온 프로세스(스트림릿)에서만 사용, True 면 없을 때 import 해 봄
+    - 아니면 파이썬 경로 (기준 구현):
+        1단계: 싼 색인부터 적용해 후보를 좁힘 (_query_candidates)
+        2단계: 남은 후보만 compile_query 판정 함수로 한 번씩 확인
+    """
+    table.prepare_body_index()
+    np = _numpy(load=bool(vectorized))
+    if vectorized is not False and np is not None:
+        if ids is None:
+            return np.flatnonzero(_query_mask(table, node)).tolist()
+        if isinstance(ids, range) and ids.step == 1:
+            rows = np.arange(ids.start, ids.stop, dtype=np.int64)
+        else:
+            rows = np.unique(np.fromiter(ids, dtype=np.int64))
+        return rows[_query_mask(table, node, rows)].tolist()
+
+    if ids is None:
+        ids = range(len(table))
+    elif not isinstance(ids, (range, list)):
+        ids = list(ids)
+    candidates = _query_candidates(table, node, ids)
+    predicate = compile_query(node)
+    senders, sender_ids, sent_at = table.senders, table.sender_ids, table.sent_at
+    projections = table.choseong_texts()
+    return [
+        i
+        for i in candidates
+        if predicate(
+            table.body_text(i),
+            senders[sender_ids[i]],
+            sent_at[i],
+            projections[i] if projections is not None else None,
+        )
+    ]
+
+
+def ids_to_bitmap(ids: Iterable[int]) -> int:
+    """행 번호들 → 비트맵 (비트 i = 행 i). 연속 구간(range)은 비트 연산만으로"""
+    if isinstance(ids, range) and ids.step == 1:
+        if not ids:
+            return 0
+        return ((1 << ids.stop) - 1) ^ ((1 << ids.start) - 1)
+    ids = list(ids)
+    if not ids:
+        return 0
+    np = _numpy()
+    if np is not None:
+        mask = np.zeros(max(ids) + 1, dtype=bool)
+        mask[ids] = True
+        return int.from_bytes(np.packbits(mask, bitorder="little").tobytes(), "little")
+    buf = bytearray(max(ids) // 8 + 1)
+    for i in ids:
+        buf[i >> 3] |= 1 << (i & 7)
+    return int.from_bytes(buf, "little")
+
+
+def bitmap_ids(bits: int) -> List[int]:
+    """비트맵 → 켜진 비트의 행 번호 (오름차순)"""
+    data = bits.to_bytes((bits.bit_length() + 7) // 8, "little")
+    np = _numpy()
+    if np is not None:
+        return np.flatnonzero(np.unpackbits(np.frombuffer(data, dtype=np.uint8), bitorder="little")).tolist()
+    ids = []
+    for byte_no, byte in enumerate(data):
+        base = byte_no * 8
+        while byte:
+            low = byte & -byte
+            ids.append(base + low.bit_length() - 1)
+            byte ^= low
+    return ids
+
+
+# 검색어별 마스크 캐시의 표당 상한 (바이트, MessageTable.term_mask)
+# - 마스크는 행당 1비트로 묶어 둠: 100만 행이면 검색어 하나에 125KB, 8MB 면 약 64개
+TERM_MASK_CACHE_BYTES = 8 * 1024 * 1024
+
+
+def _query_mask(table: MessageTable, node: QueryNode, rows=None):
+    """
+    질의 트리 → 행별 bool 마스크 (NumPy 경로)
+    - rows: 판정할 행 번호 배열 (오름차순, None 이면 전체). 마스크는 rows 와 같은 길이
+    - 기간/발신자: 열 배열(np.frombuffer, 복사 없음)에 대한 비교·조회로 한 번에 계산
+    - AND 는 싼 조건(기간 → 발신자)부터 계산해 통과한 행만 다음 조건에 넘김
+      → 본문 검색어는 살아남은 행만 확인 (파이썬 경로와 같은 '기간 먼저, 남은 행만 확인')
+    - OR 는 앞 조건에 이미 맞은 행을 다음 조건에서 건너뜀
+    - 본문: 전체 행 마스크가 캐시에 있으면 그걸 쓰고, 없으면 rows 만 확인
+      (전체 행을 확인한 결과만 캐시에 넣음, term_mask)
+    - 열 배열 뷰는 이 함수 안에서만 씀 (뷰가 살아 있으면 array 에 append 할 수 없음)
+    """
+    np = _numpy(load=True)
+    n = len(table)
+    size = n if rows is None else len(rows)
+    if isinstance(node, (Term, ChoseongTerm)):
+        return _term_rows_mask(table, node, rows)
+    if isinstance(node, DateTerm):
+        lo, hi = date_term_minutes(node)
+        minutes = np.frombuffer(table.sent_at, dtype=np.int64) if n else np.zeros(0, dtype=np.int64)
+        if rows is not None:
+            minutes = minutes[rows]
+        mask = np.ones(size, dtype=bool)
+        if node.start:
+            mask &= minutes >= lo
+        if node.end:
+            mask &= minutes < hi
+        del minutes
+        return mask
+    if isinstance(node, SenderTerm):
+        allowed = np.zeros(len(table.senders), dtype=bool)
+        allowed[table.match_senders([node.text])] = True
+        sender_ids = np.frombuffer(table.sender_ids, dtype=np.int32) if n else np.zeros(0, dtype=np.int32)
+        mask = allowed[sender_ids if rows is None else sender_ids[rows]]
+        del sender_ids
+        return mask
+    if isinstance(node, NotNode):
+        return ~_query_mask(table, node.item, rows)
+
+    if isinstance(node, AndNode):
+        mask = np.ones(size, dtype=bool)
+        for item in sorted(node.items, key=lambda item: _QUERY_COST.get(type(item), 3)):
+            _refine_mask(table, item, rows, mask, np.flatnonzero(mask), lambda m, part: m & part)
+        return mask
+
+    mask = np.zeros(size, dtype=bool)
+    if (
+        all(isinstance(item, Term) for item in node.items)
+        and any(table.cached_term_mask(item) is None for item in node.items)
+        and not table._use_index(table._body_index, range(size))
+    ):
+        # 본문 검색어만으로 된 OR: 역색인을 쓰지 않을 땐 KeywordMatcher 로 남은 행을 한 번만 훑음
+        search = KeywordMatcher(item.text for item in node.items).search
+        ids = range(n) if rows is None else rows.tolist()
+        mask[[k for k, i in enumerate(ids) if search(table.body_text(i))]] = True
+        return mask
+    for item in node.items:
+        _refine_mask(table, item, rows, mask, np.flatnonzero(~mask), lambda m, part: m | part)
+    return mask
+
+
+def _refine_mask(table: MessageTable, item: QueryNode, rows, mask, alive, combine) -> None:
+    """mask 의 alive 자리(rows 기준 위치)만 item 으로 판정해 combine(기존, 판정) 으로 갱신"""
+    if len(alive) == 0:
+        return
+    if len(alive) == len(mask):
+        mask[:] = combine(mask, _query_mask(table, item, rows))
+    else:
+        sub_rows = alive if rows is None else rows[alive]
+        mask[alive] = combine(mask[alive], _query_mask(table, item, sub_rows))
+
+
+def _term_rows_mask(table: MessageTable, node: QueryNode, rows):
+    """본문 검색어 하나의 rows 마스크: 전체 행 캐시 → 전체면 term_mask → 아니면 rows 만 확인"""
+    np = _numpy(load=True)
+    cached = table.cached_term_mask(node)
+    if cached is not None:
+        return cached if rows is None else cached[rows]
+    if rows is None:
+        return table.term_mask(node)
+    mask = np.zeros(len(rows), dtype=bool)
+    hits = table.term_hits(node, rows.tolist())
+    mask[np.searchsorted(rows, hits)] = True
+    return mask
+
+
+# =========================
+# 5) 출력
+# =========================
+# 문맥 보기에서 서로 떨어진 메시지 묶음 사이 구분 줄
+CONTEXT_SEPARATOR = "-" * 30
+
+
+def auto_date_range(messages: Iterable, days: int = 7) -> Tuple[date, date]:
+    """자동 기간: 가장 최신 메시지 날짜(기준일)부터 거슬러 days 일"""
+    if isinstance(messages, MessageTable):
+        end_d = messages.latest_date()
+    else:
+        end_d = max(m.sent_at.date() for m in messages)
+    return end_d - timedelta(days=days - 1), end_d
+
+
+def render_blocks(messages: Iterable, include_header: bool = True) -> str:
+    """메시지들을 to_block_text 블록으로 이어 붙인 최종 결과 텍스트 (빈 본문은 제외)"""
+    output_blocks = []
+    for m in messages:
+        if not m.body_text():
+            continue
+        output_blocks.append(m.to_block_text(include_header=include_header))
+    return "\n\n".join(output_blocks).strip()
+
+
+def render_context(
+    table: MessageTable,
+    ids: Iterable[int],
+    before: int,
+    after: int,
+    include_header: bool = True,
+) -> str:
+    """
+    검색 결과 행마다 앞뒤 메시지를 붙여 to_block_text 로 렌더링
+    - 이어지는 메시지 묶음 사이에는 CONTEXT_SEPARATOR 를 넣음
+    """
+    groups = []
+    for positions in table.context_ranges(ids, before, after):
+        text = render_blocks((table[i] for i in table.ids_at(positions)), include_header=include_header)
+        if text:
+            groups.append(text)
+    return f"\n\n{CONTEXT_SEPARATOR}\n\n".join(groups)
+
+
+def cell_report_rows(
+    messages: Iterable,
+    ids: Optional[Iterable[int]] = None,
+    matcher: Optional[ReportMatcher] = None,
+) -> List[dict]:
+    """
+    메시지들에서 셀 보고서를 뽑아 표 행으로 (셀 번호순)
+    - MessageTable 이면 ids 행(생략 시 전체)만: 셀 번호 표지를 버퍼 한 번 훑기로 찾음
+    - matcher: 보고서 양식 (생략 시 기본 양식, katalk_reports.load_report_schema 로 파일에서 읽기)
+    """
+    if isinstance(messages, MessageTable):
+        cell_reports = [r for _, r in messages.cell_reports(ids, matcher)]
+    else:
+        cell_reports = []
+        for m in messages:
+            r = parse_cell_report(m, matcher)
+            if r:
+                cell_reports.append(r)
+
+    return [report_row(r) for r in sorted(cell_reports, key=lambda x: x.cell_no)]
+
+
+def report_row(r: CellReport) -> dict:
+    """셀 보고서 하나 → 표 행 (화면/CLI/아카이브 공통 열 이름)"""
+    return {
+        "셀": f"{r.cell_no}셀",
+        "주일 재적": r.sunday_total,
+        "주일 출석": r.sunday_attend,
+        "주간 재적": r.week_total,
+        "주간 출석": r.week_attend,
+        "성경읽기": r.bible,
+        "기도": r.prayer,
+        "헌금": r.offering,
+    }
@@ -0,0 +1,308 @@
+"""
+katalk-extract: 카톡 내보내기 파일에서 조건에 맞는 메시지만 발췌하는 CLI (Streamlit 불필요)
+
+예)
+    python katalk_extract.py chat.txt -s 홍길동 -s 김철수 -k 출석 -k 헌금
+    python katalk_extract.py chat.txt --start 2026-01-01 --end 2026-01-31 -o out.txt
+    python katalk_extract.py chat.txt -k '출석 AND NOT "결석자 없음"' -k 'sender:홍길동 date:2026-01'
+    python katalk_extract.py chat.txt -k ㅅㄱㅇㄱ        (초성 검색: 성경읽기 / 성경 읽기)
+    python katalk_extract.py chat.txt -k 결석 -C 2     (검색된 메시지 앞뒤 2개씩 함께)
+    python katalk_extract.py chat.txt -p 헌금           (저장된 프리셋 조건으로)
+    python katalk_extract.py --print-report-schema > 양식.json   (기본 보고서 양식을 파일로)
+    python katalk_extract.py chat.txt --reports --report-schema 양식.json
+    python katalk_extract.py chat.txt --reports --reconcile merge --superseded   (다시 올린 보고서 정리 + 이전 판본)
+    python katalk_extract.py --archive katalk.db --room 3청년부 --trend week_ratio   (셀별 52주 추이)
+    python katalk_extract.py --archive katalk.db --room 3청년부 --absent-streak 3 --ongoing   (3주 이상 연속 결석 중인 셀원)
+    python katalk_extract.py chat.txt --archive katalk.db --room 3청년부   (아카이브에 쌓은 뒤 아카이브에서 검색)
+    python katalk_extract.py --archive katalk.db --room 3청년부 -k 헌금    (아카이브만 검색)
+"""
+import argparse
+import json
+import os
+import sys
+from datetime import date, timedelta
+from typing import Iterable, List, Optional, Tuple
+
+from katalk_core import (
+    CellReport,
+    MessageTable,
+    auto_date_range,
+    filter_messages,
+    iter_buffer_messages,
+    render_blocks,
+    render_context,
+    split_messages_parallel,
+)
+from katalk_archive import MessageArchive
+from katalk_presets import PRESETS_FILE, find_preset, load_presets
+from katalk_reports import (
+    ABSENT_STREAK_WEEKS,
+    ATTENDANCE_KINDS,
+    RECONCILE_LATEST,
+    RECONCILE_MODES,
+    TREND_METRICS,
+    TREND_WEEKS,
+    ReportReconciler,
+    ReportStore,
+    default_report_schema,
+    iso_week,
+    load_report_schema,
+)
+from katalk_search import parse_keyword_lines
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="katalk-extract",
+        description="카카오톡 대화 내보내기(.txt)에서 발신자/키워드/기간 조건으로 메시지를 발췌합니다.",
+    )
+    parser.add_argument("input", nargs="?", help="내보내기 텍스트 파일 경로 ('-' 면 표준 입력, --archive 만 검색할 땐 생략)")
+    parser.add_argument("-s", "--sender", action="append", default=[], help="발신자 이름 (부분 일치, 여러 번 지정 가능)")
+    parser.add_argument("-k", "--keyword", action="append", default=[], help="포함 단어 또는 검색식 (AND/OR/NOT, \"구절\", 괄호, sender:, date:, cho:). 초성만 쓰면 초성 검색. 여러 번 지정하면 OR")
+    parser.add_argument("-p", "--preset", help="저장된 프리셋 이름 (발신자/키워드 조건을 프리셋으로 대신함)")
+    parser.add_argument("--presets", default=PRESETS_FILE, help=f"프리셋 파일 경로 (기본 {PRESETS_FILE})")
+    parser.add_argument("--start", type=date.fromisoformat, help="시작일 YYYY-MM-DD (생략 시 자동 기간)")
+    parser.add_argument("--end", type=date.fromisoformat, help="종료일 YYYY-MM-DD (생략 시 가장 최신 메시지 날짜)")
+    parser.add_argument("--days", type=int, default=7, help="자동 기간 일수 (기본 7일)")
+    parser.add_argument("--no-header", action="store_true", help="결과 블록에서 [이름 | 날짜] 헤더 제외")
+    parser.add_argument("--reports", action="store_true", help="발췌 결과 대신 셀 보고서 표(TSV) 출력")
+    parser.add_argument("--report-schema", help="셀 보고서 양식 파일 (.json/.toml/.yaml, 생략 시 기본 양식). --archive 에서는 새로 적재하는 메시지에만 적용")
+    parser.add_argument(
+        "--reconcile",
+        choices=RECONCILE_MODES,
+        default=RECONCILE_LATEST,
+        help="같은 셀이 한 주에 보고서를 여러 번 올렸을 때: latest = 가장 늦게 보낸 것, merge = 필드별로 합침 (기본 latest)",
+    )
+    parser.add_argument("--superseded", action="store_true", help="--reports 에서 정리본 대신 대체된 이전 판본(감사용) 출력")
+    parser.add_argument(
+        "--trend",
+        nargs="?",
+        const="sunday_ratio",
+        choices=list(TREND_METRICS),
+        help="발췌 대신 셀별 주간 추이 표(TSV) 출력 (기본 sunday_ratio, 기간 무관 전체 이력, --end 주차까지)",
+    )
+    parser.add_argument("--weeks", type=int, default=TREND_WEEKS, help=f"--trend 주 수 (기본 {TREND_WEEKS})")
+    parser.add_argument(
+        "--attendance",
+        choices=list(ATTENDANCE_KINDS),
+        help="발췌 대신 결석자 명단으로 만든 셀원별 출결 표(TSV) 출력 (sunday = 주일, week = 주간 셀예배, 기간 무관 전체 이력)",
+    )
+    parser.add_argument(
+        "--absent-streak",
+        type=int,
+        metavar="N",
+        help=f"셀원별 표 대신 N주 이상 연속 결석한 구간 출력 (보고가 없던 주는 건너뜀, 보통 {ABSENT_STREAK_WEEKS})",
+    )
+    parser.add_argument("--ongoing", action="store_true", help="--absent-streak 에서 지금도 이어지는 연속 결석만")
+    parser.add_argument("--print-report-schema", action="store_true", help="기본 보고서 양식을 JSON 으로 출력하고 끝냄")
+    parser.add_argument("-C", "--context", type=int, default=0, metavar="N", help="검색된 메시지마다 시간순 앞뒤 N개 메시지를 함께 출력")
+    parser.add_argument("-B", "--before", type=int, metavar="N", help="앞쪽 문맥 메시지 수 (-C 대신 따로 지정)")
+    parser.add_argument("-A", "--after", type=int, metavar="N", help="뒤쪽 문맥 메시지 수 (-C 대신 따로 지정)")
+    parser.add_argument("-o", "--output", help="결과 파일 경로 (생략 시 표준 출력)")
+    parser.add_argument("--encoding", help="입력 인코딩 (생략 시 앞부분 표본으로 자동 판정)")
+    parser.add_argument("--today", type=date.fromisoformat, default=date.today(), help="연도 추정 기준일 (기본 오늘)")
+    parser.add_argument("--workers", type=int, help="병렬 파싱 프로세스 수 (기본 CPU 수)")
+    parser.add_argument("--archive", help="SQLite 아카이브 경로: 입력을 쌓아 두고(중복 제외) 아카이브 전체에서 검색")
+    parser.add_argument("--room", help="아카이브 방 이름 (생략 시 입력 파일 이름)")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.print_report_schema:
+        sys.stdout.write(json.dumps(default_report_schema(), ensure_ascii=False, indent=2) + "\n")
+        return 0
+    if args.input is None and not args.archive:
+        parser.error("입력 파일을 지정하거나 --archive 로 아카이브를 검색하세요.")
+    before, after = _context_size(args)
+    if min(before, after) < 0:
+        parser.error("문맥 메시지 수는 0 이상이어야 합니다.")
+    if args.archive and (before or after):
+        parser.error("-C/-B/-A 문맥 출력은 --archive 없이 입력 파일을 검색할 때만 쓸 수 있습니다.")
+    if args.archive and args.report_schema and args.input is None:
+        # 아카이브 보고서는 적재할 때 파싱해 둔 것이라 양식을 바꿔도 다시 파싱되지 않음
+        parser.error("--report-schema 는 --archive 에 입력 파일을 적재할 때만 쓸 수 있습니다 (이미 쌓인 보고서는 적재 때 양식 그대로).")
+    if args.absent_streak is not None:
+        if args.absent_streak < 1:
+            parser.error("--absent-streak 주 수는 1 이상이어야 합니다.")
+        args.attendance = args.attendance or "sunday"
+
+    if args.preset:
+        if args.sender or args.keyword:
+            parser.error("--preset 은 -s/-k 와 함께 쓸 수 없습니다.")
+        try:
+            preset = find_preset(load_presets(args.presets), args.preset)
+        except KeyError:
+            parser.error(f"프리셋 '{args.preset}' 이(가) {args.presets} 에 없습니다.")
+        except (OSError, ValueError) as e:
+            print(e, file=sys.stderr)
+            return 2
+        args.sender, args.keyword = list(preset.senders), list(preset.keywords)
+
+    try:
+        parse_keyword_lines(args.keyword)
+        args.matcher = load_report_schema(args.report_schema) if args.report_schema else None
+    except (OSError, ValueError) as e:
+        print(e, file=sys.stderr)
+        return 2
+
+    if args.archive:
+        return _run_archive(args, parser)
+
+    msgs = _parse_input(args)
+    if not msgs:
+        print("메시지 헤더(날짜/시간)를 인식하지 못했습니다. 카톡 내보내기 형식을 확인해 주세요.", file=sys.stderr)
+        return 1
+
+    if args.trend or args.attendance:
+        store = ReportStore(args.matcher, args.reconcile)
+        store.update(msgs)
+        _write_output(args, _attendance_tsv(args, store) if args.attendance else _trend_tsv(args, store))
+        return 0
+
+    start_d, end_d = _date_range(args, auto_date_range(msgs)[1])
+    filtered = filter_messages(
+        messages=msgs,
+        start_d=start_d,
+        end_d=end_d,
+        senders=args.sender,
+        keywords=args.keyword,
+    )
+    print(
+        f"기간 {start_d.isoformat()} ~ {end_d.isoformat()} / 총 메시지 {len(msgs)} / 필터 통과 {len(filtered)}",
+        file=sys.stderr,
+    )
+
+    if args.reports:
+        reports = (r for _, r in msgs.cell_reports([m.index for m in filtered], args.matcher))
+        output_text = _reconciled_tsv(args, reports)
+    elif before or after:
+        output_text = render_context(
+            msgs, (m.index for m in filtered), before, after, include_header=not args.no_header
+        )
+    else:
+        output_text = render_blocks(filtered, include_header=not args.no_header)
+    _write_output(args, output_text)
+    return 0
+
+
+def _parse_input(args: argparse.Namespace) -> MessageTable:
+    """입력 파일(또는 표준 입력) 파싱. 파일을 못 읽으면 다른 사용 오류처럼 메시지와 함께 종료 코드 2"""
+    errors = "replace" if args.encoding else None
+    try:
+        if args.input == "-":
+            parsed = iter_buffer_messages(sys.stdin.buffer.read(), args.today, encoding=args.encoding, errors=errors)
+        else:
+            # 파일은 메모리 매핑 후 (크면 병렬로) 파싱
+            parsed = split_messages_parallel(
+                args.input, args.today, encoding=args.encoding, errors=errors, workers=args.workers
+            )
+        return MessageTable.from_messages(parsed)
+    except OSError as e:
+        print(f"입력 파일을 읽을 수 없습니다: {e}", file=sys.stderr)
+        sys.exit(2)
+
+
+def _context_size(args: argparse.Namespace) -> Tuple[int, int]:
+    """(앞, 뒤) 문맥 메시지 수 (-B/-A 가 -C 보다 우선)"""
+    before = args.before if args.before is not None else args.context
+    after = args.after if args.after is not None else args.context
+    return before, after
+
+
+def _date_range(args: argparse.Namespace, latest: date) -> Tuple[date, date]:
+    """지정하지 않은 쪽은 UI 와 같은 자동 기간(기준일 = 가장 최신 메시지 날짜)"""
+    end_d = args.end or latest
+    start_d = args.start or end_d - timedelta(days=args.days - 1)
+    if start_d > end_d:
+        start_d, end_d = end_d, start_d
+    return start_d, end_d
+
+
+def _run_archive(args: argparse.Namespace, parser: argparse.ArgumentParser) -> int:
+    room = args.room
+    if room is None:
+        if args.input in (None, "-"):
+            parser.error("--archive 에서 표준 입력을 쓰거나 입력 파일이 없으면 --room 이 필요합니다.")
+        room = os.path.splitext(os.path.basename(args.input))[0]
+
+    # 입력을 먼저 파싱: 읽을 수 없는 파일이면 빈 아카이브를 만들지 않고 끝냄
+    parsed = _parse_input(args) if args.input is not None else None
+    with MessageArchive(args.archive) as archive:
+        if parsed is not None:
+            added = archive.add_messages(room, parsed, args.matcher)
+            print(f"[{room}] 새 메시지 {added}건 추가", file=sys.stderr)
+
+        latest = archive.latest_date(room)
+        if latest is None:
+            print(f"아카이브에 '{room}' 방 메시지가 없습니다.", file=sys.stderr)
+            return 1
+
+        start_d, end_d = _date_range(args, latest)
+        query = (room, start_d, end_d, args.sender, args.keyword)
+        if args.trend or args.attendance:
+            # 적재 때 파싱해 둔 보고서를 그대로 모음 (본문 재파싱 없음)
+            store = ReportStore(mode=args.reconcile)
+            store.extend(archive.cell_reports(room))
+            output_text = _attendance_tsv(args, store) if args.attendance else _trend_tsv(args, store)
+            passed = f"보고서 {sum(s.reports for s in store.totals.values())}"
+        elif args.reports:
+            output_text = _reconciled_tsv(args, archive.cell_reports(*query))
+            passed = "보고서"
+        else:
+            filtered = archive.filter_messages(*query)
+            output_text = render_blocks(filtered, include_header=not args.no_header)
+            passed = f"필터 통과 {len(filtered)}"
+        print(
+            f"기간 {start_d.isoformat()} ~ {end_d.isoformat()} / 아카이브 메시지 {archive.count(room)} / {passed}",
+            file=sys.stderr,
+        )
+
+    _write_output(args, output_text)
+    return 0
+
+
+def _trend_tsv(args: argparse.Namespace, store: ReportStore) -> str:
+    """주차별 한 줄, 셀별 한 열 (비율은 소수 셋째 자리, 보고서가 없는 주는 빈 칸)"""
+    rows = store.trend_rows(args.trend, args.weeks, iso_week(args.end) if args.end else None)
+    lines = ["\t".join(rows[0])] if rows else []
+    for row in rows:
+        lines.append("\t".join(
+            "" if v is None else f"{v:.3f}" if isinstance(v, float) else str(v)
+            for v in row.values()
+        ))
+    return "\n".join(lines)
+
+
+def _attendance_tsv(args: argparse.Namespace, store: ReportStore) -> str:
+    """셀원별 출결 표, --absent-streak 면 연속 결석 구간 표 (출석률은 소수 셋째 자리, 모름은 빈 칸)"""
+    ledger = store.attendance[args.attendance]
+    if args.absent_streak is not None:
+        return _reports_tsv(ledger.streak_rows(args.absent_streak, args.ongoing))
+    return _reports_tsv([{k: "" if v is None else v for k, v in row.items()} for row in ledger.member_rows()])
+
+
+def _reconciled_tsv(args: argparse.Namespace, reports: Iterable[CellReport]) -> str:
+    """(셀, 주차) 별로 정리한 보고서 표 (--superseded 면 대체된 이전 판본 표)"""
+    reconciler = ReportReconciler(args.reconcile)
+    reconciler.extend(reports)
+    return _reports_tsv(reconciler.superseded_rows() if args.superseded else reconciler.rows())
+
+
+def _reports_tsv(rows: List[dict]) -> str:
+    lines = ["\t".join(rows[0])] if rows else []
+    lines += ["\t".join(str(v) for v in row.values()) for row in rows]
+    return "\n".join(lines)
+
+
+def _write_output(args: argparse.Namespace, output_text: str) -> None:
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output_text + "\n")
+    else:
+        sys.stdout.write(output_text + "\n")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
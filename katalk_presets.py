@@ -0,0 +1,113 @@
+"""
+자주 쓰는 조건(발신자 목록 + 키워드 목록)을 이름 붙여 JSON 파일로 보관하는 프리셋
+- 프리셋별 적중 비트맵은 MessageTable.hit_bitmap 이 파싱한 테이블마다 한 번만 계산해 둠
+  → 프리셋을 바꾸거나 기간만 바꿀 땐 비트맵 AND 만 (본문을 다시 훑지 않음)
+- 증분 파싱으로 행이 늘어나면 비트맵은 늘어난 행만큼 이어 붙여짐
+"""
+import json
+import os
+from dataclasses import dataclass
+from datetime import date
+from typing import List, Optional, Tuple
+
+from katalk_core import MessageTable, bitmap_ids
+from katalk_search import AndNode, OrNode, QueryNode, SenderTerm, parse_keyword_lines
+
+# 프리셋 파일 경로 (작업 폴더 기준, 환경 변수 KATALK_PRESETS 로 바꿀 수 있음)
+PRESETS_FILE = os.environ.get("KATALK_PRESETS", "katalk_presets.json")
+
+
+@dataclass(frozen=True)
+class KeywordPreset:
+    name: str
+    senders: Tuple[str, ...] = ()
+    keywords: Tuple[str, ...] = ()
+
+    def query(self) -> Optional[QueryNode]:
+        """filter_messages 와 같은 조건의 질의 트리 (기간 제외, 조건이 없으면 None = 전체)"""
+        items: List[QueryNode] = []
+        if self.senders:
+            items.append(OrNode(tuple(SenderTerm(q) for q in self.senders)))
+        query = parse_keyword_lines(list(self.keywords))
+        if query is not None:
+            items.append(query)
+        if not items:
+            return None
+        return items[0] if len(items) == 1 else AndNode(tuple(items))
+
+
+# 파일이 없을 때 쓰는 프리셋 (매주 돌리는 출석/헌금/기도제목)
+DEFAULT_PRESETS = (
+    KeywordPreset("출석", keywords=("출석", "결석")),
+    KeywordPreset("헌금", keywords=("헌금",)),
+    KeywordPreset("기도제목", keywords=("기도제목", "기도 부탁", "중보")),
+)
+
+
+def load_presets(path: str = PRESETS_FILE) -> List[KeywordPreset]:
+    """
+    프리셋 파일 읽기 (없으면 DEFAULT_PRESETS)
+    - 형식: {"presets": [{"name": "...", "senders": [...], "keywords": [...]}, ...]}
+    - 검색식이 잘못된 프리셋이 있으면 ValueError (이름 포함)
+    """
+    if not os.path.exists(path):
+        return list(DEFAULT_PRESETS)
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    presets = []
+    for item in data.get("presets", []):
+        preset = KeywordPreset(
+            name=str(item["name"]),
+            senders=tuple(item.get("senders", ())),
+            keywords=tuple(item.get("keywords", ())),
+        )
+        try:
+            preset.query()
+        except ValueError as e:
+            raise ValueError(f"프리셋 '{preset.name}': {e}") from None
+        presets.append(preset)
+    return presets
+
+
+def save_presets(presets: List[KeywordPreset], path: str = PRESETS_FILE) -> None:
+    """프리셋 파일 쓰기 (임시 파일에 쓴 뒤 교체 → 쓰다 끊겨도 기존 파일 유지)"""
+    data = {
+        "presets": [
+            {"name": p.name, "senders": list(p.senders), "keywords": list(p.keywords)}
+            for p in presets
+        ]
+    }
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+    os.replace(tmp_path, path)
+
+
+def upsert_preset(presets: List[KeywordPreset], preset: KeywordPreset) -> List[KeywordPreset]:
+    """같은 이름이 있으면 그 자리에서 교체, 없으면 끝에 추가"""
+    names = [p.name for p in presets]
+    if preset.name in names:
+        return [preset if p.name == preset.name else p for p in presets]
+    return presets + [preset]
+
+
+def find_preset(presets: List[KeywordPreset], name: str) -> KeywordPreset:
+    for p in presets:
+        if p.name == name:
+            return p
+    raise KeyError(name)
+
+
+def preset_bitmap(table: MessageTable, preset: KeywordPreset) -> int:
+    """프리셋 조건에 맞는 행의 비트맵 (테이블에 캐시됨)"""
+    query = preset.query()
+    if query is None:
+        return (1 << len(table)) - 1
+    return table.hit_bitmap(query)
+
+
+def preset_ids(table: MessageTable, preset: KeywordPreset, start_d: date, end_d: date) -> List[int]:
+    """기간 비트맵 AND 프리셋 비트맵 → 행 번호 (filter_messages 와 같은 결과, 오름차순)"""
+    return bitmap_ids(table.date_bitmap(start_d, end_d) & preset_bitmap(table, preset))
@@ -0,0 +1,784 @@
+"""
+셀 보고서 양식 파일과 여러 주에 걸친 보고서 집계
+- 양식(schema) 파일: 교구나 양식 개정마다 코드를 고치지 않도록 표지를 선언적으로 기술
+  JSON / TOML(Python 3.11+ tomllib) / YAML(PyYAML 이 있을 때) 을 확장자로 구분
+  읽은 양식은 katalk_core.ReportMatcher 로 컴파일해 두고, 파일의 수정 시각/크기가 바뀔 때만 다시 읽음
+- ReportStore: (셀, ISO 주차) 별 누적 합으로 52주 추이를 전체 이력 재파싱 없이 조회
+- ReportReconciler: 같은 (셀, 주차) 에 다시 올린/고친 보고서를 하나로 정리 (이전 판본은 감사용으로 보관)
+- AttendanceLedger: 결석자 명단을 이름별로 풀어 셀원 x 주차 출결 장부 (출석률, 연속 결석)
+
+양식 예 (TOML)
+    name = "3청년부"
+    cell_id = '3[- ]?(\\d)셀'             # 첫 번째 그룹 = 셀 번호
+
+    [sections]                            # 구역 머리글 → 모드
+    "주일 예배 현황" = "sunday"
+    "주간 셀예배 출결 현황" = "week"
+
+    [[fields]]
+    marker = "- 재적"
+    type = "count"                        # count / money / ox / names
+    target = { sunday = "sunday_total", week = "week_total" }
+
+    [[fields]]
+    marker = "- 헌금"
+    type = "money"
+    target = "offering"                   # CellReport 필드, 또는 "devotion.키"
+"""
+import bisect
+import json
+import os
+import re
+import sys
+import threading
+from dataclasses import dataclass, replace
+from dataclasses import fields as dataclass_fields
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from katalk_core import (
+    CELL_REPORT_FIELDS,
+    DEFAULT_REPORT_MATCHER,
+    REPORT_COUNT,
+    REPORT_FLAG,
+    REPORT_MODE,
+    REPORT_MONEY,
+    REPORT_NAMES,
+    RE_CELL_ID,
+    CellReport,
+    MessageTable,
+    ReportField,
+    ReportMatcher,
+    report_row,
+)
+
+
+# =========================
+# 1) 보고서 양식 파일
+# =========================
+# 양식 파일의 값 종류 → 표지 종류
+SCHEMA_TYPES = {
+    "count": REPORT_COUNT,
+    "money": REPORT_MONEY,
+    "ox": REPORT_FLAG,
+    "names": REPORT_NAMES,
+}
+_TYPE_NAMES = {kind: name for name, kind in SCHEMA_TYPES.items()}
+
+# 값을 넣을 수 있는 CellReport 필드 → 기본값 종류 (int: count/money, str: names)
+_REPORT_TARGETS = {
+    f.name: type(f.default)
+    for f in dataclass_fields(CellReport)
+    if f.name not in ("cell_no", "leader", "devotion", "sent_at")
+}
+
+SCHEMA_EXTENSIONS = (".json", ".toml", ".yaml", ".yml")
+
+# cell_id 검사용 본문 표본: 맞는 표본에서는 첫 그룹이 숫자만 잡아야 함 (int 로 셀 번호를 만듦)
+_CELL_ID_SAMPLES = ("3-1셀", "3 12셀", "31셀", "3-가셀", "가셀", "A셀", "새가족셀")
+
+# 경로 → ((수정 시각, 크기), 컴파일된 양식)
+_schema_cache: Dict[str, Tuple[Tuple[int, int], ReportMatcher]] = {}
+
+
+def read_report_schema(path: str) -> dict:
+    """
+    양식 파일을 확장자에 맞게 읽어 딕셔너리로 (검증은 compile_report_schema)
+    - tomllib / yaml 은 그 확장자를 읽을 때만 import (CLI 시작 시간에 넣지 않음)
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".json":
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    if ext == ".toml":
+        try:
+            import tomllib
+        except ImportError:  # Python 3.10 이하: TOML 양식만 못 씀
+            raise ValueError("TOML 양식은 Python 3.11 이상에서만 읽을 수 있습니다. JSON 으로 바꿔 주세요.") from None
+        with open(path, "rb") as f:
+            return tomllib.load(f)
+    if ext in (".yaml", ".yml"):
+        try:
+            import yaml  # type: ignore
+        except ImportError:  # 선택 의존성: 없으면 YAML 양식만 못 씀
+            raise ValueError("YAML 양식을 읽으려면 PyYAML 이 필요합니다 (pip install pyyaml). JSON/TOML 도 됩니다.") from None
+        with open(path, "r", encoding="utf-8") as f:
+            return yaml.safe_load(f)
+    raise ValueError(f"양식 파일 확장자를 알 수 없습니다: {path} ({', '.join(SCHEMA_EXTENSIONS)})")
+
+
+def compile_report_schema(schema: dict, key: str = "schema") -> ReportMatcher:
+    """
+    양식 딕셔너리 → ReportMatcher (잘못된 곳은 위치를 붙여 ValueError)
+    - 구역 머리글이 표 앞쪽, 필드는 적힌 순서대로 (한 줄에 표지가 여러 개면 이 순서로 적용)
+    """
+    if not isinstance(schema, dict):
+        raise ValueError("보고서 양식 오류: 최상위가 객체(키-값)가 아닙니다")
+
+    pattern = schema.get("cell_id", RE_CELL_ID.pattern)
+    try:
+        cell_pattern = re.compile(pattern)
+    except (re.error, TypeError) as e:
+        raise ValueError(f"보고서 양식 오류: cell_id 정규식을 컴파일할 수 없음 ({e})") from None
+    if cell_pattern.groups < 1:
+        raise ValueError("보고서 양식 오류: cell_id 에 셀 번호를 잡는 그룹 (\\d) 이 없음")
+    for sample in _CELL_ID_SAMPLES:
+        m = cell_pattern.search(sample)
+        if m and not (m.group(1) or "").isdecimal():
+            raise ValueError(
+                f"보고서 양식 오류: cell_id 의 첫 그룹이 숫자가 아닌 것을 잡음 ('{sample}' → {m.group(1)!r})"
+            )
+
+    sections = schema.get("sections", {})
+    if not isinstance(sections, dict):
+        raise ValueError("보고서 양식 오류: sections 는 '머리글 = 모드' 목록이어야 함")
+    table: List[ReportField] = []
+    for marker, mode in sections.items():
+        if not marker or not isinstance(mode, str) or not mode:
+            raise ValueError(f"보고서 양식 오류: sections.{marker!r} 의 모드 이름이 비어 있음")
+        table.append(ReportField(marker, REPORT_MODE, mode))
+    modes = set(sections.values())
+
+    items = schema.get("fields", [])
+    if not isinstance(items, list) or not items:
+        raise ValueError("보고서 양식 오류: fields 가 비어 있음")
+    for n, item in enumerate(items):
+        where = f"fields[{n}]"
+        if not isinstance(item, dict):
+            raise ValueError(f"보고서 양식 오류: {where} 가 객체가 아님")
+        marker = item.get("marker")
+        if not isinstance(marker, str) or not marker:
+            raise ValueError(f"보고서 양식 오류: {where}.marker 가 비어 있음")
+        kind = SCHEMA_TYPES.get(item.get("type"))
+        if kind is None:
+            raise ValueError(f"보고서 양식 오류: {where}.type 은 {' / '.join(SCHEMA_TYPES)} 중 하나여야 함")
+
+        target = item.get("target")
+        if isinstance(target, dict):
+            if not target:
+                raise ValueError(f"보고서 양식 오류: {where}.target 의 모드별 필드가 비어 있음")
+            for mode, name in target.items():
+                if mode not in modes:
+                    raise ValueError(f"보고서 양식 오류: {where}.target 의 모드 '{mode}' 가 sections 에 없음")
+                _check_target(f"{where}.target.{mode}", kind, name)
+            table.append(ReportField(marker, kind, modes=tuple(target.items())))
+        else:
+            _check_target(f"{where}.target", kind, target)
+            table.append(ReportField(marker, kind, target))
+
+    return ReportMatcher(table, cell_pattern, key=key)
+
+
+def _check_target(where: str, kind: str, target: object) -> None:
+    if not isinstance(target, str) or not target:
+        raise ValueError(f"보고서 양식 오류: {where} 가 비어 있음")
+    if target.startswith("devotion.") and len(target) > len("devotion."):
+        return
+    expected = _REPORT_TARGETS.get(target)
+    if expected is None:
+        raise ValueError(
+            f"보고서 양식 오류: {where} '{target}' 는 없는 필드 "
+            f"({', '.join(_REPORT_TARGETS)} 또는 devotion.이름)"
+        )
+    if (expected is str) != (kind == REPORT_NAMES) or kind == REPORT_FLAG:
+        raise ValueError(f"보고서 양식 오류: {where} '{target}' 에는 {_TYPE_NAMES[kind]} 값을 넣을 수 없음")
+
+
+def load_report_schema(path: str) -> ReportMatcher:
+    """
+    양식 파일 → ReportMatcher. 같은 파일은 수정 시각/크기가 그대로면 컴파일해 둔 것을 재사용
+    - matcher.key 에 경로와 버전이 들어가므로 결과 캐시 키로 쓸 수 있음
+    """
+    st = os.stat(path)
+    stamp = (st.st_mtime_ns, st.st_size)
+    cached = _schema_cache.get(path)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    schema = read_report_schema(path)
+    try:
+        matcher = compile_report_schema(schema, key=f"{path}@{stamp[0]}:{stamp[1]}")
+    except ValueError as e:
+        raise ValueError(f"{e} — {path}") from None
+    _schema_cache[path] = (stamp, matcher)
+    return matcher
+
+
+def list_report_schemas(directory: str) -> List[str]:
+    """폴더 안의 양식 파일 경로 (이름순, 폴더가 없으면 빈 목록)"""
+    if not os.path.isdir(directory):
+        return []
+    return sorted(
+        os.path.join(directory, name)
+        for name in os.listdir(directory)
+        if os.path.splitext(name)[1].lower() in SCHEMA_EXTENSIONS
+    )
+
+
+def default_report_schema() -> dict:
+    """기본 양식(DEFAULT_REPORT_MATCHER)을 양식 파일 형식으로 (새 양식을 만들 때 출발점)"""
+    sections = {f.marker: f.target for f in CELL_REPORT_FIELDS if f.kind == REPORT_MODE}
+    items = [
+        {
+            "marker": f.marker,
+            "type": _TYPE_NAMES[f.kind],
+            "target": dict(f.modes) if f.modes else f.target,
+        }
+        for f in CELL_REPORT_FIELDS
+        if f.kind != REPORT_MODE
+    ]
+    return {
+        "name": "기본",
+        "cell_id": DEFAULT_REPORT_MATCHER.cell_pattern.pattern,
+        "sections": sections,
+        "fields": items,
+    }
+
+
+# =========================
+# 2) 셀 x ISO 주차 보고서 저장소 (주간 추이)
+# =========================
+# 주차 = (ISO 연도, ISO 주 번호)
+Week = Tuple[int, int]
+
+# 주차별로 더해 두는 보고서 필드
+_SUM_FIELDS = (
+    "sunday_total", "sunday_attend",
+    "week_total", "week_attend",
+    "bible", "prayer", "offering",
+)
+
+# 추이로 볼 수 있는 값 → 표시 이름
+TREND_METRICS = {
+    "sunday_ratio": "주일 출석률",
+    "week_ratio": "주간 출석률",
+    "sunday_attend": "주일 출석",
+    "week_attend": "주간 출석",
+    "bible": "성경읽기",
+    "prayer": "기도",
+    "offering": "헌금",
+}
+
+TREND_WEEKS = 52
+
+
+def iso_week(d: date) -> Week:
+    year, week, _ = d.isocalendar()
+    return year, week
+
+
+def week_label(week: Week) -> str:
+    return f"{week[0]}-W{week[1]:02d}"
+
+
+@dataclass
+class WeekStats:
+    """한 셀(또는 전체)의 한 주 누적값. 출석률은 누적 합에서 바로 계산"""
+    reports: int = 0
+    sunday_total: int = 0
+    sunday_attend: int = 0
+    week_total: int = 0
+    week_attend: int = 0
+    bible: int = 0
+    prayer: int = 0
+    offering: int = 0
+
+    def add(self, report: CellReport, sign: int = 1) -> None:
+        """보고서 하나를 더함 (sign=-1 이면 뺌)"""
+        self.reports += sign
+        for name in _SUM_FIELDS:
+            setattr(self, name, getattr(self, name) + sign * getattr(report, name))
+
+    @property
+    def sunday_ratio(self) -> Optional[float]:
+        return self.sunday_attend / self.sunday_total if self.sunday_total else None
+
+    @property
+    def week_ratio(self) -> Optional[float]:
+        return self.week_attend / self.week_total if self.week_total else None
+
+
+# 같은 (셀, 주차) 보고서가 여러 번 올라왔을 때 정리 방법
+RECONCILE_LATEST = "latest"   # 가장 늦게 보낸 보고서 하나로
+RECONCILE_MERGE = "merge"     # 보낸 순서대로 필드별 덮어쓰기 (0 / 빈 값은 '안 적음'으로 보고 건너뜀)
+RECONCILE_MODES = (RECONCILE_LATEST, RECONCILE_MERGE)
+
+_MERGE_FIELDS = _SUM_FIELDS + ("absentees_sunday", "absentees_week")
+
+
+def report_key(report: CellReport) -> Tuple[int, Week]:
+    if report.sent_at is None:
+        raise ValueError("보낸 시각(sent_at)이 없는 보고서는 주차를 정할 수 없습니다")
+    return report.cell_no, iso_week(report.sent_at.date())
+
+
+def merge_reports(older: CellReport, newer: CellReport) -> CellReport:
+    """newer 에 적힌(0 / 빈 값이 아닌) 필드만 older 위에 덮어쓴 새 보고서 (보고자/시각은 newer)"""
+    merged = replace(older, leader=newer.leader, sent_at=newer.sent_at, devotion=dict(older.devotion or {}))
+    for name in _MERGE_FIELDS:
+        value = getattr(newer, name)
+        if value:
+            setattr(merged, name, value)
+    merged.devotion.update(newer.devotion or {})
+    return merged
+
+
+class ReportReconciler:
+    """
+    (셀, 주차) 해시 색인으로 다시 올린/고친 보고서를 하나로 정리 (보고서끼리 짝지어 비교하지 않음)
+    - 칸마다 받은 판본을 보낸 순서로 모두 보관 → current 는 정리된 하나, superseded 는 감사용 이전 판본
+    - 늦게 도착한(보낸 시각이 더 이른) 판본도 보낸 순서 자리에 끼워 다시 정리
+    """
+
+    def __init__(self, mode: str = RECONCILE_LATEST) -> None:
+        if mode not in RECONCILE_MODES:
+            raise ValueError(f"알 수 없는 정리 방법: {mode} ({', '.join(RECONCILE_MODES)})")
+        self.mode = mode
+        self.current: Dict[Tuple[int, Week], CellReport] = {}
+        self._versions: Dict[Tuple[int, Week], List[Tuple[datetime, int, CellReport]]] = {}
+        self._seq = 0
+
+    def __len__(self) -> int:
+        return len(self.current)
+
+    def add(self, report: CellReport) -> Tuple[Optional[CellReport], CellReport]:
+        """판본 하나 추가. 반환: (그 칸의 이전 정리본 또는 None, 새 정리본)"""
+        key = report_key(report)
+        versions = self._versions.setdefault(key, [])
+        bisect.insort(versions, (report.sent_at, self._seq, report), key=lambda v: v[:2])
+        self._seq += 1
+
+        previous = self.current.get(key)
+        if self.mode == RECONCILE_LATEST:
+            reconciled = versions[-1][2]
+        else:
+            reconciled = versions[0][2]
+            for _, _, newer in versions[1:]:
+                reconciled = merge_reports(reconciled, newer)
+        self.current[key] = reconciled
+        return previous, reconciled
+
+    def extend(self, reports: Iterable[CellReport]) -> None:
+        for report in reports:
+            self.add(report)
+
+    def superseded(self, key: Optional[Tuple[int, Week]] = None) -> List[CellReport]:
+        """감사용: 최신 판본이 아닌 판본들 (key 생략 시 전체, 셀/주차/보낸 순서)"""
+        keys = [key] if key is not None else sorted(self._versions)
+        return [r for k in keys for _, _, r in self._versions.get(k, [])[:-1]]
+
+    def versions(self, key: Tuple[int, Week]) -> List[CellReport]:
+        return [r for _, _, r in self._versions.get(key, [])]
+
+    def rows(self) -> List[dict]:
+        """정리된 보고서 표 행 (셀 번호, 주차순). 이전 판본이 있으면 개수를 함께"""
+        return [
+            {"주": week_label(key[1]), **report_row(self.current[key]), "이전 판본": len(self._versions[key]) - 1}
+            for key in sorted(self.current)
+        ]
+
+    def superseded_rows(self) -> List[dict]:
+        return [
+            {
+                "주": week_label(report_key(r)[1]),
+                "보낸 시각": r.sent_at.strftime("%Y-%m-%d %H:%M"),
+                "보고자": r.leader,
+                **report_row(r),
+            }
+            for r in self.superseded()
+        ]
+
+
+class ReportStore:
+    """
+    셀 보고서를 (셀 번호, ISO 주차) 칸에 모아 두는 저장소
+    - 칸마다 누적 합(WeekStats)만 들고 있으므로 추이 조회는 칸 조회만 (보고서를 다시 파싱하지 않음)
+    - 같은 칸에 다시 올린 보고서는 ReportReconciler 로 정리: 이전 정리본을 빼고 새 정리본을 더함
+    - update(table): 테이블에서 지난번 이후 늘어난 행만 파싱해 더함 (증분)
+    - 아카이브는 extend(archive.cell_reports(room)) 로 적재해 둔 값을 그대로 씀
+    - attendance: 정리본의 결석자 명단으로 채우는 셀원별 출결 장부 (주일 / 주간)
+    - 더하기(add / extend / update)는 _lock 을 잡고 함: 화면에서는 캐시된 저장소 하나를 여러 세션이
+      같이 읽으므로, 채우는 도중의 칸을 다른 세션이 보거나 같은 행을 두 번 더하지 않도록
+    """
+
+    def __init__(self, matcher: Optional[ReportMatcher] = None, mode: str = RECONCILE_LATEST) -> None:
+        self.matcher = matcher
+        self.reconciler = ReportReconciler(mode)
+        self.cells: Dict[Tuple[int, Week], WeekStats] = {}
+        self.totals: Dict[Week, WeekStats] = {}
+        self.attendance = {kind: AttendanceLedger(kind) for kind in ATTENDANCE_KINDS}
+        self._table_rows = 0
+        self._lock = threading.RLock()
+
+    def add(self, report: CellReport) -> None:
+        with self._lock:
+            self._add(report)
+
+    def _add(self, report: CellReport) -> None:
+        previous, reconciled = self.reconciler.add(report)
+        if previous is reconciled:
+            return
+        key = report_key(report)
+        week = key[1]
+        stats = self.cells.get(key)
+        if stats is None:
+            stats = self.cells[key] = WeekStats()
+        total = self.totals.get(week)
+        if total is None:
+            total = self.totals[week] = WeekStats()
+        if previous is not None:
+            stats.add(previous, -1)
+            total.add(previous, -1)
+        stats.add(reconciled)
+        total.add(reconciled)
+        for ledger in self.attendance.values():
+            ledger.set(reconciled)
+
+    def extend(self, reports: Iterable[CellReport]) -> int:
+        n = 0
+        with self._lock:
+            for report in reports:
+                self._add(report)
+                n += 1
+        return n
+
+    def update(self, table: MessageTable) -> int:
+        """
+        테이블에서 아직 안 본 행만 파싱해 더함. 반환: 새로 더한 보고서 수
+        - 같은 테이블에 행이 이어 붙는 경우용 (다른 테이블이면 새 저장소를 만들 것)
+        """
+        with self._lock:
+            start, end = self._table_rows, len(table)
+            if start >= end:
+                return 0
+            reports = table.cell_reports(range(start, end), self.matcher)
+            self._table_rows = end
+            return self.extend(r for _, r in reports)
+
+    def cell_numbers(self) -> List[int]:
+        return sorted({cell_no for cell_no, _ in self.cells})
+
+    def latest_week(self) -> Optional[Week]:
+        return max(self.totals) if self.totals else None
+
+    def week_range(self, weeks: int = TREND_WEEKS, end: Optional[Week] = None) -> List[Week]:
+        """end 주차(생략 시 가장 최근 주차)까지 거슬러 weeks 개 주차 (오래된 순)"""
+        end = end or self.latest_week()
+        if end is None:
+            return []
+        monday = date.fromisocalendar(end[0], end[1], 1)
+        return [iso_week(monday - timedelta(weeks=k)) for k in range(weeks - 1, -1, -1)]
+
+    def trend(
+        self, cell_no: Optional[int], metric: str, weeks: int = TREND_WEEKS, end: Optional[Week] = None
+    ) -> List[Optional[float]]:
+        """셀 하나(None 이면 전체)의 주차별 값 (보고서가 없는 주는 None)"""
+        if metric not in TREND_METRICS:
+            raise ValueError(f"알 수 없는 추이 항목: {metric} ({', '.join(TREND_METRICS)})")
+        values = []
+        for week in self.week_range(weeks, end):
+            stats = self.totals.get(week) if cell_no is None else self.cells.get((cell_no, week))
+            values.append(getattr(stats, metric) if stats else None)
+        return values
+
+    def trend_rows(self, metric: str, weeks: int = TREND_WEEKS, end: Optional[Week] = None) -> List[dict]:
+        """주차별 한 행: {"주": "2025-W03", "1셀": 값, ..., "전체": 값} (화면/CLI 공통)"""
+        week_keys = self.week_range(weeks, end)
+        columns = {f"{cell_no}셀": self.trend(cell_no, metric, weeks, end) for cell_no in self.cell_numbers()}
+        columns["전체"] = self.trend(None, metric, weeks, end)
+        return [
+            {"주": week_label(week), **{name: values[k] for name, values in columns.items()}}
+            for k, week in enumerate(week_keys)
+        ]
+
+
+# =========================
+# 3) 셀원별 출결 장부 (결석자 명단 기반)
+# =========================
+# 출결 상태
+ATTEND_PRESENT = "present"
+ATTEND_ABSENT = "absent"
+ATTEND_UNKNOWN = "unknown"
+
+# 장부 종류 → 결석자 명단 필드, 표시 이름
+ATTENDANCE_KINDS = {
+    "sunday": ("absentees_sunday", "주일 예배"),
+    "week": ("absentees_week", "주간 셀예배"),
+}
+
+ABSENT_STREAK_WEEKS = 3
+
+# 명단 줄에서 이름이 아닌 것들
+_RE_NAME_NOTE = re.compile(r"\([^)]*\)|\[[^\]]*\]")   # 홍길동(출장) 의 사유, 2명(홍길동, 김철수) 의 명단
+_RE_HEADCOUNT = re.compile(r"(\d+)명")                # 인원수만 적은 칸: 2명(...)
+_RE_NAME_SEP = re.compile(r"[,，、/·\s]+")
+_NO_NAMES = {"없음", "없습니다", "무", "전원", "전원출석", "출석", "x", "X", "-"}
+_NAME_FILLERS = {"외", "등", "명"}
+
+# 주 번호: 2010-01-04(월요일, 카카오톡 출시 전) 부터 센 주 수 = 장부 비트맵의 비트 위치
+# (기준이 가까워야 비트맵이 작음: 10년치도 520 비트 남짓)
+_WEEK_BASE = date(2010, 1, 4).toordinal()
+_FIRST_WEEK = (2010, 1)
+
+
+def week_index(week: Week) -> int:
+    index = (date.fromisocalendar(week[0], week[1], 1).toordinal() - _WEEK_BASE) // 7
+    if index < 0:
+        raise ValueError(f"2010년 이전 주차는 장부에 넣을 수 없습니다: {week_label(week)}")
+    return index
+
+
+def index_week(index: int) -> Week:
+    return iso_week(date.fromordinal(index * 7 + _WEEK_BASE))
+
+
+def split_absentees(line: str) -> Optional[Tuple[str, ...]]:
+    """
+    결석자 줄 → 이름들 ("- 이번주 결석자 : 홍길동, 김철수(출장)" → ("홍길동", "김철수"))
+    - "없음" 등만 있으면 () (= 전원 출석). ':' 없이 "이번주 결석자 없음" 처럼 끝나도 ()
+    - 이름과 섞인 "없음"/"전원" 은 군말로 보고 버림 ("홍길동 외 없음" → ("홍길동",))
+    - 괄호 속 사유, "외 2명" 같은 숫자/군말은 버리고, 이름은 sys.intern 으로 한 벌만 보관
+    - 인원수만 있으면 괄호 속이 명단 ("1명(홍길동)" → ("홍길동",)), 수가 안 맞으면 None
+    - ':' 뒤가 비었거나 이름 칸을 못 찾으면 None (= 모름)
+    """
+    _, sep, names = line.partition(":")
+    if not sep:
+        _, sep, names = line.partition("：")
+    if not sep:
+        words = _RE_NAME_SEP.split(line.strip().rstrip("."))
+        return () if words[-1] in _NO_NAMES else None
+    result: List[str] = []
+    headcounts, said_none = _collect_names(_RE_NAME_NOTE.sub(" ", names), result)
+    if result:
+        return tuple(result)
+    if headcounts:
+        for note in _RE_NAME_NOTE.findall(names):
+            _collect_names(note[1:-1], result)
+        return tuple(result) if len(result) == sum(headcounts) else None
+    return () if said_none else None
+
+
+def _collect_names(text: str, result: List[str]) -> Tuple[List[int], bool]:
+    """text 의 이름을 result 에 더하고 (인원수 칸의 수들, "없음" 류가 있었는지) 반환"""
+    headcounts = []
+    said_none = False
+    for token in _RE_NAME_SEP.split(text):
+        if token in _NO_NAMES:
+            said_none = True
+            continue
+        token = token.strip(".·-")
+        if not token or token in _NAME_FILLERS:
+            continue
+        if token in _NO_NAMES:
+            said_none = True
+        elif any(ch.isdigit() for ch in token):
+            match = _RE_HEADCOUNT.fullmatch(token)
+            if match:
+                headcounts.append(int(match.group(1)))
+        elif token not in result:
+            result.append(sys.intern(token))
+    return headcounts, said_none
+
+
+@dataclass(frozen=True)
+class AbsentStreak:
+    """연속 결석 한 구간 (보고가 없던 주는 건너뛰고 센 보고 주 수)"""
+    cell_no: int
+    name: str
+    weeks: int
+    first: Week
+    last: Week
+    ongoing: bool   # 셀의 가장 최근 보고 주까지 이어지는지
+
+
+class AttendanceLedger:
+    """
+    셀원별 출결 장부: (셀원, 날짜) → 출석 / 결석 / 모름
+    - 셀원 = (셀 번호, 이름). 결석자 명단에 한 번이라도 오른 이름 (같은 이름도 셀이 다르면 다른 사람)
+    - 셀원마다 결석 주 비트맵 하나, 셀마다 명단이 있는 보고 주 비트맵 하나 (비트 = week_index)
+      → 출석 = 셀의 보고 주 중 결석이 아닌 주 (명단에 처음 오른 주부터)
+      → 셀에 보고가 없거나 명단을 못 읽은 주, 처음 오르기 전 주는 모름
+    - set(report): 같은 (셀, 주차) 는 덮어씀 (ReportReconciler 의 정리본을 넣는 용도)
+    - 연속 결석은 셀의 보고 주만 이어 붙인 열에서 셈 (명절 등 보고가 빠진 주에서 끊기지 않음)
+      셀 단위로 압축한 비트맵은 그 셀이 바뀔 때만 다시 만듦
+    """
+
+    def __init__(self, kind: str = "sunday") -> None:
+        if kind not in ATTENDANCE_KINDS:
+            raise ValueError(f"알 수 없는 출결 종류: {kind} ({', '.join(ATTENDANCE_KINDS)})")
+        self.kind = kind
+        self._field = ATTENDANCE_KINDS[kind][0]
+        self.members: List[Tuple[int, str]] = []
+        self._member_ids: Dict[Tuple[int, str], int] = {}
+        self._cell_members: Dict[int, List[int]] = {}
+        self._absent: List[int] = []
+        self._reported: Dict[int, int] = {}
+        self._weeks: Dict[Tuple[int, int], Tuple[int, ...]] = {}
+        # 셀 번호 → (보고 주 번호 목록, 셀원별 압축 결석 비트맵)
+        self._packed: Dict[int, Tuple[List[int], Dict[int, int]]] = {}
+
+    def __len__(self) -> int:
+        return len(self.members)
+
+    def _member(self, cell_no: int, name: str) -> int:
+        key = (cell_no, name)
+        mid = self._member_ids.get(key)
+        if mid is None:
+            mid = self._member_ids[key] = len(self.members)
+            self.members.append(key)
+            self._absent.append(0)
+            self._cell_members.setdefault(cell_no, []).append(mid)
+        return mid
+
+    def set(self, report: CellReport) -> None:
+        """보고서 하나의 결석자 명단을 그 (셀, 주차) 에 반영 (이미 있으면 교체, 2010년 이전 주차는 무시)"""
+        cell_no, week = report_key(report)
+        if week < _FIRST_WEEK:
+            return
+        wk = week_index(week)
+        names = split_absentees(getattr(report, self._field) or "")
+        new = None if names is None else tuple(self._member(cell_no, n) for n in names)
+        old = self._weeks.get((cell_no, wk))
+        if new == old:
+            return
+
+        bit = 1 << wk
+        for mid in old or ():
+            self._absent[mid] &= ~bit
+        if new is None:
+            self._weeks.pop((cell_no, wk), None)
+            self._reported[cell_no] = self._reported.get(cell_no, 0) & ~bit
+        else:
+            self._weeks[(cell_no, wk)] = new
+            self._reported[cell_no] = self._reported.get(cell_no, 0) | bit
+            for mid in new:
+                self._absent[mid] |= bit
+        self._packed.pop(cell_no, None)
+
+    def extend(self, reports: Iterable[CellReport]) -> None:
+        for report in reports:
+            self.set(report)
+
+    def _known(self, mid: int) -> int:
+        """셀원이 출결을 알 수 있는 주 비트맵 (명단에 처음 오른 주부터 셀의 보고 주)"""
+        absent = self._absent[mid]
+        if not absent:
+            return 0
+        first = (absent & -absent).bit_length() - 1
+        return self._reported.get(self.members[mid][0], 0) >> first << first
+
+    def status(self, cell_no: int, name: str, day: date) -> str:
+        """그 날짜가 든 주의 출결 (ATTEND_PRESENT / ATTEND_ABSENT / ATTEND_UNKNOWN)"""
+        mid = self._member_ids.get((cell_no, name))
+        if mid is None:
+            return ATTEND_UNKNOWN
+        week = iso_week(day)
+        if week < _FIRST_WEEK:
+            return ATTEND_UNKNOWN
+        bit = 1 << week_index(week)
+        if not self._known(mid) & bit:
+            return ATTEND_UNKNOWN
+        return ATTEND_ABSENT if self._absent[mid] & bit else ATTEND_PRESENT
+
+    def attendance_rate(self, cell_no: int, name: str) -> Optional[float]:
+        """출결을 아는 주 중 출석한 비율 (아는 주가 없으면 None)"""
+        mid = self._member_ids.get((cell_no, name))
+        known = self._known(mid).bit_count() if mid is not None else 0
+        if not known:
+            return None
+        return 1 - self._absent[mid].bit_count() / known
+
+    def _pack(self, cell_no: int) -> Tuple[List[int], Dict[int, int]]:
+        """셀의 보고 주만 이어 붙인 열 (k 번째 비트 = k 번째 보고 주)에서의 셀원별 결석 비트맵"""
+        packed = self._packed.get(cell_no)
+        if packed is None:
+            weeks = list(_bit_positions(self._reported.get(cell_no, 0)))
+            position = {wk: k for k, wk in enumerate(weeks)}
+            columns = {}
+            for mid in self._cell_members.get(cell_no, ()):
+                bits = 0
+                for wk in _bit_positions(self._absent[mid]):
+                    bits |= 1 << position[wk]
+                columns[mid] = bits
+            packed = self._packed[cell_no] = (weeks, columns)
+        return packed
+
+    def absent_streaks(self, min_weeks: int = ABSENT_STREAK_WEEKS, ongoing: bool = False) -> List[AbsentStreak]:
+        """
+        min_weeks 주 이상 연속 결석한 구간 전부 (ongoing=True 면 지금도 이어지는 것만)
+        - 셀원마다 압축 비트맵을 min_weeks 칸씩 밀어 AND → 0 이면 구간이 없으므로 바로 건너뜀
+        - 셀, 이름, 시작 주차순
+        """
+        if min_weeks < 1:
+            raise ValueError("연속 결석 주 수는 1 이상이어야 합니다")
+        streaks = []
+        for cell_no in sorted(self._cell_members):
+            weeks, columns = self._pack(cell_no)
+            last = len(weeks) - 1
+            for mid, bits in columns.items():
+                runs = bits
+                for shift in range(1, min_weeks):
+                    runs &= bits >> shift
+                if not runs or ongoing and not bits >> last & 1:
+                    continue
+                name = self.members[mid][1]
+                for start, end in _bit_runs(bits):
+                    if end - start + 1 < min_weeks or ongoing and end != last:
+                        continue
+                    streaks.append(AbsentStreak(
+                        cell_no, name, end - start + 1, index_week(weeks[start]), index_week(weeks[end]), end == last
+                    ))
+        streaks.sort(key=lambda s: (s.cell_no, s.name, s.first))
+        return streaks
+
+    def member_rows(self) -> List[dict]:
+        """셀원별 한 행: 출석률, 가장 긴 / 지금 이어지는 연속 결석 (셀, 이름순)"""
+        rows = []
+        for cell_no in sorted(self._cell_members):
+            weeks, columns = self._pack(cell_no)
+            last = len(weeks) - 1
+            for mid in sorted(columns, key=lambda m: self.members[m][1]):
+                if not self._absent[mid]:
+                    continue   # 정정으로 명단에서 모두 빠진 이름
+                runs = list(_bit_runs(columns[mid]))
+                name = self.members[mid][1]
+                rate = self.attendance_rate(cell_no, name)
+                rows.append({
+                    "셀": cell_no,
+                    "이름": name,
+                    "아는 주": self._known(mid).bit_count(),
+                    "결석": self._absent[mid].bit_count(),
+                    "출석률": round(rate, 3) if rate is not None else None,
+                    "최장 연속 결석": max((e - s + 1 for s, e in runs), default=0),
+                    "현재 연속 결석": next((e - s + 1 for s, e in runs if e == last), 0),
+                })
+        return rows
+
+    def streak_rows(self, min_weeks: int = ABSENT_STREAK_WEEKS, ongoing: bool = False) -> List[dict]:
+        return [
+            {
+                "셀": s.cell_no,
+                "이름": s.name,
+                "연속 결석(주)": s.weeks,
+                "시작 주": week_label(s.first),
+                "끝 주": week_label(s.last),
+                "진행 중": "O" if s.ongoing else "",
+            }
+            for s in self.absent_streaks(min_weeks, ongoing)
+        ]
+
+
+def _bit_positions(bits: int) -> Iterable[int]:
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+
+def _bit_runs(bits: int) -> Iterable[Tuple[int, int]]:
+    """연속으로 켜진 비트 구간 (시작, 끝) 들 (낮은 비트부터)"""
+    while bits:
+        start = (bits & -bits).bit_length() - 1
+        run = bits >> start
+        length = (~run & (run + 1)).bit_length() - 1
+        yield start, start + length - 1
+        bits &= ~(((1 << length) - 1) << start)
@@ -0,0 +1,440 @@
+"""
+메시지 본문 검색용 자료구조 (UI/파서와 무관한 순수 문자열 알고리즘)
+- KeywordMatcher: 여러 키워드를 Aho-Corasick 오토마타 하나로 묶어 본문을 한 번만 훑음
+- highlight_html: 매칭 구간을 <mark> 로 감싼 미리보기 HTML
+- NgramIndex: 본문 글자 2-gram 역색인 (후보 교집합 → `in` 으로 확인)
+- parse_query / parse_keyword_lines: '포함 단어' 검색식 → 질의 트리
+- choseong: 초성 투영 (ㅊㅅ 으로 '출석' 찾기, 띄어쓰기 무시)
+"""
+import bisect
+import calendar
+import html
+import operator
+import re
+from array import array
+from collections import deque
+from dataclasses import dataclass
+from datetime import date
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+# 키워드가 이 개수 미만이면 search() 는 키워드를 | 로 묶은 정규식 하나(C 구현)로 훑음
+# - 오토마타는 본문 길이에만 비례하지만 글자당 파이썬 루프 1회라 상수가 큼
+# - 본문 5만 개 기준 (정규식 / 오토마타 / 키워드마다 in): 5개 20 / 114 / 42ms,
+#   30개 34 / 158 / 199ms, 300개 67 / 102ms, 400개 115 / 123ms, 500개 153 / 122ms
+AC_MIN_KEYWORDS = 400
+
+# =========================
+# 1) 다중 키워드 매칭 (Aho-Corasick)
+# =========================
+class KeywordMatcher:
+    """
+    키워드 목록을 한 번 컴파일해 두고 본문마다 한 번만 훑는 Aho-Corasick 오토마타.
+    - 전이표는 키워드에 나오는 글자에 대해 미리 완성(DFA)해 두어 글자당 dict 조회 1번
+      (키워드에 없는 글자는 곧바로 시작 상태로 돌아감)
+    - search(): 하나라도 포함되는지 (filter_messages 의 OR 조건)
+      키워드가 AC_MIN_KEYWORDS 개 미만이면 오토마타 대신 키워드를 | 로 묶은 정규식
+    - find_spans(): 모든 출현 위치 (미리보기 강조용)
+    """
+
+    def __init__(self, keywords: Iterable[str]) -> None:
+        keywords = list(keywords)
+        # 빈 키워드는 기존 `"" in body` 와 같이 모든 본문에 매칭
+        self._match_all = "" in keywords
+        self.keywords: List[str] = list(dict.fromkeys(k for k in keywords if k))
+
+        # 1) 트라이
+        goto: List[Dict[str, int]] = [{}]
+        out: List[Tuple[int, ...]] = [()]
+        for ki, kw in enumerate(self.keywords):
+            state = 0
+            for ch in kw:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][ch] = nxt
+                    goto.append({})
+                    out.append(())
+                state = nxt
+            out[state] += (ki,)
+
+        # 2) 실패 링크 + 완성 전이표 (BFS 순서라 얕은 상태의 전이표가 먼저 완성됨)
+        fail = [0] * len(goto)
+        delta: List[Dict[str, int]] = [dict(goto[0])] + [{} for _ in goto[1:]]
+        queue = deque([0])
+        while queue:
+            parent = queue.popleft()
+            for ch, state in goto[parent].items():
+                queue.append(state)
+                if parent:
+                    fail[state] = delta[fail[parent]].get(ch, 0)
+                out[state] += out[fail[state]]
+                delta[state] = {**delta[fail[state]], **goto[state]}
+
+        self._delta = delta
+        self._out = out
+        self._accepting = [bool(o) for o in out]
+        self._regex = None
+        if 0 < len(self.keywords) < AC_MIN_KEYWORDS:
+            self._regex = re.compile("|".join(map(re.escape, self.keywords))).search
+
+    def __bool__(self) -> bool:
+        return self._match_all or bool(self.keywords)
+
+    def search(self, text: str) -> bool:
+        """키워드가 하나라도 포함되어 있으면 True (첫 매칭에서 바로 멈춤)"""
+        if self._match_all:
+            return True
+        if self._regex is not None:
+            return self._regex(text) is not None
+        delta = self._delta
+        accepting = self._accepting
+        state = 0
+        for ch in text:
+            state = delta[state].get(ch, 0)
+            if accepting[state]:
+                return True
+        return False
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, int, str]]:
+        """모든 출현 (start, end, keyword). 겹치는 출현도 모두 내보냄"""
+        delta = self._delta
+        out = self._out
+        keywords = self.keywords
+        state = 0
+        for pos, ch in enumerate(text):
+            state = delta[state].get(ch, 0)
+            for ki in out[state]:
+                kw = keywords[ki]
+                yield pos + 1 - len(kw), pos + 1, kw
+
+    def find_spans(self, text: str) -> List[Tuple[int, int]]:
+        """강조 표시용: 겹치거나 맞닿은 출현을 합친 (start, end) 구간 목록"""
+        spans: List[Tuple[int, int]] = []
+        for start, end, _ in sorted(self.iter_matches(text)):
+            if spans and start <= spans[-1][1]:
+                if end > spans[-1][1]:
+                    spans[-1] = (spans[-1][0], end)
+            else:
+                spans.append((start, end))
+        return spans
+
+
+def highlight_html(text: str, matcher: KeywordMatcher) -> str:
+    """
+    매칭 구간을 <mark> 로 감싼 HTML (나머지는 모두 escape)
+    - <pre> 블록이라 빈 줄이 있어도 마크다운으로 다시 해석되지 않음
+    """
+    parts: List[str] = []
+    pos = 0
+    for start, end in matcher.find_spans(text):
+        parts.append(html.escape(text[pos:start]))
+        parts.append(f"<mark>{html.escape(text[start:end])}</mark>")
+        pos = end
+    parts.append(html.escape(text[pos:]))
+    return '<pre style="white-space: pre-wrap;">' + "".join(parts) + "</pre>"
+
+
+# =========================
+# 2) 글자 n-gram 역색인
+# =========================
+# 교집합 중인 후보가 다음 목록보다 이 배수 이상 적으면 목록 전체 대신 이진 탐색으로 확인
+_PROBE_RATIO = 16
+
+
+def _bigrams(text: str) -> Set[str]:
+    return set(map(operator.add, text, text[1:]))
+
+
+def _contains_sorted(ids: array, value: int) -> bool:
+    j = bisect.bisect_left(ids, value)
+    return j < len(ids) and ids[j] == value
+
+
+class NgramIndex:
+    """
+    글자 2-gram → 문서 번호(오름차순 int32 배열) 역색인
+    - 한국어는 단어 경계가 불분명해 부분 문자열 검색이 기본
+      → 검색어의 2-gram 목록을 교집합해 후보를 얻고, 후보만 `in` 으로 확인
+    - 문서 번호는 add() 순서대로 증가해야 함 (뒤에 이어 붙이는 증분 색인만 지원)
+    - 한 글자 검색어는 2-gram 이 없으므로 candidates() 가 None → 호출자가 전체 훑기
+    """
+
+    def __init__(self) -> None:
+        self.postings: Dict[str, array] = {}
+        self.size = 0
+
+    def add(self, doc_id: int, text: str) -> None:
+        postings = self.postings
+        for gram in _bigrams(text):
+            ids = postings.get(gram)
+            if ids is None:
+                ids = postings[gram] = array("i")
+            ids.append(doc_id)
+        self.size = doc_id + 1
+
+    def candidates(self, term: str) -> Optional[List[int]]:
+        """term 을 포함할 수 있는 문서 번호 (오름차순, 확인 전). 2글자 미만이면 None"""
+        if len(term) < 2:
+            return None
+        lists = []
+        for gram in _bigrams(term):
+            ids = self.postings.get(gram)
+            if ids is None:
+                return []
+            lists.append(ids)
+        lists.sort(key=len)
+
+        found: Set[int] = set(lists[0])
+        for ids in lists[1:]:
+            if not found:
+                break
+            if len(found) * _PROBE_RATIO < len(ids):
+                found = {i for i in found if _contains_sorted(ids, i)}
+            else:
+                found.intersection_update(ids)
+        return sorted(found)
+
+
+# =========================
+# 3) 초성 투영
+# =========================
+CHOSEONG = "ㄱㄲㄴㄷㄸㄹㅁㅂㅃㅅㅆㅇㅈㅉㅊㅋㅌㅍㅎ"
+
+# 완성형 한글 음절(가~힣) → 초성, 공백 → 삭제. 나머지 글자는 그대로 (str.translate 한 번으로 투영)
+_CHOSEONG_TABLE: Dict[int, Optional[str]] = {
+    0xAC00 + i: CHOSEONG[i // 588] for i in range(11172)
+}
+_CHOSEONG_TABLE.update({ord(ch): None for ch in " \t\r\n\u00a0\u3000"})
+
+
+def choseong(text: str) -> str:
+    """초성 투영: '출석 결석' → 'ㅊㅅㄱㅅ' (공백은 지움 → 띄어쓰기가 달라도 같은 투영)"""
+    return text.translate(_CHOSEONG_TABLE)
+
+
+def is_choseong_query(text: str) -> bool:
+    """공백을 빼면 초성 자모로만 된 검색어인지 (예: 'ㅊㅅ', 'ㅊㅅ ㄱㅅ')"""
+    stripped = "".join(text.split())
+    return bool(stripped) and all(ch in CHOSEONG for ch in stripped)
+
+
+# =========================
+# 4) 검색식 (AND / OR / NOT / "구절" / sender: / date: / cho: / 괄호)
+# =========================
+# 질의 트리 노드 (frozen → 해시 가능, 캐시 키로 써도 됨)
+@dataclass(frozen=True)
+class Term:
+    """본문에 text 가 (공백 포함 그대로) 들어 있음"""
+    text: str
+
+
+@dataclass(frozen=True)
+class ChoseongTerm:
+    """본문의 초성 투영(choseong)에 text(초성 문자열) 가 들어 있음"""
+    text: str
+
+
+@dataclass(frozen=True)
+class SenderTerm:
+    """발신자 이름 또는 [이름] 표기에 text 가 들어 있음"""
+    text: str
+
+
+@dataclass(frozen=True)
+class DateTerm:
+    """보낸 날짜가 start ~ end (포함, None 이면 열린 끝)"""
+    start: Optional[date]
+    end: Optional[date]
+
+
+@dataclass(frozen=True)
+class AndNode:
+    items: Tuple["QueryNode", ...]
+
+
+@dataclass(frozen=True)
+class OrNode:
+    items: Tuple["QueryNode", ...]
+
+
+@dataclass(frozen=True)
+class NotNode:
+    item: "QueryNode"
+
+
+QueryNode = Union[Term, ChoseongTerm, SenderTerm, DateTerm, AndNode, OrNode, NotNode]
+
+OPERATORS = ("AND", "OR", "NOT")
+
+_TOKEN = re.compile(
+    r'\s*(?:(?P<lparen>\()|(?P<rparen>\))'
+    r'|(?P<field>sender|date|cho):(?:"(?P<quoted_value>[^"]*)"|(?P<value>[^\s()"]+))'
+    r'|"(?P<phrase>[^"]*)"'
+    r'|(?P<word>[^\s()"]+))'
+)
+
+
+def _tokenize(text: str) -> List[Tuple[str, str]]:
+    tokens: List[Tuple[str, str]] = []
+    pos = 0
+    text = text.rstrip()
+    while pos < len(text):
+        m = _TOKEN.match(text, pos)
+        if not m:
+            raise ValueError(f"검색식 해석 실패: 닫히지 않은 따옴표 ({text[pos:].strip()})")
+        pos = m.end()
+        if m.group("lparen"):
+            tokens.append(("(", "("))
+        elif m.group("rparen"):
+            tokens.append((")", ")"))
+        elif m.group("field"):
+            value = m.group("quoted_value")
+            tokens.append((m.group("field"), value if value is not None else m.group("value")))
+        elif m.group("phrase") is not None:
+            tokens.append(("phrase", m.group("phrase")))
+        elif m.group("word") in OPERATORS:
+            tokens.append((m.group("word"), m.group("word")))
+        else:
+            tokens.append(("word", m.group("word")))
+    return tokens
+
+
+def _parse_date_value(value: str) -> DateTerm:
+    """
+    date: 값
+    - 2025-01-05 (하루) / 2025-01 (그 달) / 2025 (그 해)
+    - A..B / A.. / ..B (범위, 양 끝 포함)
+    """
+    def bounds(part: str) -> Tuple[date, date]:
+        pieces = part.split("-")
+        try:
+            if len(pieces) == 3:
+                d = date.fromisoformat(part)
+                return d, d
+            if len(pieces) == 2:
+                y, m = int(pieces[0]), int(pieces[1])
+                return date(y, m, 1), date(y, m, calendar.monthrange(y, m)[1])
+            if len(pieces) == 1:
+                y = int(pieces[0])
+                return date(y, 1, 1), date(y, 12, 31)
+        except ValueError:
+            pass
+        raise ValueError(f"date: 형식 오류 ({part}) — 예) date:2025-01-05, date:2025-01, date:2025-01-01..2025-01-31")
+
+    if ".." in value:
+        lo, hi = value.split("..", 1)
+        start = bounds(lo)[0] if lo else None
+        end = bounds(hi)[1] if hi else None
+        return DateTerm(start, end)
+    start, end = bounds(value)
+    return DateTerm(start, end)
+
+
+class _Parser:
+    """
+    재귀 하강 파서
+        or   := and ("OR" and)*
+        and  := not (["AND"] not)*      (나란히 쓰면 AND)
+        not  := "NOT" not | atom
+        atom := "(" or ")" | "구절" | 단어 | sender:값 | date:값 | cho:값
+    - 초성 자모로만 된 단어/구절은 자동으로 초성 검색
+    """
+
+    def __init__(self, tokens: List[Tuple[str, str]]) -> None:
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self) -> Optional[str]:
+        return self.tokens[self.pos][0] if self.pos < len(self.tokens) else None
+
+    def take(self) -> Tuple[str, str]:
+        token = self.tokens[self.pos]
+        self.pos += 1
+        return token
+
+    def parse(self) -> QueryNode:
+        node = self.parse_or()
+        if self.peek() is not None:
+            raise ValueError(f"검색식 해석 실패: 예상하지 못한 '{self.tokens[self.pos][1]}'")
+        return node
+
+    def parse_or(self) -> QueryNode:
+        items = [self.parse_and()]
+        while self.peek() == "OR":
+            self.take()
+            items.append(self.parse_and())
+        return items[0] if len(items) == 1 else OrNode(tuple(items))
+
+    def parse_and(self) -> QueryNode:
+        items = [self.parse_not()]
+        while self.peek() not in (None, "OR", ")"):
+            if self.peek() == "AND":
+                self.take()
+            items.append(self.parse_not())
+        return items[0] if len(items) == 1 else AndNode(tuple(items))
+
+    def parse_not(self) -> QueryNode:
+        if self.peek() == "NOT":
+            self.take()
+            return NotNode(self.parse_not())
+        return self.parse_atom()
+
+    def parse_atom(self) -> QueryNode:
+        kind = self.peek()
+        if kind is None:
+            raise ValueError("검색식 해석 실패: 식이 중간에 끝남")
+        _, value = self.take()
+        if kind == "(":
+            node = self.parse_or()
+            if self.peek() != ")":
+                raise ValueError("검색식 해석 실패: 닫는 괄호 ')' 가 없음")
+            self.take()
+            return node
+        if kind in ("phrase", "word"):
+            return _text_term(value)
+        if kind == "cho":
+            return ChoseongTerm(choseong(value))
+        if kind == "sender":
+            return SenderTerm(value)
+        if kind == "date":
+            return _parse_date_value(value)
+        raise ValueError(f"검색식 해석 실패: 예상하지 못한 '{value}'")
+
+
+def _text_term(text: str) -> QueryNode:
+    """본문 검색어: 초성 자모로만 되어 있으면 초성 검색, 아니면 그대로 부분 문자열"""
+    if is_choseong_query(text):
+        return ChoseongTerm(choseong(text))
+    return Term(text)
+
+
+def parse_query(text: str) -> QueryNode:
+    """
+    한 줄 검색식 → 질의 트리
+    - 검색식 문법(따옴표, AND/OR/NOT, sender:, date:, cho:)이 하나도 없으면
+      줄 전체를 그대로 한 구절로 봄 (기존 '포함 단어' 동작: "출석 결석" 은 공백 포함 부분 문자열,
+      앞뒤 공백도 그대로 둠. 단 'ㅊㅅ' 처럼 초성 자모로만 된 줄은 초성 검색)
+    - 괄호만 있는 줄도 그대로 한 구절 ("홍길동(출장)", "1) 출석" 을 검색식으로 읽지 않음)
+    - 문법 오류는 ValueError (메시지는 화면에 그대로 보여줄 수 있는 한국어)
+    """
+    tokens = _tokenize(text)
+    if all(kind in ("word", "(", ")") for kind, _ in tokens):
+        return _text_term(text)
+    return _Parser(tokens).parse()
+
+
+def parse_keyword_lines(lines: Iterable[str]) -> Optional[QueryNode]:
+    """'포함 단어' 입력 줄들 → 질의 트리 (줄끼리는 OR, 비어 있으면 None)"""
+    items = tuple(parse_query(line) for line in lines)
+    if not items:
+        return None
+    return items[0] if len(items) == 1 else OrNode(items)
+
+
+def query_terms(node: Optional[QueryNode]) -> List[str]:
+    """강조 표시용: NOT 아래가 아닌 본문 검색어 목록"""
+    if isinstance(node, Term):
+        return [node.text]
+    if isinstance(node, (AndNode, OrNode)):
+        return [t for item in node.items for t in query_terms(item)]
+    return []
@@ -0,0 +1,122 @@
+"""
+결석자 줄 해석(split_absentees)과 출결 장부(AttendanceLedger) 확인
+- 이름 / "없음" / 인원수 + 괄호 명단 / 빈 칸을 각각 결석 / 전원 출석 / 모름으로 읽는지
+- 캐시된 저장소 하나를 여러 스레드가 동시에 채워도 보고서를 한 번씩만 더하는지
+"""
+import sys
+import threading
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from katalk_core import CellReport, MessageTable, iter_buffer_messages
+from katalk_reports import (
+    ATTEND_ABSENT,
+    ATTEND_PRESENT,
+    ATTEND_UNKNOWN,
+    AttendanceLedger,
+    ReportStore,
+    RECONCILE_MERGE,
+    split_absentees,
+)
+
+
+@pytest.mark.parametrize(
+    "line, expected",
+    [
+        ("- 이번주 결석자 : 홍길동, 김철수(출장)", ("홍길동", "김철수")),
+        ("이번주 결석자 : 홍길동 외 2명", ("홍길동",)),
+        ("이번주 결석자 : 홍길동, 없음", ("홍길동",)),
+        # 인원수만 적고 명단은 괄호 속
+        ("이번주 결석자 : 1명(홍길동)", ("홍길동",)),
+        ("결석자: 2명(홍길동, 김철수)", ("홍길동", "김철수")),
+        ("결석자: 2명 (홍길동/김철수)", ("홍길동", "김철수")),
+        ("결석자: 0명", ()),
+        # 전원 출석
+        ("이번주 결석자 : 없음", ()),
+        ("이번주 결석자: 전원 출석", ()),
+        ("이번주 결석자: -", ()),
+        ("이번주 결석자 없음", ()),
+        # 모름
+        ("이번주 결석자:", None),
+        ("이번주 결석자 :  ", None),
+        ("결석자: 3명(홍길동)", None),
+        ("결석자: 2명", None),
+        ("이번주 결석자", None),
+        ("", None),
+    ],
+)
+def test_split_absentees(line, expected):
+    assert split_absentees(line) == expected
+
+
+def report(day: date, absentees: str) -> CellReport:
+    return CellReport(3, "박셀장", absentees_sunday=absentees, sent_at=datetime(day.year, day.month, day.day, 20))
+
+
+def test_headcount_names_are_absent_not_present():
+    ledger = AttendanceLedger("sunday")
+    ledger.extend(
+        [
+            report(date(2025, 3, 2), "이번주 결석자 : 홍길동, 김철수"),
+            report(date(2025, 3, 9), "이번주 결석자 : 1명(홍길동)"),
+            report(date(2025, 3, 16), "결석자: 2명(홍길동, 김철수)"),
+            report(date(2025, 3, 23), "이번주 결석자:"),
+            report(date(2025, 3, 30), "이번주 결석자 없음"),
+        ]
+    )
+    assert ledger.status(3, "홍길동", date(2025, 3, 9)) == ATTEND_ABSENT
+    assert ledger.status(3, "김철수", date(2025, 3, 9)) == ATTEND_PRESENT
+    assert ledger.status(3, "김철수", date(2025, 3, 16)) == ATTEND_ABSENT
+    assert ledger.status(3, "홍길동", date(2025, 3, 23)) == ATTEND_UNKNOWN
+    assert ledger.status(3, "홍길동", date(2025, 3, 30)) == ATTEND_PRESENT
+    streaks = {s.name: s.weeks for s in ledger.absent_streaks(3)}
+    assert streaks == {"홍길동": 3}
+
+
+def report_table(weeks: int = 40) -> MessageTable:
+    lines = []
+    for k in range(weeks):
+        d = date(2025, 1, 5) + timedelta(weeks=k)
+        lines.append(f"--------------- {d.year}년 {d.month}월 {d.day}일 ---------------")
+        for cell in range(1, 6):
+            absent = ["홍길동", "김철수", "이영희"][: (k + cell) % 4]
+            lines.append(f"[셀장{cell}] [오후 8:{cell:02d}] 3-{cell}셀 보고")
+            lines.append("주일 예배 현황")
+            lines.append("- 재적 : 10명")
+            lines.append(f"- 이번주 결석자 : {', '.join(absent) or '없음'}")
+            lines.append(f"- 헌금 : {cell * 1000}원")
+    return MessageTable.from_messages(iter_buffer_messages("\n".join(lines).encode(), date(2026, 1, 1)))
+
+
+def store_snapshot(store: ReportStore) -> tuple:
+    ledger = store.attendance["sunday"]
+    superseded = store.reconciler.superseded_rows()
+    return store.trend_rows("offering"), ledger.member_rows(), ledger.streak_rows(2), superseded
+
+
+def test_concurrent_updates_add_each_report_once():
+    table = report_table()
+    serial = ReportStore(mode=RECONCILE_MERGE)
+    serial.update(table)
+    expected = store_snapshot(serial)
+    assert expected[0] and expected[1]
+
+    shared = ReportStore(mode=RECONCILE_MERGE)
+    barrier = threading.Barrier(8)
+
+    def worker() -> None:
+        barrier.wait()
+        shared.update(table)
+
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    finally:
+        sys.setswitchinterval(interval)
+    assert store_snapshot(shared) == expected
@@ -0,0 +1,81 @@
+"""
+split_messages_parallel 결과가 직렬 파싱(iter_buffer_messages)과 같은지 확인
+- 포맷이 섞인 내보내기, 여러 인코딩, 원본(bytes / 파일 경로) 별로 비교
+- 작은 입력도 조각으로 나뉘도록 PARALLEL_MIN_BYTES 를 낮춰서 돌림
+"""
+import random
+from datetime import date, timedelta
+
+import pytest
+
+import katalk_core
+from katalk_core import iter_buffer_messages, split_messages_parallel
+
+TODAY = date(2026, 1, 1)
+NAMES = ["홍길동", "김철수", "이영희", "박셀장"]
+WORDS = ["출석", "결석", "헌금", "성경읽기", "기도", "안녕하세요", "오늘", "모임", "[공지]", "3-1셀", "2025년"]
+
+
+def make_export(seed: int, days: int = 60, newline: str = "\n") -> str:
+    """날짜 구분선 / 안드로이드 / [이름] [시각] / 이름 + 시간 줄이 섞인 내보내기 텍스트"""
+    rng = random.Random(seed)
+    lines = []
+    d = date(2025, 1, 1)
+    for _ in range(days):
+        wd = "월화수목금토일"[d.weekday()]
+        if rng.random() < 0.5:
+            lines.append(f"--------------- {d.year}년 {d.month}월 {d.day}일 {wd}요일 ---------------")
+        else:
+            lines.append(f"{d.year}년 {d.month}월 {d.day}일 {wd}요일")
+        for _ in range(rng.randint(0, 15)):
+            h, mi = rng.randint(0, 23), rng.randint(0, 59)
+            ampm, hh = ("오전" if h < 12 else "오후"), (h % 12 or 12)
+            name = rng.choice(NAMES)
+            body = [" ".join(rng.choices(WORDS, k=rng.randint(1, 6))) for _ in range(rng.randint(1, 3))]
+            style = rng.choice(["android", "inline", "mobile"])
+            if style == "android":
+                lines.append(f"{d.year}년 {d.month}월 {d.day}일 {ampm} {hh}:{mi:02d}, {name} : {body[0]}")
+                lines.extend(body[1:])
+            elif style == "inline":
+                lines.append(f"[{name}] [{ampm} {hh}:{mi:02d}] {body[0]}")
+                lines.extend(body[1:])
+            else:
+                lines.extend([name, f"{ampm} {hh}:{mi:02d}"] + body)
+            if rng.random() < 0.1:
+                lines.append("")
+        d += timedelta(days=1)
+    return newline.join(lines) + newline
+
+
+def as_tuples(messages):
+    return [(m.sender, m.sent_at, list(m.header_lines), list(m.body_lines)) for m in messages]
+
+
+@pytest.fixture(autouse=True)
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(katalk_core, "PARALLEL_MIN_BYTES", 1)
+
+
+@pytest.mark.parametrize("encoding", ["utf-8", "utf-8-sig", "cp949"])
+@pytest.mark.parametrize("newline", ["\n", "\r\n"])
+def test_parallel_matches_serial(tmp_path, encoding, newline):
+    data = make_export(seed=len(encoding) + len(newline), newline=newline).encode(encoding)
+    serial_stats = {}
+    serial = as_tuples(iter_buffer_messages(data, TODAY, stats=serial_stats))
+    assert serial
+
+    path = tmp_path / "chat.txt"
+    path.write_bytes(data)
+    for source in (data, str(path)):
+        stats = {}
+        parallel = split_messages_parallel(source, TODAY, stats=stats, workers=3)
+        assert as_tuples(parallel) == serial
+        assert stats == serial_stats
+
+
+def test_chunks_start_at_dividers():
+    data = make_export(seed=7).encode("utf-8")
+    offsets = katalk_core.find_chunk_offsets(data, 8)
+    assert len(offsets) > 1
+    for offset in offsets[1:]:
+        assert katalk_core._is_divider_at(data, offset, "utf-8", "strict")
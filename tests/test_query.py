@@ -0,0 +1,184 @@
+"""
+검색식(katalk_search.parse_query)과 두 평가 경로(query_ids 의 파이썬 / NumPy) 확인
+- 파서: 문법이 없는 줄은 그대로 한 구절, 우선순위(NOT > AND > OR), 필드, 오류 메시지
+- 평가: 무작위 질의 트리를 행마다 직접 판정한 결과와 비교 (전체 / 일부 행, 색인을 만든 뒤에도)
+"""
+import random
+import re
+from datetime import date, timedelta
+
+import pytest
+
+from katalk_core import MessageTable, iter_buffer_messages, query_ids, sender_matches
+from katalk_search import (
+    AndNode,
+    ChoseongTerm,
+    DateTerm,
+    NotNode,
+    OrNode,
+    SenderTerm,
+    Term,
+    choseong,
+    parse_keyword_lines,
+    parse_query,
+)
+
+TODAY = date(2026, 1, 1)
+NAMES = ["홍길동", "김철수", "이영희", "박셀장", "최민수"]
+WORDS = ["출석", "결석", "헌금", "성경읽기", "기도제목", "안녕하세요", "오늘 모임", "주일 예배", "3-1셀", "(공지)"]
+FIRST_DAY = date(2025, 1, 1)
+DAYS = 90
+
+
+# =========================
+# 파서
+# =========================
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        # 문법이 없는 줄: 줄 전체가 한 구절 (공백 포함 부분 문자열)
+        ("출석", Term("출석")),
+        ("출석 결석", Term("출석 결석")),
+        ("ㅊㅅ", ChoseongTerm("ㅊㅅ")),
+        ("ㅊㅅ ㄱㅅ", ChoseongTerm("ㅊㅅㄱㅅ")),
+        ("and or", Term("and or")),
+        # 괄호만 있는 줄도 그대로 (검색식 이전의 '포함 단어' 동작)
+        ("홍길동(출장)", Term("홍길동(출장)")),
+        ("1) 출석", Term("1) 출석")),
+        ("(공지", Term("(공지")),
+        # 검색식
+        ('"주일 예배"', Term("주일 예배")),
+        ("출석 OR 결석", OrNode((Term("출석"), Term("결석")))),
+        ("출석 AND 헌금", AndNode((Term("출석"), Term("헌금")))),
+        ('"출석" 헌금', AndNode((Term("출석"), Term("헌금")))),
+        ("출석 OR 결석 헌금", OrNode((Term("출석"), AndNode((Term("결석"), Term("헌금")))))),
+        ("NOT 출석 OR 결석", OrNode((NotNode(Term("출석")), Term("결석")))),
+        ("(출석 OR 결석) NOT 헌금", AndNode((OrNode((Term("출석"), Term("결석"))), NotNode(Term("헌금"))))),
+        ("NOT NOT 출석", NotNode(NotNode(Term("출석")))),
+        ("sender:홍길동", SenderTerm("홍길동")),
+        ('sender:"홍 길동"', SenderTerm("홍 길동")),
+        ("cho:출석", ChoseongTerm("ㅊㅅ")),
+        ('ㅊㅅ OR "ㄱㅅ"', OrNode((ChoseongTerm("ㅊㅅ"), ChoseongTerm("ㄱㅅ")))),
+        ("date:2025-01-05", DateTerm(date(2025, 1, 5), date(2025, 1, 5))),
+        ("date:2024-02", DateTerm(date(2024, 2, 1), date(2024, 2, 29))),
+        ("date:2025", DateTerm(date(2025, 1, 1), date(2025, 12, 31))),
+        ("date:2025-01..2025-03-10", DateTerm(date(2025, 1, 1), date(2025, 3, 10))),
+        ("date:2025-02..", DateTerm(date(2025, 2, 1), None)),
+        ("date:..2025", DateTerm(None, date(2025, 12, 31))),
+    ],
+)
+def test_parse_query(text, expected):
+    assert parse_query(text) == expected
+
+
+@pytest.mark.parametrize(
+    "text, message",
+    [
+        ("(출석 OR 결석", "닫는 괄호"),
+        ("출석 OR 결석)", "예상하지 못한 ')'"),
+        ("출석 OR", "중간에 끝남"),
+        ("NOT", "중간에 끝남"),
+        ('"출석 결석', "따옴표"),
+        ("date:2025-13", "date: 형식 오류"),
+        ("date:어제 출석", "date: 형식 오류"),
+    ],
+)
+def test_parse_errors(text, message):
+    with pytest.raises(ValueError, match=re.escape(message)):
+        parse_query(text)
+
+
+def test_keyword_lines_are_ored():
+    assert parse_keyword_lines([]) is None
+    assert parse_keyword_lines(["출석"]) == Term("출석")
+    assert parse_keyword_lines(["출석", "sender:김"]) == OrNode((Term("출석"), SenderTerm("김")))
+
+
+# =========================
+# 평가
+# =========================
+def make_table(seed: int = 11) -> MessageTable:
+    rng = random.Random(seed)
+    lines = []
+    for n in range(DAYS):
+        d = FIRST_DAY + timedelta(days=n)
+        lines.append(f"--------------- {d.year}년 {d.month}월 {d.day}일 ---------------")
+        for _ in range(rng.randint(0, 25)):
+            h, mi = rng.randint(0, 23), rng.randint(0, 59)
+            ampm, hh = ("오전" if h < 12 else "오후"), (h % 12 or 12)
+            body = [" ".join(rng.choices(WORDS, k=rng.randint(1, 4))) for _ in range(rng.randint(1, 2))]
+            lines.append(f"[{rng.choice(NAMES)}] [{ampm} {hh}:{mi:02d}] {body[0]}")
+            lines.extend(body[1:])
+    return MessageTable.from_messages(iter_buffer_messages("\n".join(lines).encode(), TODAY))
+
+
+def holds(node, table: MessageTable, i: int) -> bool:
+    """질의 트리를 행 하나에 대해 정의대로 판정 (색인/마스크 없이)"""
+    if isinstance(node, Term):
+        return node.text in table.body_text(i)
+    if isinstance(node, ChoseongTerm):
+        return node.text in choseong(table.body_text(i))
+    if isinstance(node, SenderTerm):
+        return sender_matches(node.text, table.sender_of(i))
+    if isinstance(node, DateTerm):
+        day = table.sent_at_of(i).date()
+        return (node.start is None or node.start <= day) and (node.end is None or day <= node.end)
+    if isinstance(node, AndNode):
+        return all(holds(item, table, i) for item in node.items)
+    if isinstance(node, OrNode):
+        return any(holds(item, table, i) for item in node.items)
+    return not holds(node.item, table, i)
+
+
+def random_leaf(rng: random.Random):
+    roll = rng.random()
+    if roll < 0.45:
+        word = rng.choice(WORDS)
+        start = rng.randrange(len(word))
+        return Term(word[start:start + rng.randint(1, 3)])
+    if roll < 0.6:
+        return ChoseongTerm(choseong(rng.choice(WORDS))[: rng.randint(1, 3)])
+    if roll < 0.8:
+        name = rng.choice(NAMES)
+        return SenderTerm(name[: rng.randint(1, 3)])
+    start = FIRST_DAY + timedelta(days=rng.randrange(DAYS))
+    end = start + timedelta(days=rng.randint(0, 20))
+    return DateTerm(rng.choice([start, None]), rng.choice([end, end, None]))
+
+
+def random_query(rng: random.Random, depth: int = 3):
+    if depth == 0 or rng.random() < 0.3:
+        return random_leaf(rng)
+    roll = rng.random()
+    if roll < 0.15:
+        return NotNode(random_query(rng, depth - 1))
+    items = tuple(random_query(rng, depth - 1) for _ in range(rng.randint(2, 3)))
+    return AndNode(items) if roll < 0.6 else OrNode(items)
+
+
+@pytest.mark.parametrize("vectorized", [False, None])
+def test_query_ids_match_brute_force(vectorized):
+    table = make_table()
+    rng = random.Random(5)
+    everything = range(len(table))
+    # 같은 표를 계속 쓰므로 중간부터 넓은 검색이 되풀이돼 역색인 / 검색어 마스크 캐시도 거침
+    for _ in range(150):
+        node = random_query(rng)
+        expected = [i for i in everything if holds(node, table, i)]
+        assert query_ids(table, node, vectorized=vectorized) == expected, node
+
+        some = sorted(rng.sample(everything, len(table) // 3))
+        assert query_ids(table, node, some, vectorized=vectorized) == [i for i in some if holds(node, table, i)], node
+
+        lo = rng.randrange(len(table))
+        window = range(lo, min(len(table), lo + rng.randint(1, 400)))
+        assert query_ids(table, node, window, vectorized=vectorized) == [i for i in window if holds(node, table, i)], node
+
+
+def test_parsed_queries_match_brute_force():
+    table = make_table()
+    for text in ["출석 결석", "(출석 OR 결석) NOT 헌금", "sender:홍 date:2025-02 ㅊㅅ", "(공지) 출석", "홍길동(출장)", "NOT sender:김 3-1"]:
+        node = parse_query(text)
+        expected = [i for i in range(len(table)) if holds(node, table, i)]
+        assert query_ids(table, node, vectorized=False) == expected
+        assert query_ids(table, node) == expected
@@ -0,0 +1,33 @@
+"""
+보고서 양식 검사(compile_report_schema): 읽자마자 거를 수 있는 잘못은 불러올 때 ValueError
+"""
+import re
+
+import pytest
+
+from katalk_core import DEFAULT_REPORT_MATCHER, ReportMatcher
+from katalk_reports import compile_report_schema, default_report_schema
+
+
+def test_default_schema_compiles():
+    assert compile_report_schema(default_report_schema()).parse("박셀장", "3-1셀 보고").cell_no == 1
+
+
+@pytest.mark.parametrize("pattern", [r"(\w)셀", r"3-(.)셀", r"(\d)?셀", r"셀"])
+def test_cell_id_must_capture_digits(pattern):
+    with pytest.raises(ValueError, match="cell_id"):
+        compile_report_schema({**default_report_schema(), "cell_id": pattern})
+
+
+def test_empty_mode_target_is_rejected():
+    schema = default_report_schema()
+    field = next(f for f in schema["fields"] if isinstance(f.get("target"), dict))
+    field["target"] = {}
+    with pytest.raises(ValueError, match="target"):
+        compile_report_schema(schema)
+
+
+def test_non_digit_cell_is_skipped_not_raised():
+    matcher = ReportMatcher([], re.compile(r"(\w)셀"))
+    assert matcher.parse("박셀장", "가셀 보고") is None
+    assert DEFAULT_REPORT_MATCHER.parse("박셀장", "3-2셀 보고").cell_no == 2
@@ -0,0 +1,84 @@
+"""
+캐시된 MessageTable 하나를 여러 스레드가 동시에 처음 조회해도 결과가 직렬 조회와 같은지 확인
+- 화면(Streamlit)은 세션마다 스레드가 달라도 파싱 결과 테이블은 하나를 같이 씀
+- 지연 색인(본문/초성 2-gram, 발신자, 시간)과 검색어 마스크·적중 비트맵 캐시를 동시에 만들게 함
+"""
+import random
+import sys
+import threading
+from datetime import date
+
+import pytest
+
+from katalk_core import MessageTable, iter_buffer_messages, query_ids
+from katalk_search import parse_keyword_lines
+
+TODAY = date(2026, 1, 1)
+NAMES = ["홍길동", "김철수", "이영희", "박셀장", "최민수"]
+WORDS = ["출석", "결석", "헌금", "성경읽기", "기도제목", "안녕하세요", "오늘 모임", "주일 예배", "셀 모임"]
+QUERIES = [
+    ["출석"],
+    ["ㅊㅅ"],
+    ["ㅎㄱ", "기도"],
+    ["sender:홍길동 헌금"],
+    ["(출석 OR 결석) NOT 헌금"],
+    ['"주일 예배"'],
+]
+THREADS = 8
+
+
+def make_table(seed: int = 7, days: int = 120) -> MessageTable:
+    rng = random.Random(seed)
+    lines = []
+    for n in range(days):
+        d = date.fromordinal(date(2025, 1, 1).toordinal() + n)
+        lines.append(f"--------------- {d.year}년 {d.month}월 {d.day}일 ---------------")
+        for _ in range(rng.randint(5, 30)):
+            h, mi = rng.randint(0, 23), rng.randint(0, 59)
+            ampm, hh = ("오전" if h < 12 else "오후"), (h % 12 or 12)
+            body = " ".join(rng.choices(WORDS, k=rng.randint(1, 4)))
+            lines.append(f"[{rng.choice(NAMES)}] [{ampm} {hh}:{mi:02d}] {body}")
+    return MessageTable.from_messages(iter_buffer_messages("\n".join(lines).encode(), TODAY))
+
+
+def run_queries(table: MessageTable, vectorized) -> list:
+    results = []
+    # 같은 검색을 두 번씩: 두 번째 넓은 검색에서 역색인을 만듦
+    for _ in range(2):
+        for lines in QUERIES:
+            node = parse_keyword_lines(lines)
+            results.append(query_ids(table, node, vectorized=vectorized))
+            results.append(table.hit_bitmap(node))
+    results.append(table.latest_date())
+    results.append([list(rows) for rows in table.sender_rows()])
+    return results
+
+
+@pytest.mark.parametrize("vectorized", [False, None])
+def test_concurrent_first_queries_match_serial(vectorized):
+    expected = run_queries(make_table(), vectorized)
+
+    shared = make_table()
+    results = [None] * THREADS
+    barrier = threading.Barrier(THREADS)
+
+    def worker(k: int) -> None:
+        barrier.wait()
+        results[k] = run_queries(shared, vectorized)
+
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)  # 스레드 전환을 자주 일으켜 지연 색인 구성이 겹치게 함
+    try:
+        threads = [threading.Thread(target=worker, args=(k,)) for k in range(THREADS)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    finally:
+        sys.setswitchinterval(interval)
+
+    for got in results:
+        assert got == expected
+    serial = make_table()
+    serial.choseong_index()
+    assert shared.choseong_texts() == serial.choseong_texts()